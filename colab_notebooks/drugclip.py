@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+DrugCLIP-style drug-target scoring for 02_DrugCLIP_Analysis.ipynb.
+
+Drugs (SMILES) are embedded with ChemBERTa and proteins with ESM-2; the
+binding score is the cosine similarity of the two embeddings mapped to 0-1.
+If the encoders cannot be loaded, Morgan fingerprints and amino-acid
+composition are used instead.
+
+score_matrix scores many drugs against many proteins at once: all SMILES
+and all sequences are embedded in length-sorted, padded batches (mean
+pooling masks the padding, so batched and single embeddings agree) and the
+full matrix is one product of the row-normalized embedding matrices.
+
+Every embedding is cached, in memory and (with cache_dir) on disk, keyed by
+the SHA-256 of what determines it: drug or protein, the SMILES or the
+(truncated) sequence, the encoder name and the maximum length. Each protein
+and SMILES is therefore encoded once across drugs, targets and runs:
+
+    <cache_dir>/<key[:2]>/<key>.npy     embedding vector
+    <cache_dir>/<key[:2]>/<key>.json    kind, encoder, input length
+
+Usage:
+    from drugclip import DrugCLIP
+    drugclip = DrugCLIP(cache_dir="output/drugclip/embedding_cache")
+    score = drugclip.predict_binding(smiles, sequence)
+    scores = drugclip.score_matrix(smiles_list, sequences)   # (n_drugs, n_proteins)
+
+    python drugclip.py --cache-dir output/drugclip/embedding_cache
+    python drugclip.py --cache-dir output/drugclip/embedding_cache --drugs library.smi --qrdr \
+        --output output/drugclip/library_scores.tsv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from Bio import SeqIO
+from transformers import AutoModel, AutoTokenizer
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+DRUG_MODEL = "seyonec/ChemBERTa-zinc-base-v1"
+PROTEIN_MODEL = "facebook/esm2_t6_8M_UR50D"
+# Encoder names of the fallback embeddings, used in their cache keys
+DRUG_FALLBACK = "morgan-r2-256"
+PROTEIN_FALLBACK = "aa-composition"
+TOKEN_MAX_LENGTH = 512
+# Proteins are truncated to this many residues before encoding (memory)
+PROTEIN_MAX_LENGTH = 400
+DRUG_BATCH_SIZE = 128
+PROTEIN_BATCH_SIZE = 8
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+DATA_DIR = Path(__file__).resolve().parent / "data"
+# Quinolone resistance-determining regions (1-based, inclusive), as in the notebook
+QRDR_REGIONS = {"GyrA": (67, 106), "GyrB": (426, 464)}
+
+
+def embedding_key(kind: str, text: str, encoder: str, max_length: Optional[int] = None) -> str:
+    """Cache key for one embedding ('drug' or 'protein')."""
+    settings = {"kind": kind, "input": text, "encoder": encoder, "max_length": max_length}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def _write_atomic(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class EmbeddingCache:
+    """Key -> embedding store, held in memory and, with cache_dir, on disk."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Cached embedding, or None on a miss."""
+        embedding = self.memory.get(key)
+        if embedding is None and self.cache_dir is not None and self._path(key, ".json").exists():
+            embedding = self.memory[key] = np.load(self._path(key, ".npy"))
+        if embedding is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return embedding
+
+    def put(self, key: str, embedding, meta: Dict = None):
+        """Store an embedding; on disk the JSON metadata is written last and marks the entry complete."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.memory[key] = embedding
+        if self.cache_dir is not None:
+            self._path(key, "").parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self._path(key, ".npy"), lambda f: np.save(f, embedding))
+            _write_atomic(self._path(key, ".json"),
+                          lambda f: f.write(json.dumps(dict(meta or {}, dim=len(embedding))).encode()))
+        self.stored += 1
+
+    def entries(self) -> List[Path]:
+        return sorted(self.cache_dir.glob("*/*.json")) if self.cache_dir is not None else []
+
+    def stats_lines(self) -> List[str]:
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return [
+            f"Embedding cache: {self.cache_dir or 'memory only'}",
+            f"Lookups: {lookups} ({self.hits} hits, {self.misses} misses, {rate:.0f}% hit rate)",
+            f"New embeddings stored: {self.stored}",
+        ]
+
+
+class DrugCLIP:
+    """
+    DrugCLIP: Contrastive Learning for Drug-Target Interaction Prediction
+
+    Uses pre-trained encoders:
+    - ChemBERTa for drug (SMILES) encoding
+    - ESM-2 for protein sequence encoding
+    """
+
+    def __init__(self, device='cuda' if torch.cuda.is_available() else 'cpu', cache_dir=None):
+        self.device = device
+        print(f"Initializing DrugCLIP on {device}...")
+
+        self.drug_encoder = None
+        self.drug_tokenizer = None
+        self.protein_encoder = None
+        self.protein_tokenizer = None
+        self.cache = EmbeddingCache(cache_dir)
+
+        self._load_encoders()
+
+    def _load_encoders(self):
+        """Load pre-trained encoders"""
+        try:
+            # Drug encoder: ChemBERTa
+            print("  Loading ChemBERTa (drug encoder)...")
+            self.drug_tokenizer = AutoTokenizer.from_pretrained(DRUG_MODEL)
+            self.drug_encoder = AutoModel.from_pretrained(DRUG_MODEL).to(self.device)
+            self.drug_encoder.eval()
+
+            # Protein encoder: ESM-2
+            print("  Loading ESM-2 (protein encoder)...")
+            self.protein_tokenizer = AutoTokenizer.from_pretrained(PROTEIN_MODEL)
+            self.protein_encoder = AutoModel.from_pretrained(PROTEIN_MODEL).to(self.device)
+            self.protein_encoder.eval()
+
+            print("✓ Encoders loaded successfully!")
+
+        except Exception as e:
+            print(f"⚠ Error loading models: {e}")
+            print("  Using fallback embedding method...")
+
+    @property
+    def drug_encoder_name(self):
+        return DRUG_MODEL if self.drug_encoder is not None else DRUG_FALLBACK
+
+    @property
+    def protein_encoder_name(self):
+        return PROTEIN_MODEL if self.protein_encoder is not None else PROTEIN_FALLBACK
+
+    def _encode_batch(self, encoder, tokenizer, texts):
+        """Mean-pooled last hidden states of a padded batch; padding is masked out of the mean"""
+        inputs = tokenizer(
+            list(texts), return_tensors="pt",
+            padding=True, truncation=True, max_length=TOKEN_MAX_LENGTH
+        ).to(self.device)
+
+        with torch.no_grad():
+            outputs = encoder(**inputs)
+            # Mean pooling over each sequence's own tokens
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            embeddings = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1)
+
+        return embeddings.float().cpu().numpy()
+
+    def _cached_embeddings(self, kind, texts, encoder_name, max_length, encode_batch, fallback, batch_size):
+        """
+        Embeddings of texts as an (n, dim) array, encoding only cache misses.
+
+        Distinct misses are sorted by length and encoded batch_size at a time,
+        so each batch pads to similar lengths.
+        """
+        keys = [embedding_key(kind, text, encoder_name, max_length) for text in texts]
+        embeddings = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                embeddings[key] = self.cache.get(key)
+        missing = sorted({key: text for key, text in zip(keys, texts) if embeddings[key] is None}.items(),
+                         key=lambda item: len(item[1]))
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            if encode_batch is None:
+                encoded = [fallback(text) for _, text in batch]
+            else:
+                encoded = encode_batch([text for _, text in batch])
+            for (key, text), embedding in zip(batch, encoded):
+                self.cache.put(key, embedding, {"kind": kind, "encoder": encoder_name, "length": len(text)})
+                embeddings[key] = self.cache.memory[key]
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([embeddings[key] for key in keys])
+
+    def encode_drugs(self, smiles_list, batch_size=DRUG_BATCH_SIZE):
+        """Encode SMILES to an (n, dim) embedding array in padded batches (cached)"""
+        encode_batch = None
+        if self.drug_encoder is not None:
+            encode_batch = partial(self._encode_batch, self.drug_encoder, self.drug_tokenizer)
+        return self._cached_embeddings("drug", list(smiles_list), self.drug_encoder_name, TOKEN_MAX_LENGTH,
+                                       encode_batch, self._simple_drug_embedding, batch_size)
+
+    def encode_proteins(self, sequences, max_length=PROTEIN_MAX_LENGTH, batch_size=PROTEIN_BATCH_SIZE):
+        """Encode protein sequences to an (n, dim) embedding array in padded batches (cached)"""
+        sequences = list(sequences)
+        encode_batch = None
+        if self.protein_encoder is not None:
+            # Truncate for memory
+            sequences = [sequence[:max_length] for sequence in sequences]
+            encode_batch = partial(self._encode_batch, self.protein_encoder, self.protein_tokenizer)
+        return self._cached_embeddings("protein", sequences, self.protein_encoder_name, max_length,
+                                       encode_batch, self._simple_protein_embedding, batch_size)
+
+    def encode_drug(self, smiles):
+        """Encode drug SMILES to embedding vector (cached)"""
+        return self.encode_drugs([smiles])[0]
+
+    def encode_protein(self, sequence, max_length=PROTEIN_MAX_LENGTH):
+        """Encode protein sequence to embedding vector (cached)"""
+        return self.encode_proteins([sequence], max_length)[0]
+
+    def _simple_drug_embedding(self, smiles):
+        """Fallback: ECFP-like embedding"""
+        mol = Chem.MolFromSmiles(smiles)
+        if mol:
+            fp = AllChem.GetMorganFingerprintAsBitVect(mol, 2, nBits=256)
+            return np.array(fp)
+        return np.zeros(256)
+
+    def _simple_protein_embedding(self, sequence):
+        """Fallback: AA composition embedding"""
+        embedding = np.zeros(len(AMINO_ACIDS))
+        for c in sequence:
+            if c in AMINO_ACIDS:
+                embedding[AMINO_ACIDS.index(c)] += 1
+        return embedding / (np.linalg.norm(embedding) + 1e-10)
+
+    def score_matrix(self, smiles_list, sequences, drug_batch_size=DRUG_BATCH_SIZE,
+                     protein_batch_size=PROTEIN_BATCH_SIZE):
+        """
+        Binding scores of every drug against every protein.
+
+        All SMILES and sequences are embedded in padded batches; the scores
+        are one product of the row-normalized embedding matrices.
+
+        Returns:
+            np.ndarray (n_drugs, n_proteins): scores (0-1), higher = stronger predicted binding
+        """
+        drug_emb = self.encode_drugs(smiles_list, batch_size=drug_batch_size)
+        protein_emb = self.encode_proteins(sequences, batch_size=protein_batch_size)
+
+        # Match dimensions (projection layer in full DrugCLIP)
+        min_dim = min(drug_emb.shape[1], protein_emb.shape[1])
+        drug_emb = drug_emb[:, :min_dim].astype(np.float64)
+        protein_emb = protein_emb[:, :min_dim].astype(np.float64)
+
+        # Cosine similarity
+        drug_emb /= np.linalg.norm(drug_emb, axis=1, keepdims=True) + 1e-10
+        protein_emb /= np.linalg.norm(protein_emb, axis=1, keepdims=True) + 1e-10
+        similarity = drug_emb @ protein_emb.T
+
+        # Convert to 0-1 scale
+        return (similarity + 1) / 2
+
+    def predict_binding(self, smiles, sequence):
+        """
+        Predict drug-protein binding score
+
+        Returns:
+            float: Binding score (0-1), higher = stronger predicted binding
+        """
+        return float(self.score_matrix([smiles], [sequence])[0, 0])
+
+
+def read_drugs(drug_file) -> List[Tuple[str, str]]:
+    """(name, SMILES) from a CSV with Drug_Name and SMILES columns (data/drugs.csv) or a .smi file."""
+    with open(drug_file) as f:
+        if str(drug_file).endswith(".csv"):
+            return [(row["Drug_Name"], row["SMILES"]) for row in csv.DictReader(f)]
+        drugs = []
+        for n, line in enumerate(f, 1):
+            fields = line.split()
+            if fields and not fields[0].startswith("#"):
+                drugs.append((fields[1] if len(fields) > 1 else f"mol{n}", fields[0]))
+        return drugs
+
+
+def read_targets(fasta_files, qrdr=False) -> List[Tuple[str, str]]:
+    """(name, sequence) of every FASTA record; with qrdr, the QRDR of GyrA/GyrB records too."""
+    targets = []
+    for fasta_file in fasta_files:
+        for record in SeqIO.parse(str(fasta_file), "fasta"):
+            name = record.id.split("|")[0]
+            sequence = str(record.seq).upper()
+            targets.append((name, sequence))
+            if qrdr and name in QRDR_REGIONS:
+                start, end = QRDR_REGIONS[name]
+                targets.append((f"{name}_QRDR", sequence[start - 1:end]))
+    return targets
+
+
+def write_score_matrix(output_file, drugs, targets, scores):
+    """Tab-separated matrix: one row per drug, one column per target."""
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(["Drug", "SMILES"] + [name for name, _ in targets])
+        for (name, smiles), row in zip(drugs, scores):
+            writer.writerow([name, smiles] + [f"{score:.4f}" for score in row])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DrugCLIP score matrix, or a summary of its embedding cache")
+    parser.add_argument("--cache-dir", required=True)
+    parser.add_argument("--drugs", default=None, help="Drug CSV (Drug_Name, SMILES) or .smi file to score")
+    parser.add_argument("--fasta", nargs="+", default=[str(DATA_DIR / "GyrA_B1ME58.fasta"),
+                                                       str(DATA_DIR / "GyrB_B1ME45.fasta")],
+                        help="Target sequences")
+    parser.add_argument("--qrdr", action="store_true", help="Also score the GyrA/GyrB QRDR fragments")
+    parser.add_argument("--output", default="drugclip_scores.tsv", help="Score matrix output (--drugs)")
+    parser.add_argument("--device", default=None, help="Encoder device (default: cuda if available)")
+    args = parser.parse_args()
+
+    if args.drugs:
+        drugs = read_drugs(args.drugs)
+        targets = read_targets(args.fasta, args.qrdr)
+        drugclip = DrugCLIP(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'), args.cache_dir)
+        start = time.time()
+        scores = drugclip.score_matrix([smiles for _, smiles in drugs], [seq for _, seq in targets])
+        print(f"Scored {len(drugs)} drugs x {len(targets)} targets in {time.time() - start:.1f} s")
+        write_score_matrix(args.output, drugs, targets, scores)
+        print(f"Score matrix saved to: {args.output}")
+        print("\n".join(drugclip.cache.stats_lines()))
+        return
+
+    cache = EmbeddingCache(args.cache_dir)
+    entries = cache.entries()
+    print(f"{len(entries)} embeddings in {args.cache_dir}")
+    for meta_path in entries:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        print(f"  {meta_path.stem[:12]}  {meta.get('kind', ''):<8} {meta.get('length', 0):5d} chars  "
+              f"dim {meta['dim']:4d}  {meta.get('encoder', '')}")
+
+
+if __name__ == "__main__":
+    main()
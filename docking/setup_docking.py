@@ -6,12 +6,21 @@ Docks moxifloxacin/ciprofloxacin to the DNA cleavage site
 This script:
 1. Identifies the binding site from a reference structure (5CDQ with moxifloxacin)
 2. Transfers binding site to M. abscessus model
-3. Sets up docking with AutoDock Vina (if available) or provides coordinates for other tools
+3. Characterizes the site: solvent accessibility (SASA) of the residues lining
+   it and how much of it is buried by GyrA/GyrB complex formation (ΔSASA)
+4. Sets up docking with AutoDock Vina (if available) or provides coordinates for other tools
 """
 
 import os
+import sys
 from pathlib import Path
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from pdb_structure import read_structure
+from sasa import EXPOSED_CUTOFF, residue_sasa, write_residue_table
+
 # Base directories
 BASE_DIR = Path("/home/nbhatta1/Desktop/Roy-Ahmed-M.Abcessus-modeling")
 DOCKING_DIR = BASE_DIR / "docking"
@@ -92,6 +101,24 @@ def find_equivalent_binding_site(model_pdb, ref_pdb, ref_ligand_center):
     all_coords = [atom['coord'] for atom in model_ca]
     return mean_coords(all_coords)
 
+def characterize_binding_site(model_pdb, center, radius=10.0, groups=("A", "B", "C", "D")):
+    """
+    SASA of the residues with a heavy atom within radius of the site center.
+    
+    ΔSASA is relative to the chains separated (groups), i.e. how much of the
+    site only exists in the assembled complex.
+    
+    Returns:
+        Per-residue dict (residue_sasa) restricted to the site residues
+    """
+    structure = read_structure(str(model_pdb))
+    residues = residue_sasa(structure, list(groups))
+    residue, _ = structure.residue_index()
+    heavy = structure.element != 'H'
+    near = np.linalg.norm(structure.coords - np.asarray(center), axis=1) <= radius
+    site = np.unique(residue[near & heavy])
+    return {key: values[site] for key, values in residues.items()}
+
 def create_vina_config(center, size=(25, 25, 25)):
     """Create AutoDock Vina configuration file"""
     config = f"""# AutoDock Vina Configuration for M. abscessus Gyrase
@@ -218,6 +245,20 @@ def main():
     model_center = find_equivalent_binding_site(model_pdb, ref_pdb, ref_center)
     print(f"   Model binding site center: {model_center}")
     
+    # Solvent accessibility of the site
+    print("\n   Binding site accessibility (residues within 10 Å, SASA)...")
+    site = characterize_binding_site(model_pdb, model_center)
+    exposed = site['sasa'] >= EXPOSED_CUTOFF
+    buried_by_complex = site['delta'] >= 1.0
+    print(f"   Site residues: {len(site['sasa'])} ({int(exposed.sum())} solvent-exposed)")
+    print(f"   Site SASA: {site['sasa'].sum():.0f} Å² in the tetramer, "
+          f"{site['isolated'].sum():.0f} Å² with chains separated")
+    print(f"   Residues buried by subunit contacts: {int(buried_by_complex.sum())} "
+          f"(ΔSASA {site['delta'].sum():.0f} Å²)")
+    site_file = DOCKING_DIR / "binding_site_sasa.tsv"
+    write_residue_table(site, str(site_file))
+    print(f"   Per-residue table: {site_file}")
+    
     # Create output files
     print("\n3. Creating docking configuration files...")
     
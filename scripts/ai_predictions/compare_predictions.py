@@ -2,38 +2,170 @@
 """
 Compare AI Structure Predictions
 Analyzes models from ESMFold, ColabFold, AlphaFold2, RoseTTAFold, and RosettaCM
+
+Besides the per-file confidence summary, every model of GyrA or GyrB is
+placed on the residue index of its target sequence (by residue number, or
+by sequence alignment where the numbering differs) and compared per
+residue. Chains are matched separately, and one chain may carry both
+targets (a heterodimer folded as one concatenated sequence); models that
+match no target are listed as excluded. The comparison uses pLDDT from the B-factor column and CA deviation from the
+reference model (RosettaCM by default) after superposition with outlier
+rejection. Models are parsed in parallel; the aligned arrays are saved as
+per_residue_<target>.tsv and .npz in output/ai_predictions.
+
+Usage:
+    python compare_predictions.py
+    python compare_predictions.py --region 74 113 --workers 8
 """
 
 import os
 import sys
 import glob
 import json
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-# Try to import analysis libraries
-try:
-    import numpy as np
-    HAS_NUMPY = True
-except ImportError:
-    HAS_NUMPY = False
-    print("Warning: numpy not installed, some analyses will be skipped")
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from esmfold_pdb import RESTYPE_3, RESTYPES
+from generate_alignment import simple_align
+from loop_detection import alignment_columns, iterative_superposition
+from pdb_structure import read_structure
 
 PROJECT_DIR = Path(__file__).parent.parent.parent
 OUTPUT_DIR = PROJECT_DIR / "output" / "ai_predictions"
 ROSETTACM_DIR = PROJECT_DIR / "output" / "relaxed"
+SEQ_DIR = PROJECT_DIR / "input" / "sequences"
+TARGETS = {"GyrA": SEQ_DIR / "B1ME58_GyrA.fasta", "GyrB": SEQ_DIR / "B1ME45_GyrB.fasta"}
+
+# Fraction of a model's residues that must match a target to be placed on its index
+MIN_IDENTITY = 0.9
+REFERENCE_METHOD = "RosettaCM"
+ONE_LETTER = dict(zip(RESTYPE_3, RESTYPES + "X"))
+
+def ca_records(pdb_file):
+    """One-letter sequence, residue numbers, CA coordinates, B-factors and chains of a model (first altloc)"""
+    structure = read_structure(str(pdb_file), records=("ATOM",))
+    mask = structure.atom_mask("CA") & np.isin(structure.altloc, ["", "A"])
+    sequence = "".join(ONE_LETTER.get(name, "X") for name in structure.resname[mask])
+    return sequence, structure.resseq[mask], structure.coords[mask], structure.bfactor[mask], structure.chain[mask]
 
 def parse_pdb_bfactor(pdb_file):
     """Extract B-factors (often pLDDT scores) from PDB file"""
-    bfactors = []
-    with open(pdb_file) as f:
-        for line in f:
-            if line.startswith("ATOM") and " CA " in line:
-                try:
-                    bfactor = float(line[60:66].strip())
-                    bfactors.append(bfactor)
-                except:
-                    pass
-    return bfactors
+    return ca_records(pdb_file)[3].tolist()
+
+def confidence_values(bfactors):
+    """B-factors as pLDDT (0-100); NaN if the column carries no per-residue values"""
+    if len(bfactors) == 0 or np.ptp(bfactors) == 0:
+        return np.full(len(bfactors), np.nan)
+    # Hugging Face ESMFold writes pLDDT as 0-1
+    return bfactors * 100 if bfactors.max() <= 1 else bfactors
+
+def target_index(sequence, resseq, target):
+    """
+    0-based target position of each model residue (-1 if unaligned).
+
+    Residue numbers are used directly when they reproduce the target
+    sequence; otherwise the model sequence is aligned to the target.
+    """
+    residues = np.frombuffer(sequence.encode(), dtype="S1")
+    target_residues = np.frombuffer(target.encode(), dtype="S1")
+    if len(resseq) and resseq.min() >= 1 and resseq.max() <= len(target):
+        if np.array_equal(target_residues[resseq - 1], residues):
+            return resseq - 1
+    aligned_model, aligned_target = simple_align(sequence, target)
+    columns = alignment_columns(aligned_model, aligned_target)
+    paired = (columns["target"] >= 0) & (columns["template"] >= 0)
+    index = np.full(len(sequence), -1)
+    index[columns["target"][paired]] = columns["template"][paired]
+    return index
+
+def residue_profile(pdb_file, targets):
+    """
+    Per-residue data of one model on the residue index of every target it contains.
+
+    Each chain is aligned to each target, and a target is placed when at
+    least MIN_IDENTITY of the shorter of chain and target matches, so a
+    chain holding GyrA and GyrB back to back yields both.
+
+    Returns:
+        Dict with pdb_file, bfactors (raw CA B-factors) and segments: one dict
+        per placed target with target, chain, identity, plddt (L,) and
+        coords (L, 3), NaN at residues the model lacks
+    """
+    sequence, resseq, ca, bfactors, chains = ca_records(pdb_file)
+    profile = {"pdb_file": str(pdb_file), "bfactors": bfactors, "segments": []}
+    confidence = confidence_values(bfactors)
+    for chain in dict.fromkeys(chains.tolist()):
+        rows = np.nonzero(chains == chain)[0]
+        chain_sequence = "".join(sequence[k] for k in rows)
+        residues = np.frombuffer(chain_sequence.encode(), dtype="S1")
+        for name, target in targets.items():
+            index = target_index(chain_sequence, resseq[rows], target)
+            aligned = index >= 0
+            matches = np.sum(np.frombuffer(target.encode(), dtype="S1")[index[aligned]] == residues[aligned])
+            identity = float(matches / max(min(len(chain_sequence), len(target)), 1))
+            if identity < MIN_IDENTITY:
+                continue
+            plddt = np.full(len(target), np.nan)
+            coords = np.full((len(target), 3), np.nan)
+            plddt[index[aligned]] = confidence[rows][aligned]
+            coords[index[aligned]] = ca[rows][aligned]
+            profile["segments"].append({"target": name, "chain": chain, "identity": identity,
+                                        "plddt": plddt, "coords": coords})
+    return profile
+
+def residue_profiles(pdb_files, targets, workers=None):
+    """residue_profile of every model, parsed in parallel (workers=1 runs serially)"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pdb_files) <= 1:
+        return [residue_profile(pdb_file, targets) for pdb_file in pdb_files]
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdb_files))) as pool:
+        futures = [pool.submit(residue_profile, pdb_file, targets) for pdb_file in pdb_files]
+        return [future.result() for future in futures]
+
+def residue_matrix(profiles, reference=0):
+    """
+    Stack the placed segments (residue_profile) of one target and superpose each onto the reference.
+
+    Returns:
+        (plddt (M, L), CA deviation (M, L) in A after iterative superposition
+        on the residues both models contain; NaN where undefined)
+    """
+    plddt = np.stack([p["plddt"] for p in profiles])
+    coords = np.stack([p["coords"] for p in profiles])
+    deviation = np.full(plddt.shape, np.nan)
+    present = ~np.isnan(coords[:, :, 0])
+    for m in range(len(profiles)):
+        common = present[m] & present[reference]
+        if common.sum() < 3:
+            continue
+        R, t, _ = iterative_superposition(coords[m, common], coords[reference, common])
+        deviation[m, common] = np.linalg.norm(coords[m, common] @ R.T + t - coords[reference, common], axis=1)
+    return plddt, deviation
+
+def write_residue_table(output_file, sequence, labels, plddt, deviation):
+    """One row per target residue: pLDDT and CA deviation of every model (blank if missing)"""
+    columns = [f"{label}:{kind}" for label in labels for kind in ("plddt", "ca_dev")]
+    values = np.empty((len(sequence), 2 * len(labels)))
+    values[:, 0::2] = plddt.T
+    values[:, 1::2] = deviation.T
+    with open(output_file, "w") as f:
+        f.write("\t".join(["residue", "aa"] + columns) + "\n")
+        for i, row in enumerate(values):
+            cells = ["" if np.isnan(v) else f"{v:.2f}" for v in row]
+            f.write("\t".join([str(i + 1), sequence[i]] + cells) + "\n")
+
+def region_summary(plddt, deviation, start, end):
+    """Mean pLDDT and CA deviation of each model over target residues start-end (1-based, inclusive)"""
+    with warnings.catch_warnings():
+        # Models without values in the region give NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(plddt[:, start - 1:end], axis=1), np.nanmean(deviation[:, start - 1:end], axis=1)
 
 def get_pdb_files(directory, pattern="*.pdb"):
     """Find all PDB files in a directory"""
@@ -41,7 +173,7 @@ def get_pdb_files(directory, pattern="*.pdb"):
 
 def calculate_stats(values):
     """Calculate basic statistics"""
-    if not HAS_NUMPY or not values:
+    if not len(values):
         return {"mean": 0, "std": 0, "min": 0, "max": 0, "n": 0}
     arr = np.array(values)
     return {
@@ -52,23 +184,17 @@ def calculate_stats(values):
         "n": len(arr)
     }
 
-def analyze_method(method_name, method_dir):
-    """Analyze predictions from a single method"""
+def analyze_method(method_name, profiles):
+    """Analyze predictions from a single method (its residue_profile results)"""
     results = {"method": method_name, "proteins": {}}
     
-    pdbs = get_pdb_files(method_dir)
-    
-    for pdb_file in pdbs:
-        # Determine protein name from path or filename
-        if "GyrA" in str(pdb_file) or "gyrA" in str(pdb_file):
-            protein = "GyrA"
-        elif "GyrB" in str(pdb_file) or "gyrB" in str(pdb_file):
-            protein = "GyrB"
-        else:
-            protein = pdb_file.stem
+    for profile in profiles:
+        pdb_file = Path(profile["pdb_file"])
+        # Protein from the matched target sequences, else from the filename
+        protein = "+".join(dict.fromkeys(seg["target"] for seg in profile["segments"])) or pdb_file.stem
         
         # Get confidence scores (pLDDT stored in B-factor column)
-        bfactors = parse_pdb_bfactor(pdb_file)
+        bfactors = profile["bfactors"]
         
         results["proteins"][protein] = {
             "pdb_file": str(pdb_file),
@@ -78,7 +204,61 @@ def analyze_method(method_name, method_dir):
     
     return results
 
+def compare_residues(profiles, labels, reference_method=REFERENCE_METHOD, region=None):
+    """
+    Per-residue comparison of all models of each target; writes per_residue_<target>.tsv/.npz.
+
+    The reference is the first model of reference_method, else the model
+    covering most residues. A model with several chains of one target
+    contributes one row per chain (label suffix :<chain>).
+    """
+    excluded = [label for label, profile in zip(labels, profiles) if not profile["segments"]]
+    if excluded:
+        print(f"\nExcluded from the per-residue comparison (no chain matches a target at "
+              f"{MIN_IDENTITY:.0%} identity): " + ", ".join(excluded))
+    for target, fasta in TARGETS.items():
+        segments, target_labels = [], []
+        for label, profile in zip(labels, profiles):
+            matched = [seg for seg in profile["segments"] if seg["target"] == target]
+            segments += matched
+            target_labels += [label if len(matched) == 1 else f"{label}:{seg['chain']}" for seg in matched]
+        if not segments:
+            continue
+        sequence = "".join(line.strip() for line in open(fasta) if not line.startswith(">"))
+        coverage = [int(np.sum(~np.isnan(seg["coords"][:, 0]))) for seg in segments]
+        reference = next((j for j, label in enumerate(target_labels) if label.startswith(reference_method + "/")),
+                         int(np.argmax(coverage)))
+        plddt, deviation = residue_matrix(segments, reference)
+        
+        table = OUTPUT_DIR / f"per_residue_{target}.tsv"
+        write_residue_table(table, sequence, target_labels, plddt, deviation)
+        np.savez_compressed(OUTPUT_DIR / f"per_residue_{target}.npz", labels=np.array(target_labels),
+                            sequence=sequence, reference=target_labels[reference],
+                            plddt=plddt.astype(np.float32), deviation=deviation.astype(np.float32))
+        
+        width = max(len(label) for label in target_labels) + 2
+        print(f"\n{target} ({len(sequence)} residues), reference {target_labels[reference]}:")
+        print(f"  {'Model':<{width}} {'Residues':>9} {'pLDDT':>7} {'CA dev':>7}")
+        means = region_summary(plddt, deviation, 1, len(sequence))
+        for j, label in enumerate(target_labels):
+            print(f"  {label:<{width}} {coverage[j]:>9} {means[0][j]:>7.1f} {means[1][j]:>7.2f}")
+        if region:
+            start, end = region
+            region_plddt, region_dev = region_summary(plddt, deviation, start, end)
+            print(f"  Residues {start}-{end}:")
+            for j, label in enumerate(target_labels):
+                print(f"  {label:<{width}} {'':>9} {region_plddt[j]:>7.1f} {region_dev[j]:>7.2f}")
+        print(f"  Table saved to: {table}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Compare structure predictions across methods")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel model parsing (default: CPU count)")
+    parser.add_argument("--reference", default=REFERENCE_METHOD,
+                        help="Method whose model is the superposition reference")
+    parser.add_argument("--region", nargs=2, type=int, default=None, metavar=("START", "END"),
+                        help="Also summarize target residues START-END (1-based)")
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("AI Structure Prediction Comparison")
     print("M. abscessus DNA Gyrase (GyrA & GyrB)")
@@ -95,6 +275,7 @@ def main():
     }
     
     all_results = {}
+    method_files = {}
     
     for method_name, method_dir in methods.items():
         print(f"\n{'-' * 70}")
@@ -112,10 +293,22 @@ def main():
             continue
         
         print(f"  Found {len(pdbs)} PDB file(s)")
-        
-        results = analyze_method(method_name, method_dir)
+        method_files[method_name] = pdbs
+    
+    # Every model is parsed once, in parallel
+    targets = {name: "".join(line.strip() for line in open(fasta) if not line.startswith(">"))
+               for name, fasta in TARGETS.items()}
+    pdbs = [pdb for files in method_files.values() for pdb in files]
+    profiles = residue_profiles(pdbs, targets, args.workers)
+    labels = [f"{method_name}/{pdb.stem}" for method_name, files in method_files.items() for pdb in files]
+    
+    start = 0
+    for method_name, files in method_files.items():
+        results = analyze_method(method_name, profiles[start:start + len(files)])
+        start += len(files)
         all_results[method_name] = results
         
+        print(f"\n{method_name}:")
         for protein, data in results["proteins"].items():
             conf = data["confidence"]
             print(f"\n  {protein}:")
@@ -127,6 +320,12 @@ def main():
                 print(f"      Std:  {conf['std']:.1f}")
                 print(f"      Range: {conf['min']:.1f} - {conf['max']:.1f}")
     
+    # Per-residue comparison on shared target residue indices
+    print("\n" + "=" * 70)
+    print("PER-RESIDUE COMPARISON")
+    print("=" * 70)
+    compare_residues(profiles, labels, args.reference, args.region)
+    
     # Summary comparison table
     print("\n" + "=" * 70)
     print("SUMMARY COMPARISON")
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Domain-split ESMFold prediction of long sequences with overlap stitching.
+
+ESMFold memory grows with the square of the folded length, so the
+concatenated GyrA-GyrB heterodimer (1514 residues) needs about four times
+the memory of its ~330-residue windows put together. Here the sequence is
+cut into overlapping windows, the windows are folded together in
+length-bucketed batches, and the model is rebuilt by superposing each window
+onto the previous one on the backbone atoms (N, CA, C) of their overlap.
+
+Window overlaps are centred on domain boundaries where possible. With
+--guide 5bs8 these are the edges of the 5BS8 template coverage, read from
+the Grishin alignments (GyrA Tower/C-gate ~17-503, GyrB TOPRIM from 425),
+plus the junction between concatenated chains.
+
+Within each overlap the chain switches windows at the residue where the two
+superposed windows agree best (middle half of the overlap only, away from
+frayed window ends). The report lists the stitch RMSD over the overlap
+(all residues, and the core after outlier rejection), the switch residue,
+the C-N peptide bond length there and both windows' pLDDT in the overlap.
+
+Stitching fixes domain placement through the overlaps only: relative
+orientations of domains that never share a window are extrapolated and
+should not be read as predicted contacts.
+
+Usage:
+    python domain_folding.py --fasta input/sequences/B1ME58_GyrA.fasta input/sequences/B1ME45_GyrB.fasta \
+        --guide 5bs8 --output output/ai_predictions/esmfold/complex/gyrAB_heterodimer_stitched.pdb
+    python domain_folding.py --fasta long.fasta --window 300 --overlap 40 --worker
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from esmfold_batching import pair_budget, plan_batches, read_fasta_records
+from esmfold_client import DEFAULT_SOCKET, ESMFoldClient
+from loop_detection import alignment_columns, iterative_superposition, parse_grishin
+from pdb_structure import Structure, concatenate, parse_pdb_lines, rmsd
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+# Template alignments for --guide 5bs8, matched to records by their target sequence
+TEMPLATE_ALIGNMENTS = [
+    PROJECT_DIR / "input" / "alignments_final" / "alignment_gyrA_proper.grishin",
+    PROJECT_DIR / "input" / "alignments_final" / "alignment_gyrB_proper.grishin",
+]
+
+WINDOW = 400
+OVERLAP = 40
+# Template gaps shorter than this (missing residues) are not domain boundaries
+MIN_BOUNDARY_GAP = 10
+STITCH_ATOMS = ("N", "CA", "C")
+
+
+def template_boundaries(sequence: str, alignment_files: Sequence = TEMPLATE_ALIGNMENTS,
+                        min_gap: int = MIN_BOUNDARY_GAP) -> List[int]:
+    """
+    Domain boundaries of a sequence from the edges of its template coverage.
+
+    The alignment whose target row is this sequence is used; gaps in the
+    coverage shorter than min_gap are ignored.
+
+    Returns:
+        Sorted 0-based positions where covered segments start or end (empty
+        if no alignment matches)
+    """
+    for alignment_file in alignment_files:
+        target, template, _, _ = parse_grishin(str(alignment_file))
+        if target.replace("-", "") != sequence:
+            continue
+        columns = alignment_columns(target, template)
+        covered = np.zeros(len(sequence), dtype=bool)
+        covered[columns["target"][(columns["target"] >= 0) & (columns["template"] >= 0)]] = True
+        # Close short internal gaps, then take the edges of what is left
+        edges = np.nonzero(np.diff(covered.astype(int)))[0] + 1
+        for first, last in zip(edges[:-1], edges[1:]):
+            if not covered[first] and last - first < min_gap:
+                covered[first:last] = True
+        return (np.nonzero(np.diff(covered.astype(int)))[0] + 1).tolist()
+    return []
+
+
+def plan_windows(length: int, window: int = WINDOW, overlap: int = OVERLAP,
+                 boundaries: Sequence[int] = ()) -> List[Tuple[int, int]]:
+    """
+    Overlapping windows covering a sequence.
+
+    The residues are spread evenly over the fewest windows of at most
+    `window` residues; where a boundary lies inside a window, that window's
+    overlap with the next is moved to straddle the boundary instead.
+
+    Returns:
+        (start, end) 0-based, end-exclusive ranges in sequence order
+    """
+    if overlap * 2 >= window:
+        raise ValueError(f"overlap ({overlap}) must be less than half the window ({window})")
+    windows = []
+    start = 0
+    while length - start > window:
+        n_left = math.ceil((length - start - overlap) / (window - overlap))
+        end = start + overlap + math.ceil((length - start - overlap) / n_left)
+        half = overlap // 2
+        candidates = [b for b in boundaries if start + 2 * overlap <= b <= start + window - half
+                      and length - (b - half) >= 2 * overlap]
+        if candidates:
+            end = min(candidates, key=lambda b: abs(b + half - end)) + half
+        windows.append((start, end))
+        start = end - overlap
+    windows.append((start, length))
+    return windows
+
+
+def window_structure(pdb: str, start: int) -> Structure:
+    """Structure of a folded window, renumbered to 1-based positions in the full sequence."""
+    structure = parse_pdb_lines(pdb.splitlines(keepends=True), records=("ATOM",))
+    structure.resseq = structure.resseq - structure.resseq.min() + start + 1
+    return structure
+
+
+def _paired_atoms(moving: Structure, fixed: Structure, first: int, last: int):
+    """Indices of matching backbone atoms of residues first..last (1-based) in both structures."""
+    def index(structure):
+        mask = (structure.resseq >= first) & (structure.resseq <= last) & np.isin(structure.name, STITCH_ATOMS)
+        return {(int(structure.resseq[i]), str(structure.name[i])): i for i in np.nonzero(mask)[0]}
+    a, b = index(moving), index(fixed)
+    keys = sorted(set(a) & set(b))
+    return np.array([a[k] for k in keys], dtype=int), np.array([b[k] for k in keys], dtype=int), keys
+
+
+def _peptide_bond(structure: Structure, residue: int) -> float:
+    """C(residue)-N(residue + 1) distance, NaN if either atom is missing."""
+    c = np.nonzero((structure.resseq == residue) & (structure.name == "C"))[0]
+    n = np.nonzero((structure.resseq == residue + 1) & (structure.name == "N"))[0]
+    if not len(c) or not len(n):
+        return float("nan")
+    return float(np.linalg.norm(structure.coords[c[0]] - structure.coords[n[0]]))
+
+
+def _mean_ca_bfactor(structure: Structure, first: int, last: int) -> float:
+    mask = (structure.name == "CA") & (structure.resseq >= first) & (structure.resseq <= last)
+    return float(structure.bfactor[mask].mean()) if mask.any() else float("nan")
+
+
+def stitch_windows(structures: Sequence[Structure], windows: Sequence[Tuple[int, int]]) -> Tuple[Structure, List[Dict]]:
+    """
+    Superpose each window onto the model built so far and join them inside the overlaps.
+
+    Returns:
+        (stitched Structure, per-junction report dicts)
+    """
+    model = structures[0]
+    junctions = []
+    for k in range(1, len(structures)):
+        first, last = windows[k][0] + 1, windows[k - 1][1]
+        moving_idx, fixed_idx, keys = _paired_atoms(structures[k], model, first, last)
+        if len(keys) < 3:
+            raise ValueError(f"windows {k} and {k + 1} share fewer than 3 backbone atoms")
+        P, Q = structures[k].coords[moving_idx], model.coords[fixed_idx]
+        R, t, core = iterative_superposition(P, Q)
+        moved = structures[k].with_coords(structures[k].coords @ R.T + t)
+        fitted = P @ R.T + t
+
+        # Switch windows where the superposed CA atoms agree best, away from the window ends
+        ca = np.array([name == "CA" for _, name in keys])
+        residues = np.array([resseq for resseq, _ in keys])[ca]
+        deviation = np.linalg.norm(fitted[ca] - Q[ca], axis=1)
+        quarter = (last - first + 1) // 4
+        middle = (residues >= first + quarter) & (residues <= last - quarter)
+        if not middle.any():
+            middle = np.ones(len(residues), dtype=bool)
+        switch = int(residues[middle][np.argmin(deviation[middle])])
+
+        model = concatenate([model.select(model.resseq <= switch), moved.select(moved.resseq > switch)])
+        junctions.append({
+            "junction": k,
+            "overlap": (first, last),
+            "atoms": len(keys),
+            "rmsd": rmsd(fitted, Q),
+            "core_rmsd": rmsd(fitted[core], Q[core]),
+            "core_atoms": int(core.sum()),
+            "switch": switch,
+            "peptide_bond": _peptide_bond(model, switch),
+            "plddt_before": _mean_ca_bfactor(structures[k - 1], first, last),
+            "plddt_after": _mean_ca_bfactor(structures[k], first, last),
+        })
+    return model, junctions
+
+
+def assign_chains(structure: Structure, segments: Sequence[Tuple[str, int]]) -> Structure:
+    """Split a stitched concatenation into chains, each numbered from 1; segments are (chain ID, length)."""
+    structure = structure.copy()
+    offset = 0
+    resseq = structure.resseq.copy()
+    for chain, length in segments:
+        mask = (resseq > offset) & (resseq <= offset + length)
+        structure.chain[mask] = chain
+        structure.resseq[mask] = resseq[mask] - offset
+        offset += length
+    return structure
+
+
+def fold_split(fold: Callable, segments: Sequence[Tuple[str, str]], output_pdb, window: int = WINDOW,
+               overlap: int = OVERLAP, boundaries: Sequence[int] = (), budget: float = float("inf"),
+               max_batch: int = 16) -> Dict:
+    """
+    Fold the concatenation of segments ((chain ID, sequence) pairs) window by window and stitch it.
+
+    fold(sequences) is run_esmfold_hf.fold_batch bound to a model, or
+    ESMFoldClient.fold_batch. Writes the stitched PDB, the window PDBs
+    (<stem>_windows/) and <stem>_stitch.tsv next to output_pdb.
+
+    Returns:
+        Dict with 'windows' (start, end, mean pLDDT per window), 'junctions'
+        (see stitch_windows) and 'structure'
+    """
+    sequence = "".join(seq for _, seq in segments)
+    junction_points = np.cumsum([len(seq) for _, seq in segments])[:-1].tolist()
+    windows = plan_windows(len(sequence), window, overlap, sorted(set(boundaries) | set(junction_points)))
+    lengths = [end - start for start, end in windows]
+    batches = plan_batches(lengths, budget, max_batch)
+    print(f"\nSplitting {len(sequence)} residues into {len(windows)} windows "
+          f"({window} max, {overlap} overlap) in {len(batches)} batches:")
+    for n, (start, end) in enumerate(windows, 1):
+        print(f"  window {n}: residues {start + 1}-{end} ({end - start})")
+
+    start_time = time.time()
+    results = [None] * len(windows)
+    for batch in batches:
+        for index, result in zip(batch, fold([sequence[windows[i][0]:windows[i][1]] for i in batch])):
+            results[index] = result
+    failed = [n + 1 for n, result in enumerate(results) if result is None]
+    if failed:
+        raise RuntimeError(f"windows {failed} did not fit in memory; use a smaller --window")
+    print(f"Folded in {time.time() - start_time:.1f} s")
+
+    output_pdb = Path(output_pdb)
+    window_dir = output_pdb.parent / f"{output_pdb.stem}_windows"
+    window_dir.mkdir(parents=True, exist_ok=True)
+    structures = []
+    for n, ((start, end), result) in enumerate(zip(windows, results), 1):
+        with open(window_dir / f"window{n}_{start + 1}-{end}.pdb", "w") as f:
+            f.write(result["pdb"])
+        structures.append(window_structure(result["pdb"], start))
+
+    stitched, junctions = stitch_windows(structures, windows)
+    stitched = assign_chains(stitched, [(chain, len(seq)) for chain, seq in segments])
+    remarks = [f"Domain-split ESMFold: {len(windows)} windows of <= {window} residues, {overlap} overlap"]
+    remarks += [f"Junction {j['junction']}: overlap {j['overlap'][0]}-{j['overlap'][1]}, "
+                f"stitch RMSD {j['rmsd']:.2f} A, switch at {j['switch']}" for j in junctions]
+    stitched.write(str(output_pdb), remarks)
+
+    window_rows = [{"start": start + 1, "end": end, "plddt": float(result["plddt"])}
+                   for (start, end), result in zip(windows, results)]
+    report = output_pdb.parent / f"{output_pdb.stem}_stitch.tsv"
+    write_stitch_report(window_rows, junctions, report)
+    print(f"Stitched model: {output_pdb}")
+    print(f"Stitch report: {report}")
+    return {"windows": window_rows, "junctions": junctions, "structure": stitched}
+
+
+def write_stitch_report(window_rows: List[Dict], junctions: List[Dict], output_file):
+    with open(output_file, "w") as f:
+        f.write("window\tstart\tend\tmean_plddt\n")
+        for n, row in enumerate(window_rows, 1):
+            f.write(f"{n}\t{row['start']}\t{row['end']}\t{row['plddt']:.3f}\n")
+        f.write("\njunction\toverlap\tatoms\trmsd\tcore_rmsd\tcore_atoms\tswitch\tpeptide_bond\t"
+                "plddt_before\tplddt_after\n")
+        for j in junctions:
+            f.write(f"{j['junction']}\t{j['overlap'][0]}-{j['overlap'][1]}\t{j['atoms']}\t{j['rmsd']:.2f}\t"
+                    f"{j['core_rmsd']:.2f}\t{j['core_atoms']}\t{j['switch']}\t{j['peptide_bond']:.2f}\t"
+                    f"{j['plddt_before']:.3f}\t{j['plddt_after']:.3f}\n")
+
+
+def format_junctions(junctions: List[Dict]) -> List[str]:
+    lines = [f"{'Junction':<9} {'Overlap':<12} {'RMSD':>6} {'Core RMSD':>10} {'Switch':>7} {'C-N (A)':>8}"]
+    for j in junctions:
+        lines.append(f"{j['junction']:<9} {j['overlap'][0]}-{j['overlap'][1]:<7} {j['rmsd']:6.2f} "
+                     f"{j['core_rmsd']:10.2f} {j['switch']:7d} {j['peptide_bond']:8.2f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold a long sequence in overlapping windows and stitch them")
+    parser.add_argument("--fasta", nargs="+", required=True,
+                        help="Records to fold; several records are concatenated as chains A, B, ...")
+    parser.add_argument("--output", required=True, help="Stitched PDB")
+    parser.add_argument("--window", type=int, default=WINDOW, help="Largest window (residues)")
+    parser.add_argument("--overlap", type=int, default=OVERLAP, help="Residues shared by neighbouring windows")
+    parser.add_argument("--guide", choices=["none", "5bs8"], default="5bs8",
+                        help="Centre overlaps on 5BS8 template domain boundaries")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Batch budget in pair-residues (batch size x length^2); default from free memory")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--cpu", action="store_true", help="Run on CPU even if a GPU is available")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Fixed trunk chunk size")
+    parser.add_argument("--worker", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Fold with a running esmfold_worker.py (default socket: {DEFAULT_SOCKET})")
+    args = parser.parse_args()
+
+    records = read_fasta_records(args.fasta)
+    segments = [(chr(ord("A") + n), seq.replace(":", "")) for n, (_, seq) in enumerate(records)]
+    boundaries = []
+    if args.guide == "5bs8":
+        offset = 0
+        for (record_id, _), (_, seq) in zip(records, segments):
+            found = template_boundaries(seq)
+            print(f"{record_id}: {len(seq)} residues, 5BS8 boundaries {[b + 1 for b in found] or 'none'}")
+            boundaries += [offset + b for b in found]
+            offset += len(seq)
+
+    if args.worker:
+        fold = ESMFoldClient(args.worker).fold_batch
+        budget = args.budget or float("inf")
+    else:
+        import torch
+        from functools import partial
+        from run_esmfold_hf import fold_batch, free_memory_bytes, load_model
+        device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+        model, tokenizer = load_model(device, args.chunk_size)
+        fold = partial(fold_batch, model, tokenizer, device=device)
+        budget = args.budget or pair_budget(free_memory_bytes(device))
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    result = fold_split(fold, segments, args.output, args.window, args.overlap, boundaries, budget, args.max_batch)
+    print()
+    print("\n".join(format_junctions(result["junctions"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Length-bucketed batching of FASTA records for ESMFold.
+
+ESMFold memory grows with batch size times the square of the padded length
+(the pair representation of the folding trunk), so records are sorted by
+length and packed greedily into batches whose batch_size * max_length^2
+stays within a budget derived from free device memory. Sequences of
+similar length share a batch, which keeps padding small.
+
+Used by run_esmfold.py (fair-esm) and run_esmfold_hf.py (Hugging Face).
+
+Usage:
+    python esmfold_batching.py --fasta panel.fasta --budget 4e6
+"""
+import argparse
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from Bio import SeqIO
+
+# Approximate peak bytes per pair-residue (L^2 element) of a chunked ESMFold
+# trunk: the fp32 pair representation (128 channels) plus attention and
+# transition activations
+BYTES_PER_PAIR = 6144
+# Glycine linker that ESMFold inserts between chains separated by ':'
+LINKER_LENGTH = 25
+
+
+def read_fasta_records(fasta_files: Sequence) -> List[Tuple[str, str]]:
+    """(id, sequence) for every record of every FASTA file, in file order."""
+    records = []
+    for fasta_file in fasta_files:
+        for record in SeqIO.parse(str(fasta_file), "fasta"):
+            records.append((record.id, str(record.seq).upper()))
+    return records
+
+
+def record_filename(record_id: str) -> str:
+    """File-system-safe PDB name for a FASTA record ID."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", record_id).strip("_") + ".pdb"
+
+
+def folded_length(sequence: str, linker: int = LINKER_LENGTH) -> int:
+    """Residues ESMFold processes, counting linkers between ':'-separated chains."""
+    return len(sequence.replace(":", "")) + linker * sequence.count(":")
+
+
+def pair_budget(free_bytes: float, fraction: float = 0.8, bytes_per_pair: float = BYTES_PER_PAIR) -> int:
+    """Batch budget in pair-residues (batch_size * length^2) for the given free memory."""
+    return int(free_bytes * fraction / bytes_per_pair)
+
+
+def plan_batches(lengths: Sequence[int], budget: float, max_batch: int = 16) -> List[List[int]]:
+    """
+    Group record indices into batches of similar length.
+
+    Records are taken longest first; a batch grows while
+    (size + 1) * longest^2 <= budget and size < max_batch. A record over the
+    budget on its own still gets a batch of one.
+
+    Returns:
+        List of batches (lists of indices into lengths)
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches = []
+    for index in order:
+        if batches:
+            batch = batches[-1]
+            longest = lengths[batch[0]]
+            if len(batch) < max_batch and (len(batch) + 1) * longest ** 2 <= budget:
+                batch.append(index)
+                continue
+        batches.append([index])
+    return batches
+
+
+def padding_fraction(lengths: Sequence[int], batches: List[List[int]]) -> float:
+    """Fraction of processed residues that are padding."""
+    padded = sum(len(b) * max(lengths[i] for i in b) for b in batches)
+    return 1 - sum(lengths) / padded if padded else 0.0
+
+
+def write_batch_summary(rows: List[Dict], output_file):
+    """Tab-separated summary: id, length, batch, status, mean pLDDT, batch wall time and peak RSS, PDB."""
+    with open(output_file, "w") as f:
+        f.write("id\tlength\tbatch\tstatus\tmean_plddt\tseconds\tpeak_rss_gb\tpdb\n")
+        for row in rows:
+            plddt = f"{row['plddt']:.2f}" if row.get("plddt") is not None else "NA"
+            seconds = f"{row['seconds']:.1f}" if row.get("seconds") is not None else "NA"
+            rss = f"{row['peak_rss'] / 1e9:.2f}" if row.get("peak_rss") is not None else "NA"
+            f.write(f"{row['id']}\t{row['length']}\t{row['batch']}\t{row['status']}\t{plddt}\t"
+                    f"{seconds}\t{rss}\t{row.get('pdb', '')}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the length-bucketed batch plan for FASTA records")
+    parser.add_argument("--fasta", nargs="+", required=True)
+    parser.add_argument("--budget", type=float, default=4e6, help="Pair-residue budget per batch")
+    parser.add_argument("--max-batch", type=int, default=16)
+    args = parser.parse_args()
+
+    records = read_fasta_records(args.fasta)
+    lengths = [folded_length(seq) for _, seq in records]
+    batches = plan_batches(lengths, args.budget, args.max_batch)
+    print(f"{len(records)} records in {len(batches)} batches "
+          f"({100 * padding_fraction(lengths, batches):.1f}% padding)")
+    for n, batch in enumerate(batches, 1):
+        print(f"  batch {n:3d}: {len(batch):3d} records, length {min(lengths[i] for i in batch)}-"
+              f"{max(lengths[i] for i in batch)}")
+
+
+if __name__ == "__main__":
+    main()
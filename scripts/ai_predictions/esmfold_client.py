@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Client for a running ESMFold worker (esmfold_worker.py).
+
+The worker keeps the model loaded and listens on a Unix socket; requests
+and replies are single-line JSON messages. The client only needs the
+standard library and NumPy, so notebooks and scripts can fold sequences
+without importing torch or loading weights:
+
+    from esmfold_client import ESMFoldClient
+    client = ESMFoldClient()
+    result = client.fold(sequence, name="GyrA_S91P")
+    result["plddt"], result["plddt_residue"], result["pdb"]
+
+Start the worker first (see esmfold_worker.py). The default socket path can
+be overridden with the ESMFOLD_WORKER_SOCKET environment variable.
+
+Usage:
+    python esmfold_client.py --ping
+    python esmfold_client.py --fasta mutants.fasta --output-dir output/ai_predictions/esmfold/mutants
+    python esmfold_client.py --shutdown
+"""
+import argparse
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_SOCKET = os.environ.get("ESMFOLD_WORKER_SOCKET", f"/tmp/esmfold-worker-{os.getuid()}.sock")
+
+
+def send_message(sock: socket.socket, message: Dict):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def read_message(stream) -> Optional[Dict]:
+    """Next JSON message from a line-buffered stream, or None at end of stream."""
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+
+class ESMFoldClient:
+    """Thin client for esmfold_worker.py; one connection per request."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = None):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+
+    def request(self, message: Dict) -> Dict:
+        """Send one request and wait for its reply; RuntimeError if the worker reports an error."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, message)
+            with sock.makefile("rb") as stream:
+                reply = read_message(stream)
+        if reply is None:
+            raise RuntimeError(f"ESMFold worker at {self.socket_path} closed the connection")
+        if not reply.get("ok"):
+            raise RuntimeError(f"ESMFold worker: {reply.get('error', 'unknown error')}")
+        return reply
+
+    def available(self) -> bool:
+        """True if a worker answers on the socket."""
+        try:
+            self.ping()
+            return True
+        except (OSError, RuntimeError):
+            return False
+
+    def ping(self) -> Dict:
+        """Worker settings: backend, model, device, chunk_size, uptime (s), pid."""
+        return self.request({"op": "ping"})
+
+    def stats(self) -> Dict:
+        """Request, sequence and batch counts, and prediction cache statistics."""
+        return self.request({"op": "stats"})
+
+    def shutdown(self):
+        self.request({"op": "shutdown"})
+
+    def fold_batch(self, sequences: Sequence[str], names: Sequence[str] = None, pae: bool = False) -> List:
+        """
+        Fold sequences on the worker; same result layout as run_esmfold_hf.fold_batch.
+
+        The worker groups these (and other clients' pending requests) into
+        length-bucketed batches.
+
+        Returns:
+            Per sequence a dict with 'pdb', 'plddt' (mean), 'plddt_residue',
+            'pae' (None unless requested and predicted), 'cached', and the
+            'seconds' and 'peak_rss' of the worker batch it was folded in;
+            None where the sequence did not fit in memory
+        """
+        reply = self.request({"op": "fold", "sequences": list(sequences),
+                              "names": list(names) if names is not None else None, "pae": pae})
+        results = []
+        for result in reply["results"]:
+            if result is not None:
+                if result.get("plddt_residue") is not None:
+                    result["plddt_residue"] = np.asarray(result["plddt_residue"], dtype=np.float32)
+                result["pae"] = np.asarray(result["pae"], dtype=np.float32) if result.get("pae") else None
+            results.append(result)
+        return results
+
+    def fold(self, sequence: str, name: str = None, pae: bool = False) -> Optional[Dict]:
+        """Fold one sequence (see fold_batch)."""
+        return self.fold_batch([sequence], [name] if name else None, pae)[0]
+
+
+def fold_records(client: ESMFoldClient, records: Sequence, output_dir) -> List[Dict]:
+    """
+    Fold (id, sequence) records on the worker, one PDB per record.
+
+    Returns:
+        batch_summary.tsv rows (esmfold_batching.write_batch_summary), in record order
+    """
+    from esmfold_batching import record_filename, write_batch_summary
+    results = client.fold_batch([seq for _, seq in records], [rid for rid, _ in records])
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for (record_id, seq), result in zip(records, results):
+        row = {"id": record_id, "length": len(seq), "batch": "worker"}
+        if result is None:
+            row.update(status="Failed (OOM)", plddt=None)
+        else:
+            pdb_path = output_dir / record_filename(record_id)
+            with open(pdb_path, "w") as f:
+                f.write(result["pdb"])
+            row.update(status="Success", plddt=result["plddt"], pdb=str(pdb_path),
+                       batch="cached" if result["cached"] else "worker",
+                       seconds=result.get("seconds"), peak_rss=result.get("peak_rss"))
+        rows.append(row)
+        print(f"  {record_id}: {row['status']}" + (f", pLDDT {row['plddt']:.1f}" if row["plddt"] else ""))
+    write_batch_summary(rows, output_dir / "batch_summary.tsv")
+    print(f"Summary saved to: {output_dir / 'batch_summary.tsv'}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to a running ESMFold worker")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Worker socket path")
+    parser.add_argument("--ping", action="store_true", help="Show worker settings and statistics")
+    parser.add_argument("--shutdown", action="store_true", help="Stop the worker")
+    parser.add_argument("--fasta", nargs="+", default=None, help="Fold every record of these FASTA file(s)")
+    parser.add_argument("--output-dir", default=".", help="Output directory for --fasta")
+    args = parser.parse_args()
+
+    client = ESMFoldClient(args.socket)
+    if args.shutdown:
+        client.shutdown()
+        print(f"Worker at {args.socket} stopped")
+        return
+    if args.fasta:
+        from esmfold_batching import read_fasta_records
+        fold_records(client, read_fasta_records(args.fasta), args.output_dir)
+        return
+
+    info = client.ping()
+    stats = client.stats()
+    print(f"ESMFold worker at {args.socket} (pid {info['pid']})")
+    print(f"  {info['model']} ({info['backend']} backend) on {info['device']}, chunk size {info['chunk_size']}")
+    print(f"  Up {info['uptime'] / 60:.1f} min: {stats['requests']} requests, "
+          f"{stats['sequences']} sequences, {stats['folded']} folded in {stats['batches']} batches")
+    for line in stats.get("cache", []):
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
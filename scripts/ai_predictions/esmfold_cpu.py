@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+CPU execution support for ESMFold: threads, precision, chunk-size autotuning
+and per-sequence resource accounting.
+
+On CPU nodes the folding trunk's memory, not compute, decides whether a
+long sequence fits. The trunk processes its triangular attention in chunks;
+smaller chunks need less memory but run slower. autotune_chunk_size folds a
+short probe sequence at each candidate chunk size, measures the peak RSS
+above the loaded-model baseline, extrapolates it to the target length
+(the chunked trunk grows with L^2) and picks the fastest chunk size that
+fits the memory budget.
+
+Peak RSS is read from VmHWM in /proc/self/status, reset before each
+measurement through /proc/self/clear_refs (Linux); elsewhere the
+process-lifetime ru_maxrss is used.
+
+Usage:
+    python run_esmfold_hf.py --cpu --threads 32 --memory-limit 64
+"""
+import os
+import resource
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import torch
+
+# Chunk sizes tried by the autotuner, fastest (largest) first
+CHUNK_CANDIDATES = (128, 64, 32, 16, 8, 4)
+PROBE_LENGTH = 128
+# Fraction of the memory limit the extrapolated peak may use
+SAFETY_FRACTION = 0.85
+
+
+def configure_threads(n_threads: Optional[int] = None) -> int:
+    """Set intra-op threads (default: all cores available to this process)."""
+    if n_threads is None:
+        n_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    torch.set_num_threads(n_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before the first parallel region
+    return n_threads
+
+
+def cpu_supports_bfloat16() -> bool:
+    """True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = next((line for line in f if line.startswith("flags")), "")
+    except OSError:
+        return False
+    return any(flag in flags.split() for flag in ("avx512_bf16", "amx_bf16"))
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter for this process; False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size since the last reset (or process start)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class ResourceMeter:
+    """Wall time and peak RSS of a block: `with ResourceMeter() as meter: ...`."""
+
+    def __enter__(self):
+        reset_peak_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.peak_rss = peak_rss_bytes()
+        return False
+
+
+def autotune_chunk_size(fold: Callable[[str], None], target_length: int, memory_limit: float,
+                        candidates: Sequence[int] = CHUNK_CANDIDATES, probe_length: int = PROBE_LENGTH,
+                        set_chunk_size: Callable[[int], None] = None) -> Dict:
+    """
+    Largest chunk size whose extrapolated peak memory for target_length fits memory_limit.
+
+    fold(sequence) runs one (short) prediction; set_chunk_size(c) applies a
+    candidate. Falls back to the smallest candidate if none is predicted to fit.
+
+    Returns:
+        Dict with 'chunk_size' and 'probes' (per candidate: chunk_size,
+        seconds, probe_bytes, predicted_bytes)
+    """
+    probe = ("MKTAYIAKQRQISFVKSHFSRQ" * (probe_length // 22 + 1))[:probe_length]
+    scale = (max(target_length, probe_length) / probe_length) ** 2
+    probes = []
+    chosen = None
+    for chunk_size in candidates:
+        set_chunk_size(chunk_size)
+        baseline = current_rss_bytes()
+        with ResourceMeter() as meter:
+            fold(probe)
+        extra = max(meter.peak_rss - baseline, 0)
+        predicted = baseline + extra * scale
+        probes.append({"chunk_size": chunk_size, "seconds": meter.seconds,
+                       "probe_bytes": extra, "predicted_bytes": predicted})
+        if predicted <= memory_limit * SAFETY_FRACTION:
+            chosen = chunk_size
+            break
+    if chosen is None:
+        chosen = candidates[-1]
+    set_chunk_size(chosen)
+    return {"chunk_size": chosen, "probes": probes}
+
+
+def format_probes(tuning: Dict) -> List[str]:
+    lines = [f"Chunk size autotuning (chosen: {tuning['chunk_size']})"]
+    for probe in tuning["probes"]:
+        lines.append(f"  chunk {probe['chunk_size']:4d}: probe {probe['seconds']:6.1f} s, "
+                     f"+{probe['probe_bytes'] / 1e9:.2f} GB -> predicted peak {probe['predicted_bytes'] / 1e9:.1f} GB")
+    return lines
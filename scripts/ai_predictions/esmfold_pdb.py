@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Vectorized PDB writing and compact confidence arrays for ESMFold outputs.
+
+atom37_to_pdb writes every present atom of an atom37 prediction into one
+fixed-width byte array (numbers formatted by integer digit arithmetic)
+instead of formatting a Python f-string per atom. The output is identical
+to openfold's protein.to_pdb (PARENT header, ATOM records, TER per chain,
+END). It needs no torch, so it also serves notebooks working from saved
+arrays.
+
+Confidence arrays are stored next to each PDB as <stem>_confidence.npz:
+pLDDT per residue and, when predicted, the PAE matrix, both float16.
+
+Usage:
+    python esmfold_pdb.py output/ai_predictions/esmfold/GyrA/gyrA_esmfold_confidence.npz
+"""
+import argparse
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+# openfold atom37 order and residue types (index 20 = unknown)
+ATOM37_NAMES = ["N", "CA", "C", "CB", "O", "CG", "CG1", "CG2", "OG", "OG1", "SG", "CD", "CD1", "CD2",
+                "ND1", "ND2", "OD1", "OD2", "SD", "CE", "CE1", "CE2", "CE3", "NE", "NE1", "NE2", "OE1",
+                "OE2", "CH2", "NH1", "NH2", "OH", "CZ", "CZ2", "CZ3", "NZ", "OXT"]
+RESTYPES = "ARNDCQEGHILKMFPSTWYV"
+RESTYPE_3 = ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+             "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL", "UNK"]
+CHAIN_TAGS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Atom name field (columns 13-16) and right-justified element of each atom37 slot
+_NAME_FIELD = np.array([f"{n if len(n) == 4 else ' ' + n:<4}" for n in ATOM37_NAMES], dtype="S4")
+_ELEMENT_FIELD = np.array([f"{n[0]:>2}" for n in ATOM37_NAMES], dtype="S2")
+# Fixed part of an ATOM record; variable columns are written into it
+_ATOM_TEMPLATE = np.frombuffer(f"ATOM  {'':5} {'':4} {'':3} {'':1}{'':4}    {'':24}  1.00{'':6}{'':10}{'':2}  \n"
+                               .encode(), dtype=np.uint8)
+
+
+def _text_columns(values: np.ndarray, width: int) -> np.ndarray:
+    """Fixed-width byte strings as an (n, width) uint8 array."""
+    return np.ascontiguousarray(values.astype(f"S{width}")).view(np.uint8).reshape(-1, width)
+
+
+def _number_columns(values: np.ndarray, width: int, decimals: int = 0) -> np.ndarray:
+    """
+    printf-style right-justified numbers ('%{width}.{decimals}f' or '%{width}d') as (n, width) uint8.
+
+    Digits are computed with integer arithmetic on whole arrays. Floats are
+    taken at float32 precision (the model's), where scaling by 10^decimals
+    is exact, so rounding matches printf. Returns None if a value does not fit.
+    """
+    values = np.asarray(values)
+    if decimals:
+        exact = values.astype(np.float32).astype(np.float64)
+        scaled = np.abs(np.rint(exact * 10 ** decimals)).astype(np.int64)
+        negative = np.signbit(exact)
+    else:
+        scaled = np.abs(values.astype(np.int64))
+        negative = values < 0
+    # Digits printed: at least one before the decimal point
+    n_digits = np.maximum(decimals + 1, np.searchsorted(10 ** np.arange(19), scaled, side="right"))
+    used = n_digits + (decimals > 0) + negative
+    if len(values) and used.max() > width:
+        return None
+    out = np.full((len(values), width), ord(" "), dtype=np.uint8)
+    rows = np.arange(len(values))
+    position = width - 1
+    for k in range(int(n_digits.max()) if len(values) else 0):
+        if decimals and k == decimals:
+            out[:, position] = ord(".")
+            position -= 1
+        present = k < n_digits
+        out[present, position] = ord("0") + (scaled[present] // 10 ** k) % 10
+        position -= 1
+    sign_column = width - 1 - n_digits - (decimals > 0)
+    out[rows[negative], sign_column[negative]] = ord("-")
+    return out
+
+
+def atom37_to_pdb(aatype: np.ndarray, positions: np.ndarray, mask: np.ndarray, residue_index: np.ndarray,
+                  b_factors: np.ndarray, chain_index: Optional[np.ndarray] = None) -> str:
+    """
+    PDB text of one atom37 structure.
+
+    aatype (L,), positions (L, 37, 3), mask (L, 37), residue_index (L,)
+    (numbers written as given), b_factors (L, 37), chain_index (L,) or None.
+    """
+    aatype = np.asarray(aatype)
+    if np.any(aatype > len(RESTYPE_3) - 1):
+        raise ValueError("Invalid aatypes.")
+    n = len(aatype)
+    chain_index = np.zeros(n, dtype=int) if chain_index is None else np.asarray(chain_index)
+    residue_index = np.asarray(residue_index).astype(np.int32)
+
+    residue, slot = np.nonzero(np.asarray(mask) >= 0.5)
+    # A TER record after each chain's last residue takes a serial number too
+    chain_end = np.append(chain_index[1:] != chain_index[:-1], True) if n else np.zeros(0, dtype=bool)
+    ters_before = np.concatenate([[0], np.cumsum(chain_end)])
+    serial = np.arange(1, len(residue) + 1) + ters_before[residue]
+
+    resname = np.array(RESTYPE_3)[aatype]
+    chain_tag = np.array(list(CHAIN_TAGS))[chain_index]
+    xyz = np.asarray(positions)[residue, slot]
+    numbers = [(6, _number_columns(serial, 5)), (22, _number_columns(residue_index[residue], 4)),
+               (30, _number_columns(xyz[:, 0], 8, 3)), (38, _number_columns(xyz[:, 1], 8, 3)),
+               (46, _number_columns(xyz[:, 2], 8, 3)),
+               (60, _number_columns(np.asarray(b_factors)[residue, slot], 6, 2))]
+    if any(column is None for _, column in numbers):
+        # Values wider than their PDB columns; printf widens the field
+        return _atom37_to_pdb_text(aatype, positions, mask, residue_index, b_factors, chain_index)
+
+    lines = np.repeat(_ATOM_TEMPLATE[None, :], len(residue), axis=0)
+    for start, column in numbers:
+        lines[:, start:start + column.shape[1]] = column
+    lines[:, 12:16] = _text_columns(_NAME_FIELD, 4)[slot]
+    lines[:, 17:20] = _text_columns(resname, 3)[residue]
+    lines[:, 21:22] = _text_columns(chain_tag, 1)[residue]
+    lines[:, 76:78] = _text_columns(_ELEMENT_FIELD, 2)[slot]
+
+    # Split the atom lines by chain and close each chain with TER
+    ends = np.nonzero(chain_end)[0]
+    stops = np.searchsorted(residue, ends, side="right")
+    blocks = []
+    start = 0
+    for k, (end, stop) in enumerate(zip(ends, stops)):
+        ter_serial = stop + 1 + k
+        blocks.append("PARENT N/A\n" + lines[start:stop].tobytes().decode()
+                      + f"TER   {ter_serial:>5}      {resname[end]:>3} {chain_tag[end]:>1}{residue_index[end]:>4}\n")
+        start = stop
+    return "".join(blocks) + "END\n"
+
+
+def _atom37_to_pdb_text(aatype, positions, mask, residue_index, b_factors, chain_index) -> str:
+    """Line-by-line fallback of atom37_to_pdb for values that overflow their columns."""
+    pdb_lines = []
+    serial = 1
+    for i in range(len(aatype)):
+        if i == 0 or chain_index[i] != chain_index[i - 1]:
+            pdb_lines.append("PARENT N/A")
+        chain_tag = CHAIN_TAGS[chain_index[i]]
+        for a in np.nonzero(np.asarray(mask[i]) >= 0.5)[0]:
+            x, y, z = positions[i][a]
+            name = ATOM37_NAMES[a]
+            name = name if len(name) == 4 else f" {name}"
+            pdb_lines.append(f"ATOM  {serial:>5} {name:<4} {RESTYPE_3[aatype[i]]:>3} {chain_tag:>1}"
+                             f"{residue_index[i]:>4}    {x:>8.3f}{y:>8.3f}{z:>8.3f}  1.00{b_factors[i][a]:>6.2f}"
+                             f"          {ATOM37_NAMES[a][0]:>2}  ")
+            serial += 1
+        if i == len(aatype) - 1 or chain_index[i + 1] != chain_index[i]:
+            pdb_lines.append(f"TER   {serial:>5}      {RESTYPE_3[aatype[i]]:>3} {chain_tag:>1}{residue_index[i]:>4}")
+            serial += 1
+    pdb_lines.append("END")
+    pdb_lines.append("")
+    return "\n".join(pdb_lines)
+
+
+def confidence_path(pdb_path) -> Path:
+    pdb_path = Path(pdb_path)
+    return pdb_path.with_name(f"{pdb_path.stem}_confidence.npz")
+
+
+def save_confidence(pdb_path, plddt, pae=None) -> Path:
+    """Save per-residue pLDDT (and PAE) as float16 next to a PDB; returns the .npz path."""
+    arrays = {"plddt": np.asarray(plddt, dtype=np.float16)}
+    if pae is not None:
+        arrays["pae"] = np.asarray(pae, dtype=np.float16)
+    path = confidence_path(pdb_path)
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+def load_confidence(path) -> Dict[str, np.ndarray]:
+    """'plddt' and, if saved, 'pae' as float32 arrays."""
+    with np.load(path) as arrays:
+        return {name: arrays[name].astype(np.float32) for name in arrays.files}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize saved ESMFold confidence arrays")
+    parser.add_argument("npz", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.npz:
+        confidence = load_confidence(path)
+        plddt = confidence["plddt"]
+        line = f"{path}: {len(plddt)} residues, mean pLDDT {plddt.mean():.2f}"
+        if "pae" in confidence:
+            line += f", mean PAE {confidence['pae'].mean():.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
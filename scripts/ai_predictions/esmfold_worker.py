@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Long-lived local ESMFold worker: loads the model once and serves fold requests.
+
+Loading esmfold_v1 costs more than folding a single GyrA mutant, so
+iterative studies keep one worker running and send it sequences through
+esmfold_client.py (or run_esmfold_hf.py / run_esmfold.py with --worker).
+
+The worker listens on a Unix socket (readable by the owner only). Each
+connection carries one single-line JSON request and gets one single-line
+JSON reply:
+
+    {"op": "fold", "sequences": [...], "names": [...], "pae": false}
+    {"op": "ping"} | {"op": "stats"} | {"op": "shutdown"}
+
+Connections are handled on their own threads and queue their sequences;
+one inference loop drains the queue, answers cache hits directly
+(prediction_cache.py, Hugging Face backend), folds each distinct sequence
+once and packs the rest into length-bucketed batches (esmfold_batching.py),
+so requests from several clients share batches.
+
+Usage:
+    python esmfold_worker.py
+    python esmfold_worker.py --cpu --threads 32 --tune-length 900
+    python esmfold_worker.py --backend esm --socket /tmp/esmfold.sock
+"""
+import argparse
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from esmfold_batching import LINKER_LENGTH, folded_length, pair_budget, plan_batches
+from esmfold_client import DEFAULT_SOCKET, ESMFoldClient, read_message, send_message
+from esmfold_cpu import ResourceMeter, configure_threads
+from prediction_cache import PredictionCache, prediction_key
+
+# Sequences taken from the queue for one round of batching
+MAX_PENDING = 64
+
+
+class FoldJob:
+    """One sequence of a fold request, completed by the inference loop."""
+
+    def __init__(self, sequence: str, name: str):
+        self.sequence = sequence
+        self.name = name
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def finish(self, result: Optional[Dict] = None, error: str = None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+def load_backend(backend: str, device: str, chunk_size: int = None, tune_length: int = None,
+                 memory_limit_gb: float = None) -> Dict:
+    """
+    Load the model for a backend ('hf': transformers, 'esm': fair-esm).
+
+    Returns:
+        Dict with 'fold' (sequences -> fold_batch-style result dicts),
+        'prepare' (sequence as folded), 'linker', 'model_name', 'chunk_size'
+        and 'free_memory' (bytes free on the device)
+    """
+    if backend == "hf":
+        import run_esmfold_hf as hf
+        model, tokenizer = hf.load_model(device, chunk_size)
+        if device == "cpu" and chunk_size is None and tune_length:
+            hf.tune_cpu_chunk_size(model, tokenizer, tune_length,
+                                   memory_limit_gb or hf.free_memory_bytes("cpu") / 1e9)
+        return {
+            "fold": partial(hf.fold_batch, model, tokenizer, device=device),
+            # The Hugging Face tokenizer folds a single chain
+            "prepare": lambda seq: seq.replace(":", ""),
+            "linker": hf.LINKER,
+            "model_name": hf.MODEL_NAME,
+            "chunk_size": model.trunk.chunk_size,
+            "free_memory": partial(hf.free_memory_bytes, device),
+        }
+
+    import run_esmfold as fe
+    model = fe.load_model(device, chunk_size)
+    if device == "cpu" and chunk_size is None and tune_length:
+        fe.tune_cpu_chunk_size(model, tune_length, memory_limit_gb or fe.free_memory_bytes("cpu") / 1e9)
+
+    def fold(sequences):
+        # fair-esm reports mean pLDDT only
+        return [None if result is None else
+                {"pdb": result[0], "plddt": result[1], "plddt_residue": None, "pae": None}
+                for result in fe.fold_batch(model, sequences, device)]
+
+    return {
+        "fold": fold,
+        "prepare": lambda seq: seq,
+        "linker": LINKER_LENGTH,
+        "model_name": "esmfold_v1 (fair-esm)",
+        "chunk_size": model.trunk.chunk_size,
+        "free_memory": partial(fe.free_memory_bytes, device),
+    }
+
+
+def result_message(result: Optional[Dict], pae: bool) -> Optional[Dict]:
+    """JSON-serializable form of a fold result."""
+    if result is None:
+        return None
+    message = {key: result.get(key) for key in ("pdb", "cached", "seconds", "peak_rss")}
+    message["plddt"] = float(result["plddt"])
+    if result.get("plddt_residue") is not None:
+        message["plddt_residue"] = np.round(np.asarray(result["plddt_residue"], dtype=float), 2).tolist()
+    if pae and result.get("pae") is not None:
+        message["pae"] = np.round(np.asarray(result["pae"], dtype=float), 2).tolist()
+    return message
+
+
+class ESMFoldWorker:
+    """Request queue in front of one loaded model."""
+
+    def __init__(self, backend: Dict, backend_name: str, device: str, cache=None,
+                 budget: float = None, max_batch: int = 16):
+        self.backend = backend
+        self.backend_name = backend_name
+        self.device = device
+        self.cache = cache
+        self.budget = budget
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.started = time.time()
+        self.requests = 0
+        self.sequences = 0
+        self.folded = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def cache_key(self, sequence: str) -> str:
+        return prediction_key(sequence, self.backend["model_name"], self.backend["chunk_size"],
+                              self.backend["linker"])
+
+    def handle(self, message: Dict) -> Dict:
+        """Reply to one request; fold requests block until all their sequences are done."""
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True, "backend": self.backend_name, "model": self.backend["model_name"],
+                    "device": self.device, "chunk_size": self.backend["chunk_size"],
+                    "uptime": time.time() - self.started, "pid": os.getpid()}
+        if op == "stats":
+            return {"ok": True, "requests": self.requests, "sequences": self.sequences, "folded": self.folded,
+                    "batches": self.batches, "busy_seconds": self.busy_seconds,
+                    "cache": self.cache.stats_lines() if self.cache is not None else []}
+        if op == "shutdown":
+            self.queue.put(None)
+            return {"ok": True}
+        if op != "fold":
+            raise ValueError(f"unknown op {op!r}")
+
+        sequences = message.get("sequences")
+        if not isinstance(sequences, list) or not all(isinstance(s, str) and s.strip() for s in sequences):
+            raise ValueError("'sequences' must be a list of non-empty strings")
+        names = message.get("names") or [f"seq{k + 1}" for k in range(len(sequences))]
+        jobs = [FoldJob(self.backend["prepare"](seq.strip().upper()), name) for seq, name in zip(sequences, names)]
+        self.requests += 1
+        self.sequences += len(jobs)
+        self.queue.put(jobs)
+        for job in jobs:
+            job.done.wait()
+        errors = [job.error for job in jobs if job.error]
+        if errors:
+            return {"ok": False, "error": errors[0]}
+        return {"ok": True, "results": [result_message(job.result, message.get("pae", False)) for job in jobs]}
+
+    def run(self):
+        """Inference loop: fold queued requests until a shutdown request arrives."""
+        while True:
+            request = self.queue.get()
+            if request is None:
+                return
+            pending = list(request)
+            # Requests that arrived meanwhile join this round
+            while len(pending) < MAX_PENDING:
+                try:
+                    more = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self.queue.put(None)
+                    break
+                pending.extend(more)
+            start = time.perf_counter()
+            try:
+                self.fold_pending(pending)
+            except Exception as e:
+                traceback.print_exc()
+                for job in pending:
+                    if not job.done.is_set():
+                        job.finish(error=f"{type(e).__name__}: {e}")
+            self.busy_seconds += time.perf_counter() - start
+
+    def fold_pending(self, jobs: List[FoldJob]):
+        """Answer cache hits, then fold each distinct remaining sequence once, in length buckets."""
+        todo = {}
+        for job in jobs:
+            cached = self.cache.get(self.cache_key(job.sequence)) if self.cache is not None else None
+            if cached is not None:
+                job.finish({"pdb": cached["pdb"], "plddt": cached["meta"]["mean_plddt"],
+                            "plddt_residue": cached["plddt"], "pae": cached["pae"], "cached": True})
+            else:
+                todo.setdefault(job.sequence, []).append(job)
+        if not todo:
+            return
+
+        sequences = list(todo)
+        lengths = [folded_length(seq, self.backend["linker"]) for seq in sequences]
+        budget = self.budget or pair_budget(self.backend["free_memory"]())
+        batches = plan_batches(lengths, budget, self.max_batch)
+        print(f"[{time.strftime('%H:%M:%S')}] {len(jobs)} queued sequences: "
+              f"{len(jobs) - sum(len(j) for j in todo.values())} cached, {len(sequences)} to fold "
+              f"in {len(batches)} batches")
+        for batch in batches:
+            with ResourceMeter() as meter:
+                results = self.backend["fold"]([sequences[i] for i in batch])
+            self.batches += 1
+            print(f"  {len(batch)} sequences, {min(lengths[i] for i in batch)}-{max(lengths[i] for i in batch)} "
+                  f"residues: {meter.seconds:.1f} s, peak RSS {meter.peak_rss / 1e9:.2f} GB")
+            for i, result in zip(batch, results):
+                if result is not None:
+                    result.update(cached=False, seconds=meter.seconds, peak_rss=meter.peak_rss)
+                    self.folded += 1
+                    if self.cache is not None and result.get("plddt_residue") is not None:
+                        first = todo[sequences[i]][0]
+                        self.cache.put(self.cache_key(sequences[i]), result["pdb"], result["plddt_residue"],
+                                       result["pae"], {"name": first.name, "model": self.backend["model_name"],
+                                                       "chunk_size": self.backend["chunk_size"],
+                                                       "linker": self.backend["linker"]})
+                for job in todo[sequences[i]]:
+                    job.finish(result)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = read_message(self.rfile)
+        if message is None:
+            return
+        try:
+            reply = self.server.worker.handle(message)
+        except Exception as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        send_message(self.request, reply)
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, worker: ESMFoldWorker):
+        self.worker = worker
+        super().__init__(socket_path, RequestHandler)
+
+
+def serve(worker: ESMFoldWorker, socket_path: str):
+    """Listen on socket_path and run the inference loop until shutdown (or SIGINT/SIGTERM)."""
+    if os.path.exists(socket_path):
+        if ESMFoldClient(socket_path).available():
+            sys.exit(f"A worker is already listening on {socket_path}")
+        os.unlink(socket_path)  # Left behind by a worker that did not exit cleanly
+
+    old_umask = os.umask(0o177)
+    try:
+        server = WorkerServer(socket_path, worker)
+    finally:
+        os.umask(old_umask)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"\nESMFold worker listening on {socket_path} (pid {os.getpid()})")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print(f"\nWorker stopped: {worker.requests} requests, {worker.sequences} sequences, "
+              f"{worker.folded} folded in {worker.batches} batches ({worker.busy_seconds:.0f} s busy)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ESMFold predictions from one loaded model")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--backend", choices=["hf", "esm"], default="hf",
+                        help="Hugging Face transformers (default) or fair-esm")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Batch budget in pair-residues (batch size x length^2); default from free memory")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Prediction cache directory (hf backend; default: run_esmfold_hf.py's)")
+    parser.add_argument("--no-cache", action="store_true", help="Always run inference")
+    parser.add_argument("--cpu", action="store_true", help="Run on CPU even if a GPU is available")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads (default: all available cores)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Fixed trunk chunk size")
+    parser.add_argument("--tune-length", type=int, default=None,
+                        help="CPU mode: autotune the chunk size for sequences up to this length")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="CPU mode: memory budget in GB for chunk-size autotuning (default: free RAM)")
+    args = parser.parse_args()
+
+    import torch
+    device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+    print(f"Using device: {device}")
+    if device == "cpu":
+        print(f"CPU threads: {configure_threads(args.threads)}")
+    start = time.perf_counter()
+    backend = load_backend(args.backend, device, args.chunk_size, args.tune_length, args.memory_limit)
+    print(f"Model loaded in {time.perf_counter() - start:.1f} s (chunk size {backend['chunk_size']})")
+
+    cache = None
+    if args.backend == "hf" and not args.no_cache:
+        from run_esmfold_hf import CACHE_DIR
+        cache = PredictionCache(args.cache_dir or CACHE_DIR)
+        print(f"Prediction cache: {cache.cache_dir}")
+
+    worker = ESMFoldWorker(backend, args.backend, device, cache, args.budget, args.max_batch)
+    serve(worker, args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+ESMFold panel of GyrA QRDR resistance mutants in M. abscessus.
+
+Substitutions are given in M. tuberculosis GyrA numbering (the 5BS8
+template numbering used by check_binding_conservation.py, e.g. S91P, D94G)
+and mapped onto the M. abscessus sequence through the template alignment
+(MTB S91/D94 = Mabs S93/D96). By default the panel holds the known
+fluoroquinolone resistance substitutions and every double mutant combining
+two of them at different positions; --scan adds all 19 substitutions at
+the given positions instead of the known list.
+
+The wild type and all mutants are folded in length-bucketed batches through
+run_esmfold_hf.py (or a running esmfold_worker.py with --worker). Predictions
+go through the prediction cache, so the wild type from an earlier GyrA run
+and mutants from earlier panels are not folded again.
+
+All models are then compared with the wild type in one pass over stacked
+CA arrays: each is superposed onto the wild type on the binding site
+(residues with CA within --site-radius of the QRDR key residues G88, A90,
+S91, D94), giving the local RMSD, and per-residue pLDDT differences are
+averaged over the site and the mutated residues.
+
+Usage:
+    python mutant_panel.py
+    python mutant_panel.py --mutations S91P D94G A90V+D94G --no-doubles
+    python mutant_panel.py --scan 90 91 94 --worker
+    python mutant_panel.py --analyze-only --output-dir output/ai_predictions/esmfold/qrdr_panel
+"""
+import argparse
+import csv
+import itertools
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from esmfold_batching import read_fasta_records, record_filename
+from esmfold_client import DEFAULT_SOCKET, ESMFoldClient, fold_records
+from loop_detection import alignment_columns, ca_residues, parse_grishin
+from pdb_structure import kabsch_batch, read_structure
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+GYRA_FASTA = PROJECT_DIR / "input" / "sequences" / "B1ME58_GyrA.fasta"
+GYRA_ALIGNMENT = PROJECT_DIR / "input" / "alignments_final" / "alignment_gyrA_proper.grishin"
+TEMPLATE_PDB = PROJECT_DIR / "input" / "templates" / "5bs8_chainA.pdb"
+OUTPUT_DIR = PROJECT_DIR / "output" / "ai_predictions" / "esmfold" / "qrdr_panel"
+
+# MTB GyrA numbering
+QRDR = (74, 113)
+KEY_RESIDUES = (88, 90, 91, 94)
+RESISTANCE_MUTATIONS = ["G88A", "G88C", "A90V", "S91P", "D94A", "D94G", "D94H", "D94N", "D94Y"]
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+SITE_RADIUS = 10.0
+
+
+def template_numbering(sequence: str, alignment_file=GYRA_ALIGNMENT, template_pdb=TEMPLATE_PDB,
+                       chain: str = "A") -> Dict[int, int]:
+    """
+    Template (MTB) residue number -> 0-based index in the target sequence.
+
+    Only columns where both rows have a residue are mapped.
+    """
+    target, template, _, _ = parse_grishin(str(alignment_file))
+    if target.replace("-", "") != sequence:
+        raise ValueError(f"{alignment_file}: target row does not match the GyrA sequence")
+    _, resseq = ca_residues(read_structure(str(template_pdb)), chain)
+    columns = alignment_columns(target, template)
+    paired = (columns["target"] >= 0) & (columns["template"] >= 0)
+    return {int(resseq[k]): int(i) for k, i in zip(columns["template"][paired], columns["target"][paired])}
+
+
+def parse_mutation(label: str) -> List[Tuple[str, int, str]]:
+    """'A90V+D94G' -> [('A', 90, 'V'), ('D', 94, 'G')]"""
+    substitutions = []
+    for part in label.split("+"):
+        if len(part) < 3 or not part[1:-1].isdigit():
+            raise ValueError(f"Cannot parse mutation '{label}' (expected e.g. S91P or A90V+D94G)")
+        substitutions.append((part[0].upper(), int(part[1:-1]), part[-1].upper()))
+    return substitutions
+
+
+def scan_mutations(sequence: str, numbering: Dict[int, int], positions: Sequence[int]) -> List[str]:
+    """Every substitution at the given MTB positions, labelled with the Mabs wild-type residue."""
+    labels = []
+    for position in positions:
+        wild_type = sequence[numbering[position]]
+        labels.extend(f"{wild_type}{position}{aa}" for aa in AMINO_ACIDS if aa != wild_type)
+    return labels
+
+
+def panel_mutations(singles: Sequence[str], doubles: bool = True) -> List[str]:
+    """Singles, then (optionally) every pair of singles at different positions."""
+    panel = list(dict.fromkeys(singles))
+    if doubles:
+        single = [m for m in panel if "+" not in m]
+        for a, b in itertools.combinations(single, 2):
+            if parse_mutation(a)[0][1] != parse_mutation(b)[0][1]:
+                panel.append(f"{a}+{b}")
+    return panel
+
+
+def mutant_records(sequence: str, numbering: Dict[int, int], mutations: Sequence[str],
+                   prefix: str = "GyrA") -> Tuple[List[Tuple[str, str]], Dict[str, List[int]]]:
+    """
+    FASTA records of the wild type and each mutant.
+
+    Returns:
+        ((id, sequence) records with the wild type first, record id -> 0-based
+        mutated positions)
+    """
+    records = [(f"{prefix}_WT", sequence)]
+    mutated = {records[0][0]: []}
+    for label in mutations:
+        residues = list(sequence)
+        positions = []
+        for wild_type, position, mutant in parse_mutation(label):
+            if position not in numbering:
+                raise ValueError(f"{label}: MTB residue {position} is not aligned to M. abscessus GyrA")
+            if not QRDR[0] <= position <= QRDR[1]:
+                print(f"  WARNING: {label}: residue {position} is outside the QRDR ({QRDR[0]}-{QRDR[1]})")
+            index = numbering[position]
+            if sequence[index] != wild_type:
+                raise ValueError(f"{label}: M. abscessus has {sequence[index]}{index + 1} "
+                                 f"at MTB position {position}, not {wild_type}")
+            if mutant not in AMINO_ACIDS or mutant == wild_type:
+                raise ValueError(f"{label}: invalid substitution {wild_type}->{mutant}")
+            residues[index] = mutant
+            positions.append(index)
+        record_id = f"{prefix}_{label}"
+        records.append((record_id, "".join(residues)))
+        mutated[record_id] = positions
+    return records, mutated
+
+
+def mabs_label(label: str, numbering: Dict[int, int]) -> str:
+    """A mutation label in M. abscessus numbering (MTB S91P -> S93P)."""
+    return "+".join(f"{w}{numbering[p] + 1}{m}" for w, p, m in parse_mutation(label))
+
+
+def load_models(pdb_paths: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CA coordinates (M, L, 3) and per-residue pLDDT (M, L, 0-100 scale) of
+    equal-length models; pLDDT is read from the CA B-factors.
+    """
+    coords, plddt = [], []
+    for path in pdb_paths:
+        structure = read_structure(str(path))
+        mask = structure.atom_mask("CA")
+        coords.append(structure.coords[mask])
+        bfactor = structure.bfactor[mask]
+        # The Hugging Face model writes pLDDT as 0-1
+        plddt.append(bfactor * 100 if bfactor.max() <= 1 else bfactor)
+    lengths = {len(c) for c in coords}
+    if len(lengths) > 1:
+        raise ValueError(f"Models differ in length: {sorted(lengths)}")
+    return np.stack(coords), np.stack(plddt)
+
+
+def site_residues(ca: np.ndarray, centres: Sequence[int], radius: float = SITE_RADIUS) -> np.ndarray:
+    """Indices of residues with CA within radius of any centre residue's CA."""
+    distances = np.linalg.norm(ca[:, None] - ca[list(centres)][None], axis=-1)
+    return np.nonzero((distances <= radius).any(axis=1))[0]
+
+
+def panel_metrics(wt_ca: np.ndarray, wt_plddt: np.ndarray, ca: np.ndarray, plddt: np.ndarray,
+                  site: np.ndarray, mutated: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-model deviation from the wild type, computed on stacked arrays.
+
+    wt_ca (L, 3), wt_plddt (L,), ca (M, L, 3), plddt (M, L), site (K,)
+    residue indices, mutated (M, L) mask of substituted residues.
+
+    Returns:
+        Arrays of length M: site_rmsd (after superposition on the site),
+        global_rmsd (after global superposition), plddt, site_plddt,
+        delta_site_plddt, min_delta_site_plddt, delta_mutated_plddt
+    """
+    def fitted_rmsd(P, Q):
+        R, t = kabsch_batch(P, Q)
+        fitted = np.einsum('mij,mnj->mni', R, P) + t[:, None]
+        return np.sqrt(np.mean(np.sum((fitted - Q) ** 2, axis=-1), axis=-1))
+
+    delta = plddt - wt_plddt
+    n_mutated = mutated.sum(axis=1)
+    return {
+        "site_rmsd": fitted_rmsd(ca[:, site], wt_ca[site]),
+        "global_rmsd": fitted_rmsd(ca, wt_ca),
+        "plddt": plddt.mean(axis=1),
+        "site_plddt": plddt[:, site].mean(axis=1),
+        "delta_site_plddt": delta[:, site].mean(axis=1),
+        "min_delta_site_plddt": delta[:, site].min(axis=1),
+        "delta_mutated_plddt": np.where(n_mutated > 0, (delta * mutated).sum(axis=1) / np.maximum(n_mutated, 1), 0.0),
+    }
+
+
+def analyze_panel(records: Sequence[Tuple[str, str]], mutated: Dict[str, List[int]], output_dir,
+                  key_positions: Sequence[int], radius: float = SITE_RADIUS) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Compare every folded mutant with the wild type (first record).
+
+    Returns:
+        (one row per mutant with its PDB present, binding-site residue indices)
+    """
+    output_dir = Path(output_dir)
+    paths = [output_dir / record_filename(record_id) for record_id, _ in records]
+    if not paths[0].exists():
+        raise FileNotFoundError(f"Wild-type model not found: {paths[0]}")
+    present = [k for k in range(1, len(records)) if paths[k].exists()]
+    ca, plddt = load_models([paths[0]] + [paths[k] for k in present])
+    site = site_residues(ca[0], key_positions, radius)
+
+    mask = np.zeros(plddt[1:].shape, dtype=bool)
+    for row, k in enumerate(present):
+        mask[row, mutated[records[k][0]]] = True
+    metrics = panel_metrics(ca[0], plddt[0], ca[1:], plddt[1:], site, mask)
+    rows = []
+    for row, k in enumerate(present):
+        rows.append({"id": records[k][0], "n_substitutions": len(mutated[records[k][0]]),
+                     **{name: float(values[row]) for name, values in metrics.items()}})
+    return rows, site
+
+
+def write_panel_report(rows: Sequence[Dict], labels: Dict[str, Tuple[str, str]], output_file):
+    """Tab-separated per-mutant report, most perturbed binding site first."""
+    fields = ["id", "mtb", "mabs", "n_substitutions", "site_rmsd", "global_rmsd", "plddt", "site_plddt",
+              "delta_site_plddt", "min_delta_site_plddt", "delta_mutated_plddt"]
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(fields)
+        for row in sorted(rows, key=lambda r: -r["site_rmsd"]):
+            mtb, mabs = labels[row["id"]]
+            writer.writerow([row["id"], mtb, mabs, row["n_substitutions"]]
+                            + [f"{row[name]:.3f}" for name in fields[4:]])
+
+
+def fold_panel(records: Sequence[Tuple[str, str]], output_dir, args):
+    """Fold the panel locally (run_esmfold_hf.py) or on a running worker."""
+    if args.worker:
+        fold_records(ESMFoldClient(args.worker), records, output_dir)
+        return
+
+    from functools import partial
+    import torch
+    from esmfold_cpu import configure_threads
+    from prediction_cache import PredictionCache
+    from run_esmfold_hf import (CACHE_DIR, fold_batch, free_memory_bytes, load_model, predict_fasta,
+                                tune_cpu_chunk_size)
+
+    panel_fasta = Path(output_dir) / "panel.fasta"
+    with open(panel_fasta, "w") as f:
+        f.writelines(f">{record_id}\n{seq}\n" for record_id, seq in records)
+    device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+    print(f"\nUsing device: {device}")
+    if device == "cpu":
+        print(f"CPU threads: {configure_threads(args.threads)}")
+    model, tokenizer = load_model(device, args.chunk_size)
+    if device == "cpu" and args.chunk_size is None:
+        tune_cpu_chunk_size(model, tokenizer, len(records[0][1]), free_memory_bytes("cpu") / 1e9)
+    cache = None if args.no_cache else PredictionCache(args.cache_dir or CACHE_DIR)
+    predict_fasta(partial(fold_batch, model, tokenizer, device=device), [panel_fasta], output_dir, device,
+                  args.budget, args.max_batch, cache, model.trunk.chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold and compare GyrA QRDR resistance mutants with ESMFold")
+    parser.add_argument("--fasta", default=str(GYRA_FASTA), help="Wild-type M. abscessus GyrA FASTA")
+    parser.add_argument("--mutations", nargs="+", default=None,
+                        help="Substitutions in MTB numbering, doubles joined by '+' (default: known resistance set)")
+    parser.add_argument("--scan", nargs="+", type=int, default=None, metavar="POSITION",
+                        help="All substitutions at these MTB positions instead of the known set")
+    parser.add_argument("--no-doubles", action="store_true", help="Single substitutions only")
+    parser.add_argument("--site-radius", type=float, default=SITE_RADIUS,
+                        help="CA distance (A) from the QRDR key residues defining the binding site")
+    parser.add_argument("--output-dir", default=str(OUTPUT_DIR), help="Output directory")
+    parser.add_argument("--analyze-only", action="store_true", help="Compare existing models without folding")
+    parser.add_argument("--worker", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Fold with a running esmfold_worker.py (default socket: {DEFAULT_SOCKET})")
+    parser.add_argument("--budget", type=float, default=None, help="Batch budget in pair-residues")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--cache-dir", default=None, help="Prediction cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Always run inference")
+    parser.add_argument("--cpu", action="store_true", help="Run on CPU even if a GPU is available")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Fixed trunk chunk size")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("GyrA QRDR Mutant Panel (ESMFold)")
+    print("=" * 70)
+
+    sequence = read_fasta_records([args.fasta])[0][1]
+    numbering = template_numbering(sequence)
+    singles = scan_mutations(sequence, numbering, args.scan) if args.scan else (args.mutations or RESISTANCE_MUTATIONS)
+    mutations = panel_mutations(singles, doubles=not args.no_doubles)
+    records, mutated = mutant_records(sequence, numbering, mutations)
+    labels = {record_id: (label, mabs_label(label, numbering)) for (record_id, _), label in zip(records[1:], mutations)}
+    n_doubles = sum("+" in m for m in mutations)
+    print(f"\n{len(mutations) - n_doubles} single and {n_doubles} double mutants "
+          f"of {len(sequence)}-residue GyrA, plus wild type")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not args.analyze_only:
+        fold_panel(records, output_dir, args)
+
+    rows, site = analyze_panel(records, mutated, output_dir, [numbering[p] for p in KEY_RESIDUES],
+                               args.site_radius)
+    report = output_dir / "mutant_panel.tsv"
+    write_panel_report(rows, labels, report)
+
+    print(f"\nBinding site: {len(site)} residues within {args.site_radius:.0f} A of "
+          + ", ".join(f"{sequence[numbering[p]]}{numbering[p] + 1}" for p in KEY_RESIDUES) + " (Mabs)")
+    print(f"{len(rows)} of {len(mutations)} mutants compared with wild type\n")
+    print(f"{'Mutant (MTB)':<16} {'Mabs':<14} {'Site RMSD':>10} {'Global':>8} {'dpLDDT site':>12} {'dpLDDT mut':>11}")
+    print("-" * 76)
+    for row in sorted(rows, key=lambda r: -r["site_rmsd"])[:20]:
+        mtb, mabs = labels[row["id"]]
+        print(f"{mtb:<16} {mabs:<14} {row['site_rmsd']:>10.2f} {row['global_rmsd']:>8.2f} "
+              f"{row['delta_site_plddt']:>12.1f} {row['delta_mutated_plddt']:>11.1f}")
+    print(f"\nReport saved to: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of ESMFold predictions.
+
+A prediction is keyed by the SHA-256 of everything that determines it: the
+sequence, the model name, the trunk chunk size and the chain-linker
+settings. Each entry stores the PDB text and per-residue pLDDT / PAE arrays:
+
+    <cache_dir>/<key[:2]>/<key>.pdb
+    <cache_dir>/<key[:2]>/<key>.npz     plddt (L,), pae (L, L) if predicted
+    <cache_dir>/<key[:2]>/<key>.json    sequence length, settings, mean pLDDT
+
+Entries are written to temporary files and renamed, so an interrupted run
+never leaves a half-written entry behind.
+
+Usage:
+    python prediction_cache.py --cache-dir output/ai_predictions/esmfold/cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def prediction_key(sequence: str, model_name: str, chunk_size: Optional[int], linker: int = 0) -> str:
+    """Cache key for one prediction."""
+    settings = {
+        "sequence": sequence.upper(),
+        "model": model_name,
+        "chunk_size": chunk_size,
+        "linker": linker,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def _write_atomic(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class PredictionCache:
+    """Sequence-hash keyed store of PDBs and per-residue confidence arrays."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.residues_reused = 0
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key, ".json").exists()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Cached prediction, or None on a miss.
+
+        Returns:
+            Dict with 'pdb', 'plddt' (per residue), 'pae' (or None) and 'meta'
+        """
+        meta_path = self._path(key, ".json")
+        if not meta_path.exists():
+            self.misses += 1
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(self._path(key, ".pdb")) as f:
+            pdb = f.read()
+        with np.load(self._path(key, ".npz")) as arrays:
+            plddt = arrays["plddt"]
+            pae = arrays["pae"] if "pae" in arrays.files else None
+        self.hits += 1
+        self.residues_reused += meta.get("length", len(plddt))
+        return {"pdb": pdb, "plddt": plddt, "pae": pae, "meta": meta}
+
+    def put(self, key: str, pdb: str, plddt, pae=None, meta: Dict = None):
+        """Store a prediction; the JSON metadata is written last and marks the entry complete."""
+        self._path(key, "").parent.mkdir(parents=True, exist_ok=True)
+        plddt = np.asarray(plddt, dtype=np.float32)
+        arrays = {"plddt": plddt}
+        if pae is not None:
+            arrays["pae"] = np.asarray(pae, dtype=np.float16)
+        meta = dict(meta or {}, length=int(len(plddt)), mean_plddt=float(plddt.mean()) if len(plddt) else 0.0)
+        _write_atomic(self._path(key, ".pdb"), lambda f: f.write(pdb.encode()))
+        _write_atomic(self._path(key, ".npz"), lambda f: np.savez_compressed(f, **arrays))
+        _write_atomic(self._path(key, ".json"), lambda f: f.write(json.dumps(meta, indent=1).encode()))
+        self.stored += 1
+
+    def entries(self) -> List[Path]:
+        return sorted(self.cache_dir.glob("*/*.json"))
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*/*") if p.is_file())
+
+    def stats_lines(self) -> List[str]:
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return [
+            f"Cache directory: {self.cache_dir}",
+            f"Lookups: {lookups} ({self.hits} hits, {self.misses} misses, {rate:.0f}% hit rate)",
+            f"Residues served from cache: {self.residues_reused}",
+            f"New entries stored: {self.stored}",
+            f"Cache size: {len(self.entries())} entries, {self.size_bytes() / 1e6:.1f} MB",
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an ESMFold prediction cache")
+    parser.add_argument("--cache-dir", required=True)
+    args = parser.parse_args()
+
+    cache = PredictionCache(args.cache_dir)
+    print("\n".join(cache.stats_lines()[-1:]))
+    for meta_path in cache.entries():
+        with open(meta_path) as f:
+            meta = json.load(f)
+        print(f"  {meta_path.stem[:12]}  {meta.get('name', ''):<24} {meta['length']:5d} aa  "
+              f"pLDDT {meta['mean_plddt']:.1f}  {meta.get('model', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,42 @@
 """
 ESMFold Structure Prediction for M. abscessus DNA Gyrase
 Predicts GyrA, GyrB monomers and GyrA-GyrB heterodimer
+
+With --fasta, every record of the given FASTA file(s) is folded in
+length-bucketed batches sized to free device memory (esmfold_batching.py),
+writing one PDB per record and a batch_summary.tsv. Records may contain
+':'-separated chains.
+
+On CPU the thread count is set explicitly, the ESM language model runs in
+bfloat16 where supported, and the trunk chunk size is autotuned against
+--memory-limit (esmfold_cpu.py).
+
+With --worker, folding is sent to a running esmfold_worker.py (started with
+--backend esm), which keeps the model loaded between runs.
+
+Usage:
+    python run_esmfold.py
+    python run_esmfold.py --fasta mutants.fasta --output-dir output/ai_predictions/esmfold/panel
+    python run_esmfold.py --cpu --threads 32 --memory-limit 64
+    python run_esmfold.py --worker --fasta mutants.fasta
 """
 
 import os
 import sys
+import argparse
+import time
 import torch
 import esm
+from functools import partial
 from pathlib import Path
 from Bio import SeqIO
 import gc
 
+from esmfold_batching import (folded_length, pair_budget, padding_fraction, plan_batches,
+                              read_fasta_records, record_filename, write_batch_summary)
+from esmfold_cpu import autotune_chunk_size, configure_threads, cpu_supports_bfloat16, format_probes
+from esmfold_client import DEFAULT_SOCKET, ESMFoldClient
+
 # Setup paths
 PROJECT_DIR = Path(__file__).parent.parent.parent
 SEQ_DIR = PROJECT_DIR / "input" / "sequences"
@@ -22,8 +48,40 @@ def load_sequence(fasta_file):
     record = next(SeqIO.parse(fasta_file, "fasta"))
     return str(record.seq), record.id
 
-def predict_structure(model, sequence, output_path, name="structure"):
-    """Run ESMFold prediction and save PDB"""
+def load_model(device, chunk_size=None):
+    """Load ESMFold (fair-esm) onto device"""
+    print("\nLoading ESMFold model...")
+    model = esm.pretrained.esmfold_v1()
+    model = model.eval()
+    
+    if device == "cuda":
+        model = model.cuda()
+        # Use half precision to save memory
+        model.set_chunk_size(chunk_size or 128)  # Trade speed for memory
+    else:
+        if cpu_supports_bfloat16():
+            model.esm = model.esm.to(torch.bfloat16)
+            print("ESM language model in bfloat16")
+        if chunk_size:
+            model.set_chunk_size(chunk_size)
+    return model
+
+def tune_cpu_chunk_size(model, target_length, memory_limit_gb):
+    """Autotune the trunk chunk size for target_length within the memory limit"""
+    print(f"\nAutotuning chunk size for {target_length} residues within {memory_limit_gb:.0f} GB...")
+    tuning = autotune_chunk_size(lambda seq: model.infer(seq, num_recycles=0), target_length,
+                                 memory_limit_gb * 1e9, set_chunk_size=model.set_chunk_size)
+    print("\n".join(format_probes(tuning)))
+    gc.collect()
+    return tuning["chunk_size"]
+
+def worker_fold(client, sequences):
+    """fold_batch-style (pdb, mean pLDDT) results from an ESMFold worker"""
+    return [None if result is None else (result["pdb"], result["plddt"])
+            for result in client.fold_batch(sequences)]
+
+def predict_structure(fold, sequence, output_path, name="structure"):
+    """Run ESMFold prediction with fold(sequences) and save PDB"""
     print(f"\nPredicting structure for {name}")
     print(f"  Sequence length: {len(sequence)} residues")
     
@@ -39,51 +97,157 @@ def predict_structure(model, sequence, output_path, name="structure"):
         if est_mem > gpu_mem * 0.9:
             print(f"  WARNING: May run out of GPU memory!")
     
-    with torch.no_grad():
-        try:
-            output = model.infer_pdb(sequence)
-            
-            # Save PDB
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w') as f:
-                f.write(output)
-            print(f"  Saved: {output_path}")
-            
-            # Clear GPU memory
-            torch.cuda.empty_cache()
-            gc.collect()
-            
-            return True
-        except RuntimeError as e:
-            if "out of memory" in str(e).lower():
-                print(f"  ERROR: Out of GPU memory for {name}")
-                torch.cuda.empty_cache()
-                gc.collect()
-                return False
+    result = fold([sequence])[0]
+    
+    # Clear GPU memory
+    torch.cuda.empty_cache()
+    gc.collect()
+    
+    if result is None:
+        print(f"  ERROR: Out of GPU memory for {name}")
+        return False
+    
+    # Save PDB
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        f.write(result[0])
+    print(f"  Saved: {output_path}")
+    return True
+
+def free_memory_bytes(device):
+    """Free memory on the device that will hold the batch activations"""
+    if device == "cuda":
+        return torch.cuda.mem_get_info()[0]
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def fold_batch(model, sequences, device):
+    """
+    Fold a padded batch; on out-of-memory the batch is split in half and retried.
+    
+    Returns:
+        List of (pdb string, mean pLDDT) per sequence, or None where a single
+        sequence does not fit
+    """
+    try:
+        with torch.no_grad():
+            output = model.infer(sequences)
+        pdbs = model.output_to_pdb(output)
+        plddts = output["mean_plddt"].tolist()
+        del output
+        return list(zip(pdbs, plddts))
+    except RuntimeError as e:
+        if "out of memory" not in str(e).lower():
             raise
+        if device == "cuda":
+            torch.cuda.empty_cache()
+        gc.collect()
+        if len(sequences) == 1:
+            return [None]
+        half = len(sequences) // 2
+        print(f"    Out of memory with {len(sequences)} sequences; splitting batch")
+        return fold_batch(model, sequences[:half], device) + fold_batch(model, sequences[half:], device)
+
+def predict_fasta(fold, fasta_files, output_dir, device, budget=None, max_batch=16):
+    """Fold every FASTA record in length-bucketed batches, one PDB per record"""
+    records = read_fasta_records(fasta_files)
+    lengths = [folded_length(seq) for _, seq in records]
+    if budget is None:
+        budget = pair_budget(free_memory_bytes(device))
+    batches = plan_batches(lengths, budget, max_batch)
+    print(f"\n{len(records)} records in {len(batches)} batches "
+          f"(budget {budget:.3g} pair-residues, {100 * padding_fraction(lengths, batches):.1f}% padding)")
+    
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    start = time.time()
+    for n, batch in enumerate(batches, 1):
+        print(f"  Batch {n}/{len(batches)}: {len(batch)} sequences, "
+              f"{min(lengths[i] for i in batch)}-{max(lengths[i] for i in batch)} residues")
+        results = fold([records[i][1] for i in batch])
+        for index, result in zip(batch, results):
+            record_id = records[index][0]
+            row = {"id": record_id, "length": lengths[index], "batch": n}
+            if result is None:
+                row.update(status="Failed (OOM)", plddt=None)
+            else:
+                pdb, plddt = result
+                pdb_path = output_dir / record_filename(record_id)
+                with open(pdb_path, "w") as f:
+                    f.write(pdb)
+                row.update(status="Success", plddt=plddt, pdb=str(pdb_path))
+            rows.append(row)
+        if device == "cuda":
+            torch.cuda.empty_cache()
+        gc.collect()
+    
+    # Summary rows in FASTA order
+    order = {rid: k for k, (rid, _) in enumerate(records)}
+    rows.sort(key=lambda row: order[row["id"]])
+    summary_path = output_dir / "batch_summary.tsv"
+    write_batch_summary(rows, summary_path)
+    n_ok = sum(row["status"] == "Success" for row in rows)
+    print(f"\nFolded {n_ok}/{len(rows)} records in {time.time() - start:.1f} s")
+    print(f"Summary saved to: {summary_path}")
+    return rows
 
 def main():
+    parser = argparse.ArgumentParser(description="ESMFold prediction (fair-esm)")
+    parser.add_argument("--fasta", nargs="+", default=None,
+                        help="Fold every record of these FASTA file(s) in batches")
+    parser.add_argument("--output-dir", default=str(OUTPUT_DIR / "batch"),
+                        help="Output directory for --fasta mode")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Batch budget in pair-residues (batch size x length^2); default from free memory")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--cpu", action="store_true", help="Run on CPU even if a GPU is available")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads (default: all available cores)")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="CPU mode: memory budget in GB for chunk-size autotuning (default: free RAM)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Fixed trunk chunk size (disables CPU autotuning)")
+    parser.add_argument("--worker", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Fold with a running esmfold_worker.py (default socket: {DEFAULT_SOCKET})")
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("ESMFold Structure Prediction")
     print("M. abscessus DNA Gyrase (GyrA & GyrB)")
     print("=" * 70)
     
-    # Check GPU
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"\nUsing device: {device}")
-    if device == "cuda":
-        print(f"GPU: {torch.cuda.get_device_name(0)}")
-        print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
+    if args.worker:
+        client = ESMFoldClient(args.worker)
+        info = client.ping()
+        print(f"\nUsing ESMFold worker at {args.worker}: {info['backend']} backend on {info['device']}, "
+              f"chunk size {info['chunk_size']}, up {info['uptime'] / 60:.0f} min")
+        if info["backend"] != "esm":
+            print("  NOTE: this worker folds ':'-separated chains as one concatenated chain")
+        device = "worker"
+        fold = partial(worker_fold, client)
+        # The worker plans its own batches
+        if args.budget is None:
+            args.budget = float("inf")
+    else:
+        # Check GPU
+        device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+        print(f"\nUsing device: {device}")
+        if device == "cpu":
+            print(f"CPU threads: {configure_threads(args.threads)}")
+        if device == "cuda":
+            print(f"GPU: {torch.cuda.get_device_name(0)}")
+            print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
+        
+        model = load_model(device, args.chunk_size)
+        fold = partial(fold_batch, model, device=device)
     
-    # Load ESMFold model
-    print("\nLoading ESMFold model...")
-    model = esm.pretrained.esmfold_v1()
-    model = model.eval()
+    memory_limit = args.memory_limit or free_memory_bytes("cpu") / 1e9
     
-    if device == "cuda":
-        model = model.cuda()
-        # Use half precision to save memory
-        model.set_chunk_size(128)  # Trade speed for memory
+    if args.fasta:
+        if device == "cpu" and args.chunk_size is None:
+            tune_cpu_chunk_size(model, max(folded_length(seq) for _, seq in read_fasta_records(args.fasta)),
+                                memory_limit)
+        predict_fasta(fold, args.fasta, args.output_dir, device, args.budget, args.max_batch)
+        return
     
     # Load sequences
     print("\nLoading sequences...")
@@ -93,6 +257,9 @@ def main():
     print(f"  GyrA: {len(gyrA_seq)} residues")
     print(f"  GyrB: {len(gyrB_seq)} residues")
     
+    if device == "cpu" and args.chunk_size is None:
+        tune_cpu_chunk_size(model, folded_length(f"{gyrA_seq}:{gyrB_seq}"), memory_limit)
+    
     results = {}
     
     # 1. Predict GyrA monomer
@@ -100,7 +267,7 @@ def main():
     print("1. GyrA Monomer Prediction")
     print("-" * 70)
     success = predict_structure(
-        model, gyrA_seq, 
+        fold, gyrA_seq, 
         OUTPUT_DIR / "GyrA" / "gyrA_esmfold.pdb",
         "GyrA monomer"
     )
@@ -111,7 +278,7 @@ def main():
     print("2. GyrB Monomer Prediction")
     print("-" * 70)
     success = predict_structure(
-        model, gyrB_seq,
+        fold, gyrB_seq,
         OUTPUT_DIR / "GyrB" / "gyrB_esmfold.pdb", 
         "GyrB monomer"
     )
@@ -126,7 +293,7 @@ def main():
     
     # This may fail due to memory - it's a large complex
     success = predict_structure(
-        model, heterodimer_seq,
+        fold, heterodimer_seq,
         OUTPUT_DIR / "complex" / "gyrAB_heterodimer_esmfold.pdb",
         "GyrA-GyrB heterodimer"
     )
@@ -146,7 +313,7 @@ def main():
         gpu_mem = torch.cuda.get_device_properties(0).total_memory / 1e9
         if gpu_mem >= 40:
             success = predict_structure(
-                model, tetramer_seq,
+                fold, tetramer_seq,
                 OUTPUT_DIR / "complex" / "gyrA2B2_tetramer_esmfold.pdb",
                 "A2B2 Tetramer"
             )
@@ -2,125 +2,428 @@
 """
 ESMFold Structure Prediction using Hugging Face Transformers
 M. abscessus DNA Gyrase (GyrA & GyrB)
+
+With --fasta, every record of the given FASTA file(s) is folded in
+length-bucketed batches sized to free device memory (esmfold_batching.py),
+writing one PDB per record and a batch_summary.tsv.
+
+Predictions are cached by sequence, model, chunk size and linker settings
+(prediction_cache.py); unchanged sequences are read back instead of being
+folded again. Use --no-cache to force inference.
+
+On CPU (no GPU, or --cpu) the thread count is set explicitly, the ESM
+language model runs in bfloat16 where the CPU supports it, and the trunk
+chunk size is autotuned against --memory-limit (esmfold_cpu.py). Wall time
+and peak RSS are recorded for every sequence.
+
+With --worker, folding is sent to a running esmfold_worker.py, which keeps
+the model loaded between runs (and does the caching and batching itself).
+
+Only the output tensors needed for the PDB and confidence arrays are copied
+off the device, and PDBs are written by a vectorized formatter
+(esmfold_pdb.py). With --save-confidence, per-residue pLDDT and the PAE
+matrix are saved next to each PDB as float16 (<stem>_confidence.npz).
+
+With --split-window, the heterodimer is folded in overlapping windows
+guided by the 5BS8 domain boundaries and stitched (domain_folding.py)
+instead of in one 1514-residue pass.
+
+Usage:
+    python run_esmfold_hf.py
+    python run_esmfold_hf.py --fasta orthologs.fasta --output-dir output/ai_predictions/esmfold/panel
+    python run_esmfold_hf.py --cpu --threads 32 --memory-limit 64
+    python run_esmfold_hf.py --worker --fasta mutants.fasta
+    python run_esmfold_hf.py --split-window 400
+    python run_esmfold_hf.py --fasta mutants.fasta --save-confidence
 """
 
 import os
 import sys
+import argparse
+import time
 import torch
 import gc
+from functools import partial
 from pathlib import Path
 from Bio import SeqIO
 from transformers import AutoTokenizer, EsmForProteinFolding
-from transformers.models.esm.openfold_utils.protein import to_pdb, Protein as OFProtein
 from transformers.models.esm.openfold_utils.feats import atom14_to_atom37
 
+from esmfold_batching import (folded_length, pair_budget, padding_fraction, plan_batches,
+                              read_fasta_records, record_filename, write_batch_summary)
+from prediction_cache import PredictionCache, prediction_key
+from esmfold_cpu import (ResourceMeter, autotune_chunk_size, configure_threads, cpu_supports_bfloat16,
+                         format_probes)
+from esmfold_client import DEFAULT_SOCKET, ESMFoldClient
+from domain_folding import OVERLAP, fold_split, format_junctions, template_boundaries
+from esmfold_pdb import atom37_to_pdb, save_confidence
+
 # Setup paths
 PROJECT_DIR = Path(__file__).parent.parent.parent
 SEQ_DIR = PROJECT_DIR / "input" / "sequences"
 OUTPUT_DIR = PROJECT_DIR / "output" / "ai_predictions" / "esmfold"
+CACHE_DIR = OUTPUT_DIR / "cache"
+
+MODEL_NAME = "facebook/esmfold_v1"
+CHUNK_SIZE = 64
+# Chains are concatenated directly (no glycine linker) on this path
+LINKER = 0
+
+# Index of CA in the atom37 layout; per-residue pLDDT is read there
+CA_ATOM37 = 1
+# Model outputs copied to the host besides the final atom positions; the
+# trunk states and other intermediates stay on the device
+HOST_OUTPUTS = ("aatype", "atom37_atom_exists", "residue_index", "plddt", "chain_index",
+                "predicted_aligned_error")
 
 def load_sequence(fasta_file):
     """Load sequence from FASTA file"""
     record = next(SeqIO.parse(fasta_file, "fasta"))
     return str(record.seq), record.id
 
-def convert_outputs_to_pdb(outputs):
-    """Convert ESMFold outputs to PDB format"""
-    final_atom_positions = atom14_to_atom37(outputs["positions"][-1], outputs)
-    outputs = {k: v.to("cpu").numpy() for k, v in outputs.items()}
-    final_atom_positions = final_atom_positions.cpu().numpy()
-    final_atom_mask = outputs["atom37_atom_exists"]
+def host_outputs(outputs):
+    """
+    Copy only what PDB writing and confidence need from the device
+    
+    Returns:
+        Dict of NumPy arrays: 'positions' (atom37 coordinates from the last
+        structure module iteration) and the HOST_OUTPUTS present
+    """
+    host = {"positions": atom14_to_atom37(outputs["positions"][-1], outputs).float().cpu().numpy()}
+    for key in HOST_OUTPUTS:
+        value = outputs.get(key)
+        if value is not None:
+            host[key] = (value.float() if value.is_floating_point() else value).cpu().numpy()
+    return host
+
+def host_to_pdbs(host, lengths=None):
+    """PDB strings from host_outputs, trimming padded batch items to lengths"""
     pdbs = []
-    for i in range(outputs["aatype"].shape[0]):
-        aa = outputs["aatype"][i]
-        pred_pos = final_atom_positions[i]
-        mask = final_atom_mask[i]
-        resid = outputs["residue_index"][i] + 1
-        pred = OFProtein(
-            aatype=aa,
-            atom_positions=pred_pos,
-            atom_mask=mask,
-            residue_index=resid,
-            b_factors=outputs["plddt"][i],
-            chain_index=outputs["chain_index"][i] if "chain_index" in outputs else None,
-        )
-        pdbs.append(to_pdb(pred))
+    for i in range(host["aatype"].shape[0]):
+        n = lengths[i] if lengths is not None else host["aatype"].shape[1]
+        pdbs.append(atom37_to_pdb(
+            host["aatype"][i][:n],
+            host["positions"][i][:n],
+            host["atom37_atom_exists"][i][:n],
+            host["residue_index"][i][:n] + 1,
+            host["plddt"][i][:n],
+            host["chain_index"][i][:n] if "chain_index" in host else None,
+        ))
     return pdbs
 
-def predict_structure(model, tokenizer, sequence, output_path, name="structure"):
-    """Run ESMFold prediction and save PDB"""
+def convert_outputs_to_pdb(outputs, lengths=None):
+    """Convert ESMFold outputs to PDB format (trimming padded batch items to lengths)"""
+    return host_to_pdbs(host_outputs(outputs), lengths)
+
+def cached_result(cached):
+    """fold_batch-style result from a prediction cache entry"""
+    return {"pdb": cached["pdb"], "plddt": cached["meta"]["mean_plddt"], "plddt_residue": cached["plddt"],
+            "pae": cached["pae"]}
+
+def write_confidence(pdb_path, result):
+    """Save compact pLDDT/PAE arrays next to a PDB, if the result has them"""
+    if result.get("plddt_residue") is not None:
+        path = save_confidence(pdb_path, result["plddt_residue"], result.get("pae"))
+        print(f"  Confidence arrays: {path}")
+
+def cache_key(sequence, chunk_size):
+    return prediction_key(sequence, MODEL_NAME, chunk_size, LINKER)
+
+def cache_meta(name, chunk_size):
+    return {"name": name, "model": MODEL_NAME, "chunk_size": chunk_size, "linker": LINKER}
+
+def load_model(device, chunk_size=None):
+    """Load ESMFold from Hugging Face onto device, with the ESM trunk in reduced precision"""
+    print("\nLoading ESMFold model from Hugging Face...")
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = EsmForProteinFolding.from_pretrained(MODEL_NAME, low_cpu_mem_usage=True)
+    
+    if device == "cuda":
+        model = model.cuda()
+    model.eval()
+    
+    # Enable memory efficient attention
+    if device == "cuda":
+        model.esm = model.esm.half()  # Use FP16 for ESM trunk
+    elif cpu_supports_bfloat16():
+        model.esm = model.esm.to(torch.bfloat16)  # Native bfloat16 on this CPU
+        print("ESM language model in bfloat16")
+    model.trunk.set_chunk_size(chunk_size or CHUNK_SIZE)  # Trade speed for memory
+    return model, tokenizer
+
+def resource_usage(meter, result):
+    """Wall time and peak RSS of a fold; a worker reports its own, measured around the batch"""
+    if result is not None and "peak_rss" in result:
+        return {"seconds": result["seconds"], "peak_rss": result["peak_rss"]}
+    return {"seconds": meter.seconds, "peak_rss": meter.peak_rss}
+
+def predict_structure(fold, sequence, output_path, name="structure", cache=None, chunk_size=None,
+                      confidence=False):
+    """
+    Run ESMFold prediction (or read it from the cache) and save PDB
+    
+    fold(sequences) is fold_batch bound to a loaded model, or a worker
+    client's fold_batch.
+    
+    Returns:
+        (success, mean pLDDT, resources) where resources has 'seconds' and
+        'peak_rss' (bytes) of the inference, or is empty on a cache hit
+    """
     print(f"\nPredicting structure for {name}")
     print(f"  Sequence length: {len(sequence)} residues")
     
-    # Check GPU memory
-    if torch.cuda.is_available():
-        gpu_mem = torch.cuda.get_device_properties(0).total_memory / 1e9
-        used_mem = torch.cuda.memory_allocated() / 1e9
-        print(f"  GPU memory: {gpu_mem:.1f} GB total, {used_mem:.1f} GB used")
+    cached = cache.get(cache_key(sequence, chunk_size)) if cache is not None else None
+    resources = {}
+    if cached is not None:
+        result = cached_result(cached)
+        print("  Cache hit: skipping inference")
+    else:
+        # Check GPU memory
+        if torch.cuda.is_available():
+            gpu_mem = torch.cuda.get_device_properties(0).total_memory / 1e9
+            used_mem = torch.cuda.memory_allocated() / 1e9
+            print(f"  GPU memory: {gpu_mem:.1f} GB total, {used_mem:.1f} GB used")
+        
+        with ResourceMeter() as meter:
+            result = fold([sequence])[0]
+        resources = resource_usage(meter, result)
+        print(f"  Wall time: {resources['seconds']:.1f} s, peak RSS: {resources['peak_rss'] / 1e9:.2f} GB")
+        if result is None:
+            print(f"  ERROR: Out of memory for {name}")
+            return False, 0, resources
+        if cache is not None:
+            cache.put(cache_key(sequence, chunk_size), result["pdb"], result["plddt_residue"], result["pae"],
+                      cache_meta(name, chunk_size))
+    
+    # Save PDB
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        f.write(result["pdb"])
+    print(f"  Saved: {output_path}")
+    if confidence:
+        write_confidence(output_path, result)
+    print(f"  Mean pLDDT: {result['plddt']:.1f}")
+    return True, result["plddt"], resources
+
+def free_memory_bytes(device):
+    """Free memory on the device that will hold the batch activations"""
+    if device == "cuda":
+        return torch.cuda.mem_get_info()[0]
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def fold_batch(model, tokenizer, sequences, device):
+    """
+    Fold a padded batch; on out-of-memory the batch is split in half and retried.
     
+    Returns:
+        Per sequence a dict with 'pdb', 'plddt' (mean), 'plddt_residue' and
+        'pae' (NumPy arrays, pae None if not predicted), or None where a
+        single sequence does not fit
+    """
     try:
-        # Tokenize
-        inputs = tokenizer([sequence], return_tensors="pt", add_special_tokens=False)
-        
-        if torch.cuda.is_available():
+        inputs = tokenizer(sequences, return_tensors="pt", padding=True, add_special_tokens=False)
+        if device == "cuda":
             inputs = {k: v.cuda() for k, v in inputs.items()}
-        
         with torch.no_grad():
             outputs = model(**inputs)
-        
-        # Convert to PDB
-        pdbs = convert_outputs_to_pdb(outputs)
-        
-        # Save PDB
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w') as f:
-            f.write(pdbs[0])
-        print(f"  Saved: {output_path}")
-        
-        # Get pLDDT score
-        plddt = outputs["plddt"].mean().item()
-        print(f"  Mean pLDDT: {plddt:.1f}")
-        
-        # Clear GPU memory
+        host = host_outputs(outputs)
+        # Release the device copies before formatting
         del outputs, inputs
-        torch.cuda.empty_cache()
-        gc.collect()
-        
-        return True, plddt
-        
+        lengths = [len(seq) for seq in sequences]
+        pdbs = host_to_pdbs(host, lengths)
+        plddt = host["plddt"][..., CA_ATOM37]
+        pae = host.get("predicted_aligned_error")
+        return [{"pdb": pdb, "plddt": float(plddt[i, :n].mean()), "plddt_residue": plddt[i, :n],
+                 "pae": pae[i, :n, :n] if pae is not None else None}
+                for i, (pdb, n) in enumerate(zip(pdbs, lengths))]
     except RuntimeError as e:
-        if "out of memory" in str(e).lower():
-            print(f"  ERROR: Out of GPU memory for {name}")
+        if "out of memory" not in str(e).lower():
+            raise
+        if device == "cuda":
+            torch.cuda.empty_cache()
+        gc.collect()
+        if len(sequences) == 1:
+            return [None]
+        half = len(sequences) // 2
+        print(f"    Out of memory with {len(sequences)} sequences; splitting batch")
+        return (fold_batch(model, tokenizer, sequences[:half], device)
+                + fold_batch(model, tokenizer, sequences[half:], device))
+
+def predict_fasta(fold, fasta_files, output_dir, device, budget=None, max_batch=16, cache=None, chunk_size=None,
+                  confidence=False):
+    """Fold every FASTA record in length-bucketed batches, one PDB per record"""
+    records = read_fasta_records(fasta_files)
+    # The Hugging Face tokenizer folds a single chain; ':' chain breaks are not supported here
+    records = [(rid, seq.replace(":", "")) for rid, seq in records]
+    lengths = [folded_length(seq) for _, seq in records]
+    
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    
+    def write_record(index, batch, result):
+        record_id = records[index][0]
+        pdb_path = output_dir / record_filename(record_id)
+        with open(pdb_path, "w") as f:
+            f.write(result["pdb"])
+        if confidence and result.get("plddt_residue") is not None:
+            save_confidence(pdb_path, result["plddt_residue"], result.get("pae"))
+        rows.append({"id": record_id, "length": lengths[index], "batch": batch,
+                     "status": "Success", "plddt": result["plddt"], "pdb": str(pdb_path)})
+    
+    # Cached records are written straight away; only misses are batched
+    todo = []
+    for index, (_, seq) in enumerate(records):
+        cached = cache.get(cache_key(seq, chunk_size)) if cache is not None else None
+        if cached is not None:
+            write_record(index, "cached", cached_result(cached))
+        else:
+            todo.append(index)
+    if cache is not None:
+        print(f"\n{len(records) - len(todo)} of {len(records)} records found in cache")
+    
+    if budget is None:
+        budget = pair_budget(free_memory_bytes(device))
+    todo_lengths = [lengths[i] for i in todo]
+    plan = plan_batches(todo_lengths, budget, max_batch)
+    print(f"\n{len(todo)} records in {len(plan)} batches "
+          f"(budget {budget:.3g} pair-residues, {100 * padding_fraction(todo_lengths, plan):.1f}% padding)")
+    batches = [[todo[i] for i in batch] for batch in plan]
+    
+    start = time.time()
+    for n, batch in enumerate(batches, 1):
+        print(f"  Batch {n}/{len(batches)}: {len(batch)} sequences, "
+              f"{min(lengths[i] for i in batch)}-{max(lengths[i] for i in batch)} residues")
+        with ResourceMeter() as meter:
+            results = fold([records[i][1] for i in batch])
+        print(f"    {meter.seconds:.1f} s, peak RSS {meter.peak_rss / 1e9:.2f} GB")
+        for index, result in zip(batch, results):
+            if result is None:
+                rows.append({"id": records[index][0], "length": lengths[index], "batch": n,
+                             "status": "Failed (OOM)", "plddt": None})
+            else:
+                write_record(index, n, result)
+                if cache is not None:
+                    cache.put(cache_key(records[index][1], chunk_size), result["pdb"], result["plddt_residue"],
+                              result["pae"], cache_meta(records[index][0], chunk_size))
+            # Batch-level resources, shared by its records
+            rows[-1].update(resource_usage(meter, result))
+        if device == "cuda":
             torch.cuda.empty_cache()
-            gc.collect()
-            return False, 0
-        raise
+        gc.collect()
+    
+    # Summary rows in FASTA order
+    order = {rid: k for k, (rid, _) in enumerate(records)}
+    rows.sort(key=lambda row: order[row["id"]])
+    summary_path = output_dir / "batch_summary.tsv"
+    write_batch_summary(rows, summary_path)
+    n_ok = sum(row["status"] == "Success" for row in rows)
+    print(f"\nFolded {n_ok}/{len(rows)} records in {time.time() - start:.1f} s")
+    print(f"Summary saved to: {summary_path}")
+    if cache is not None:
+        write_prediction_summary(output_dir / "prediction_summary.txt", {}, cache)
+    return rows
+
+def write_prediction_summary(summary_path, results, cache=None):
+    """Prediction status, pLDDT and cache statistics"""
+    with open(summary_path, 'w') as f:
+        f.write("ESMFold Prediction Summary\n")
+        f.write("=" * 50 + "\n\n")
+        for name, data in results.items():
+            line = f"{name}: {data['status']}, pLDDT={data['plddt']:.1f}"
+            if data.get("seconds") is not None:
+                line += f", wall={data['seconds']:.1f}s, peak_rss={data['peak_rss'] / 1e9:.2f}GB"
+            f.write(line + "\n")
+        if cache is not None:
+            f.write("\nPrediction cache\n")
+            f.write("-" * 50 + "\n")
+            for line in cache.stats_lines():
+                f.write(line + "\n")
+    print(f"Summary saved to: {summary_path}")
+
+def tune_cpu_chunk_size(model, tokenizer, target_length, memory_limit_gb):
+    """Autotune the trunk chunk size for target_length within the memory limit"""
+    def fold(sequence):
+        inputs = tokenizer([sequence], return_tensors="pt", add_special_tokens=False)
+        with torch.no_grad():
+            model(**inputs, num_recycles=0)
+    
+    print(f"\nAutotuning chunk size for {target_length} residues within {memory_limit_gb:.0f} GB...")
+    tuning = autotune_chunk_size(fold, target_length, memory_limit_gb * 1e9,
+                                 set_chunk_size=model.trunk.set_chunk_size)
+    print("\n".join(format_probes(tuning)))
+    gc.collect()
+    return tuning["chunk_size"]
 
 def main():
+    parser = argparse.ArgumentParser(description="ESMFold prediction with Hugging Face transformers")
+    parser.add_argument("--fasta", nargs="+", default=None,
+                        help="Fold every record of these FASTA file(s) in batches")
+    parser.add_argument("--output-dir", default=str(OUTPUT_DIR / "batch"),
+                        help="Output directory for --fasta mode")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Batch budget in pair-residues (batch size x length^2); default from free memory")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch size")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR), help="Prediction cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Always run inference")
+    parser.add_argument("--cpu", action="store_true", help="Run on CPU even if a GPU is available")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads (default: all available cores)")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="CPU mode: memory budget in GB for chunk-size autotuning (default: free RAM)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Fixed trunk chunk size (disables CPU autotuning)")
+    parser.add_argument("--worker", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Fold with a running esmfold_worker.py (default socket: {DEFAULT_SOCKET})")
+    parser.add_argument("--split-window", type=int, default=None,
+                        help="Fold the heterodimer in overlapping windows of at most this many residues")
+    parser.add_argument("--overlap", type=int, default=OVERLAP, help="Window overlap for --split-window")
+    parser.add_argument("--save-confidence", action="store_true",
+                        help="Save per-residue pLDDT and PAE (float16) next to each PDB")
+    args = parser.parse_args()
+    cache = None if args.no_cache else PredictionCache(args.cache_dir)
+    
     print("=" * 70)
     print("ESMFold Structure Prediction (Hugging Face)")
     print("M. abscessus DNA Gyrase (GyrA & GyrB)")
     print("=" * 70)
     
-    # Check GPU
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"\nUsing device: {device}")
-    if device == "cuda":
-        print(f"GPU: {torch.cuda.get_device_name(0)}")
-        print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
-    
-    # Load ESMFold model from Hugging Face
-    print("\nLoading ESMFold model from Hugging Face...")
-    tokenizer = AutoTokenizer.from_pretrained("facebook/esmfold_v1")
-    model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1", low_cpu_mem_usage=True)
+    model = None
+    if args.worker:
+        client = ESMFoldClient(args.worker)
+        info = client.ping()
+        print(f"\nUsing ESMFold worker at {args.worker}: {info['backend']} backend on {info['device']}, "
+              f"chunk size {info['chunk_size']}, up {info['uptime'] / 60:.0f} min")
+        device = "worker"
+        fold = partial(client.fold_batch, pae=args.save_confidence)
+        # The worker checks and fills the cache itself, and plans its own batches
+        cache = None
+        chunk_size = info["chunk_size"]
+        if args.budget is None:
+            args.budget = float("inf")
+    else:
+        # Check GPU
+        device = "cuda" if torch.cuda.is_available() and not args.cpu else "cpu"
+        print(f"\nUsing device: {device}")
+        if device == "cpu":
+            print(f"CPU threads: {configure_threads(args.threads)}")
+        if device == "cuda":
+            print(f"GPU: {torch.cuda.get_device_name(0)}")
+            print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
+        
+        model, tokenizer = load_model(device, args.chunk_size)
+        fold = partial(fold_batch, model, tokenizer, device=device)
     
-    if device == "cuda":
-        model = model.cuda()
-    model.eval()
+    memory_limit = args.memory_limit or free_memory_bytes("cpu") / 1e9
     
-    # Enable memory efficient attention
-    model.esm = model.esm.half()  # Use FP16 for ESM trunk
-    model.trunk.set_chunk_size(64)  # Trade speed for memory
+    if args.fasta:
+        if device == "cpu" and args.chunk_size is None:
+            longest = max(folded_length(seq) for _, seq in read_fasta_records(args.fasta))
+            tune_cpu_chunk_size(model, tokenizer, longest, memory_limit)
+        if model is not None:
+            chunk_size = model.trunk.chunk_size
+        predict_fasta(fold, args.fasta, args.output_dir, device, args.budget, args.max_batch, cache, chunk_size,
+                      args.save_confidence)
+        return
     
     # Load sequences
     print("\nLoading sequences...")
@@ -130,29 +433,36 @@ def main():
     print(f"  GyrA: {len(gyrA_seq)} residues")
     print(f"  GyrB: {len(gyrB_seq)} residues")
     
+    if device == "cpu" and args.chunk_size is None:
+        tune_cpu_chunk_size(model, tokenizer, len(gyrA_seq) + len(gyrB_seq), memory_limit)
+    if model is not None:
+        chunk_size = model.trunk.chunk_size
+    
     results = {}
     
     # 1. Predict GyrA monomer
     print("\n" + "-" * 70)
     print("1. GyrA Monomer Prediction")
     print("-" * 70)
-    success, plddt = predict_structure(
-        model, tokenizer, gyrA_seq, 
+    success, plddt, resources = predict_structure(
+        fold, gyrA_seq, 
         OUTPUT_DIR / "GyrA" / "gyrA_esmfold.pdb",
-        "GyrA monomer"
+        "GyrA monomer",
+        cache=cache, chunk_size=chunk_size, confidence=args.save_confidence
     )
-    results["GyrA"] = {"status": "Success" if success else "Failed", "plddt": plddt}
+    results["GyrA"] = {"status": "Success" if success else "Failed", "plddt": plddt, **resources}
     
     # 2. Predict GyrB monomer
     print("\n" + "-" * 70)
     print("2. GyrB Monomer Prediction")
     print("-" * 70)
-    success, plddt = predict_structure(
-        model, tokenizer, gyrB_seq,
+    success, plddt, resources = predict_structure(
+        fold, gyrB_seq,
         OUTPUT_DIR / "GyrB" / "gyrB_esmfold.pdb", 
-        "GyrB monomer"
+        "GyrB monomer",
+        cache=cache, chunk_size=chunk_size, confidence=args.save_confidence
     )
-    results["GyrB"] = {"status": "Success" if success else "Failed", "plddt": plddt}
+    results["GyrB"] = {"status": "Success" if success else "Failed", "plddt": plddt, **resources}
     
     # 3. Predict GyrA-GyrB heterodimer
     # For multimer, we need to process differently or use ESM-MSA
@@ -161,36 +471,56 @@ def main():
     print("-" * 70)
     heterodimer_seq = gyrA_seq + gyrB_seq  # Concatenate for heterodimer
     print(f"  Total residues: {len(heterodimer_seq)}")
-    print(f"  NOTE: Large complex, may run out of memory")
     
-    success, plddt = predict_structure(
-        model, tokenizer, heterodimer_seq,
-        OUTPUT_DIR / "complex" / "gyrAB_heterodimer_esmfold.pdb",
-        "GyrA-GyrB heterodimer"
-    )
-    results["Heterodimer"] = {"status": "Success" if success else "Failed (OOM)", "plddt": plddt}
+    if args.split_window:
+        print(f"  Domain-split folding: windows of <= {args.split_window} residues, {args.overlap} overlap")
+        boundaries = template_boundaries(gyrA_seq) + [len(gyrA_seq) + b for b in template_boundaries(gyrB_seq)]
+        split = None
+        with ResourceMeter() as meter:
+            try:
+                split = fold_split(fold, [("A", gyrA_seq), ("B", gyrB_seq)],
+                                   OUTPUT_DIR / "complex" / "gyrAB_heterodimer_esmfold_stitched.pdb",
+                                   args.split_window, args.overlap, boundaries,
+                                   args.budget or pair_budget(free_memory_bytes(device)), args.max_batch)
+            except RuntimeError as e:
+                print(f"  ERROR: {e}")
+        if split is not None:
+            print("\n".join(format_junctions(split["junctions"])))
+            structure = split["structure"]
+            plddt = float(structure.bfactor[structure.name == "CA"].mean())
+        results["Heterodimer"] = {"status": "Success (split)" if split is not None else "Failed (OOM)",
+                                  "plddt": plddt if split is not None else 0,
+                                  "seconds": meter.seconds, "peak_rss": meter.peak_rss}
+    else:
+        print(f"  NOTE: Large complex, may run out of memory")
+        success, plddt, resources = predict_structure(
+            fold, heterodimer_seq,
+            OUTPUT_DIR / "complex" / "gyrAB_heterodimer_esmfold.pdb",
+            "GyrA-GyrB heterodimer",
+            cache=cache, chunk_size=chunk_size, confidence=args.save_confidence
+        )
+        results["Heterodimer"] = {"status": "Success" if success else "Failed (OOM)", "plddt": plddt, **resources}
     
     # Summary
     print("\n" + "=" * 70)
     print("SUMMARY")
     print("=" * 70)
-    print(f"{'Structure':<20} {'Status':<15} {'pLDDT':<10}")
-    print("-" * 45)
+    print(f"{'Structure':<20} {'Status':<15} {'pLDDT':<10} {'Wall (s)':<10} {'Peak RSS (GB)':<14}")
+    print("-" * 70)
     for name, data in results.items():
         plddt_str = f"{data['plddt']:.1f}" if data['plddt'] > 0 else "N/A"
-        print(f"{name:<20} {data['status']:<15} {plddt_str:<10}")
+        wall_str = f"{data['seconds']:.1f}" if data.get('seconds') is not None else "cached"
+        rss_str = f"{data['peak_rss'] / 1e9:.2f}" if data.get('peak_rss') is not None else "-"
+        print(f"{name:<20} {data['status']:<15} {plddt_str:<10} {wall_str:<10} {rss_str:<14}")
     
     print("\nOutput directory:", OUTPUT_DIR)
     print("=" * 70)
     
+    if cache is not None:
+        print("\n".join(cache.stats_lines()))
+    
     # Save summary
-    summary_path = OUTPUT_DIR / "prediction_summary.txt"
-    with open(summary_path, 'w') as f:
-        f.write("ESMFold Prediction Summary\n")
-        f.write("=" * 50 + "\n\n")
-        for name, data in results.items():
-            f.write(f"{name}: {data['status']}, pLDDT={data['plddt']:.1f}\n")
-    print(f"Summary saved to: {summary_path}")
+    write_prediction_summary(OUTPUT_DIR / "prediction_summary.txt", results, cache)
 
 if __name__ == "__main__":
     main()
@@ -10,13 +10,24 @@ This script:
 
 Usage:
     python analyze_models.py --scores output/scores.sc --models output/models/
+    python analyze_models.py --scores output/models/jobs/job_*/score.sc
+    python analyze_models.py --store output/models.decoys --cluster-radius 2.0
+    python analyze_models.py --watch --scores 'output/models/jobs/job_*/score.sc' --converge 200
+    python analyze_models.py --interface output/tetramer/mabs_gyrase_tetramer_protein_only.pdb --groups AC BD
 """
 
 import os
 import argparse
 from pathlib import Path
 from typing import List, Dict, Tuple
-import statistics
+
+import numpy as np
+
+from decoy_store import DecoyStore, leader_clusters
+from decoy_watch import DecoyWatcher, watch
+from pdb_structure import read_structure
+from sasa import buried_area_by_chain, interface_residues, residue_sasa, write_residue_table
+from score_files import ScoreTable, read_score_files, top_k
 
 def parse_score_file(score_file: str) -> List[Dict]:
     """
@@ -25,55 +36,27 @@ def parse_score_file(score_file: str) -> List[Dict]:
     Returns:
         List of dictionaries with score data for each model
     """
-    scores = []
-    header = None
-    
-    with open(score_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            
-            if line.startswith('SEQUENCE:'):
-                continue
-            
-            parts = line.split()
-            
-            if parts[0] == 'SCORE:':
-                if header is None:
-                    # This is the header line
-                    header = parts[1:]  # Skip 'SCORE:'
-                else:
-                    # This is a data line
-                    values = parts[1:]
-                    if len(values) == len(header):
-                        model_data = {}
-                        for i, col in enumerate(header):
-                            try:
-                                model_data[col] = float(values[i])
-                            except ValueError:
-                                model_data[col] = values[i]
-                        scores.append(model_data)
-    
-    return scores
+    return read_score_files([score_file]).to_records()
 
-def rank_models(scores: List[Dict], sort_by: str = 'total_score') -> List[Dict]:
-    """Rank models by specified score term."""
-    return sorted(scores, key=lambda x: x.get(sort_by, float('inf')))
+def rank_models(scores: ScoreTable, sort_by: str = 'total_score') -> np.ndarray:
+    """Rank models by specified score term (row indices, best first; NaN last)."""
+    return np.argsort(scores[sort_by], kind='stable')
 
-def calculate_statistics(scores: List[Dict], term: str) -> Dict:
+def calculate_statistics(scores: ScoreTable, term: str) -> Dict:
     """Calculate statistics for a score term."""
-    values = [s[term] for s in scores if term in s and isinstance(s[term], (int, float))]
+    if term not in scores or scores[term].dtype.kind != 'f':
+        return {}
+    values = scores[term][~np.isnan(scores[term])]
     
-    if not values:
+    if not len(values):
         return {}
     
     return {
-        'mean': statistics.mean(values),
-        'stdev': statistics.stdev(values) if len(values) > 1 else 0,
-        'min': min(values),
-        'max': max(values),
-        'median': statistics.median(values)
+        'mean': float(np.mean(values)),
+        'stdev': float(np.std(values, ddof=1)) if len(values) > 1 else 0,
+        'min': float(np.min(values)),
+        'max': float(np.max(values)),
+        'median': float(np.median(values))
     }
 
 def identify_interface_residues(pdb_file: str, distance_cutoff: float = 8.0) -> List[int]:
@@ -129,7 +112,26 @@ def calculate_interface_score(pdb_file: str, scores: Dict) -> float:
     # Otherwise return total score as proxy
     return scores.get('total_score', float('inf'))
 
-def generate_report(scores: List[Dict], output_dir: str, top_n: int = 10):
+def interface_sasa_report(pdb_file: str, groups: List[str], output_dir: str) -> List[str]:
+    """
+    Buried surface (ΔSASA) between chain groups of one model.
+    
+    Writes the per-residue table to <output_dir>/interface_sasa.tsv.
+    """
+    residues = residue_sasa(read_structure(pdb_file), groups)
+    interface = interface_residues(residues)
+    lines = [f"INTERFACE BURIAL ({' / '.join(groups)}): {os.path.basename(pdb_file)}", "-" * 40]
+    lines.append(f"Buried surface area: {residues['delta'].sum() / 2:.1f} Å² "
+                 f"(total ΔSASA {residues['delta'].sum():.1f} Å²)")
+    for chain, area in buried_area_by_chain(residues).items():
+        n = int(np.sum(residues['chain'][interface] == chain))
+        lines.append(f"  chain {chain}: ΔSASA {area:8.1f} Å²  {n:4d} interface residues")
+    table_file = os.path.join(output_dir, 'interface_sasa.tsv')
+    write_residue_table(residues, table_file)
+    lines.append(f"Per-residue SASA: {table_file}")
+    return lines
+
+def generate_report(scores: ScoreTable, output_dir: str, top_n: int = 10):
     """Generate analysis report."""
     
     report_lines = []
@@ -143,33 +145,33 @@ def generate_report(scores: List[Dict], output_dir: str, top_n: int = 10):
     report_lines.append("-" * 40)
     report_lines.append(f"Total models analyzed: {len(scores)}")
     
-    if scores:
-        total_stats = calculate_statistics(scores, 'total_score')
+    total_stats = calculate_statistics(scores, 'total_score')
+    if total_stats:
         report_lines.append(f"\nTotal Score Statistics:")
-        report_lines.append(f"  Mean:   {total_stats.get('mean', 'N/A'):.2f}")
-        report_lines.append(f"  StdDev: {total_stats.get('stdev', 'N/A'):.2f}")
-        report_lines.append(f"  Min:    {total_stats.get('min', 'N/A'):.2f}")
-        report_lines.append(f"  Max:    {total_stats.get('max', 'N/A'):.2f}")
-        report_lines.append(f"  Median: {total_stats.get('median', 'N/A'):.2f}")
+        report_lines.append(f"  Mean:   {total_stats['mean']:.2f}")
+        report_lines.append(f"  StdDev: {total_stats['stdev']:.2f}")
+        report_lines.append(f"  Min:    {total_stats['min']:.2f}")
+        report_lines.append(f"  Max:    {total_stats['max']:.2f}")
+        report_lines.append(f"  Median: {total_stats['median']:.2f}")
     
     # Top models
     report_lines.append("")
     report_lines.append(f"TOP {top_n} MODELS (by total_score)")
     report_lines.append("-" * 40)
     
-    ranked = rank_models(scores, 'total_score')
+    has_total = 'total_score' in scores
+    best = top_k(scores, top_n, 'total_score') if has_total else np.arange(min(top_n, len(scores)))
+    names = scores.description
     
-    for i, model in enumerate(ranked[:top_n], 1):
-        model_name = model.get('description', f'model_{i}')
-        total_score = model.get('total_score', 'N/A')
-        
-        report_lines.append(f"\n{i}. {model_name}")
-        report_lines.append(f"   Total Score: {total_score:.2f}" if isinstance(total_score, float) else f"   Total Score: {total_score}")
+    for i, index in enumerate(best, 1):
+        report_lines.append(f"\n{i}. {names[index]}")
+        if has_total:
+            report_lines.append(f"   Total Score: {scores['total_score'][index]:.2f}")
         
         # Add additional score terms if available
         for term in ['rms', 'fa_atr', 'fa_rep', 'fa_elec', 'hbond_bb_sc']:
-            if term in model:
-                report_lines.append(f"   {term}: {model[term]:.2f}")
+            if term in scores and not np.isnan(scores[term][index]):
+                report_lines.append(f"   {term}: {scores[term][index]:.2f}")
     
     # Recommendations
     report_lines.append("")
@@ -177,10 +179,10 @@ def generate_report(scores: List[Dict], output_dir: str, top_n: int = 10):
     report_lines.append("-" * 40)
     report_lines.append("")
     
-    if ranked:
-        best = ranked[0]
-        report_lines.append(f"Best model: {best.get('description', 'model_1')}")
-        report_lines.append(f"Best score: {best.get('total_score', 'N/A'):.2f}" if isinstance(best.get('total_score'), float) else f"Best score: {best.get('total_score', 'N/A')}")
+    if len(best):
+        report_lines.append(f"Best model: {names[best[0]]}")
+        if has_total:
+            report_lines.append(f"Best score: {scores['total_score'][best[0]]:.2f}")
         report_lines.append("")
         report_lines.append("Suggested next steps:")
         report_lines.append("1. Visually inspect top models in PyMOL/Chimera")
@@ -204,38 +206,90 @@ def generate_report(scores: List[Dict], output_dir: str, top_n: int = 10):
     
     # Save ranked model list
     ranked_file = os.path.join(output_dir, 'ranked_models.txt')
+    ranked = rank_models(scores, 'total_score') if has_total else np.arange(len(scores))
+    totals = scores['total_score'] if has_total else np.full(len(scores), np.nan)
     with open(ranked_file, 'w') as f:
         f.write("Rank\tModel\tTotal_Score\n")
-        for i, model in enumerate(ranked, 1):
-            name = model.get('description', f'model_{i}')
-            score = model.get('total_score', 'N/A')
-            f.write(f"{i}\t{name}\t{score}\n")
+        for i, index in enumerate(ranked, 1):
+            f.write(f"{i}\t{names[index]}\t{totals[index]}\n")
     
     print(f"Ranked list saved to: {ranked_file}")
 
 def main():
     parser = argparse.ArgumentParser(description='Analyze RosettaCM models')
-    parser.add_argument('--scores', default='output/scores.sc',
-                        help='Path to score file')
+    parser.add_argument('--scores', nargs='+', default=['output/scores.sc'],
+                        help='Path(s) to score file(s); multiple files are merged')
     parser.add_argument('--models', default='output/models/',
                         help='Directory containing output models')
     parser.add_argument('--output', default='output/',
                         help='Output directory for analysis')
     parser.add_argument('--top', type=int, default=10,
                         help='Number of top models to report')
+    parser.add_argument('--store', default=None,
+                        help='Decoy store (decoy_store.py) to read scores and models from instead')
+    parser.add_argument('--watch', action='store_true',
+                        help='Rank decoys live while Rosetta is still running')
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='Watch mode: seconds between polls')
+    parser.add_argument('--idle', type=float, default=600.0,
+                        help='Watch mode: stop after this many seconds without new decoys')
+    parser.add_argument('--converge', type=int, default=0,
+                        help='Watch mode: stop once the best model is unchanged for this many decoys')
+    parser.add_argument('--cluster-radius', type=float, default=2.0,
+                        help='CA RMSD radius for clustering in watch and store modes (0 disables)')
+    parser.add_argument('--interface', default=None,
+                        help='Model PDB whose inter-chain buried surface (ΔSASA) is reported')
+    parser.add_argument('--groups', nargs='+', default=None,
+                        help='Chain groups for --interface, e.g. AC BD (default: every chain)')
     args = parser.parse_args()
     
-    # Check if score file exists
-    if not os.path.exists(args.scores):
-        print(f"Score file not found: {args.scores}")
+    if args.interface:
+        os.makedirs(args.output, exist_ok=True)
+        groups = args.groups or [str(c) for c in read_structure(args.interface).chain_ids()]
+        print('\n'.join(interface_sasa_report(args.interface, groups, args.output)))
+        return
+    
+    if args.watch:
+        # Score paths may be glob patterns matching job files that do not exist yet
+        os.makedirs(args.output, exist_ok=True)
+        watcher = DecoyWatcher(args.scores, [args.models], args.output, top_n=args.top,
+                               cluster_radius=args.cluster_radius)
+        try:
+            reason = watch(watcher, args.interval, args.idle, args.converge)
+        except KeyboardInterrupt:
+            reason = 'interrupted'
+        watcher.poll()
+        watcher.write_ranking()
+        print(f"\nStopped: {reason}")
+        print('\n'.join(watcher.summary()))
+        return
+    
+    if args.store:
+        store = DecoyStore(args.store)
+        os.makedirs(args.output, exist_ok=True)
+        print(f"Loaded {len(store)} models from store: {args.store}")
+        generate_report(store.scores, args.output, args.top)
+        if args.cluster_radius > 0 and 'total_score' in store.scores:
+            clusters = leader_clusters(store.ca_coords(), rank_models(store.scores), args.cluster_radius)
+            sizes = np.bincount(clusters['cluster'])
+            print(f"\nClusters (CA RMSD <= {args.cluster_radius} Å): {len(sizes)}")
+            for n, leader in enumerate(clusters['leaders'][:args.top]):
+                print(f"  {n + 1}. {store.names[leader]}  size {sizes[n]}  "
+                      f"total_score {store.scores['total_score'][leader]:.2f}")
+        return
+    
+    # Check if score files exist
+    missing = [path for path in args.scores if not os.path.exists(path)]
+    if missing:
+        print(f"Score file not found: {', '.join(missing)}")
         print("Please run RosettaCM first.")
         return
     
     # Parse scores
-    print(f"Parsing score file: {args.scores}")
-    scores = parse_score_file(args.scores)
+    print(f"Parsing score file(s): {', '.join(args.scores)}")
+    scores = read_score_files(args.scores)
     
-    if not scores:
+    if not len(scores):
         print("No scores found in file.")
         return
     
@@ -11,6 +11,10 @@ This script combines:
 
 import os
 import sys
+from functools import partial
+
+from pdb_index import PDBIndex
+from pdb_pipeline import read_lines, record_filter, chain_filter, rename_chains, run_pipeline
 
 # Paths
 BASE_DIR = "/Users/nb/Desktop/rosetta-cm"
@@ -22,21 +26,16 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 def read_pdb_atoms(pdb_file, chains=None):
     """Read ATOM/HETATM lines from PDB, optionally filtering by chain."""
-    atoms = []
-    with open(pdb_file) as f:
-        for line in f:
-            if line.startswith('ATOM') or line.startswith('HETATM'):
-                if chains is None or line[21] in chains:
-                    atoms.append(line)
-    return atoms
+    if isinstance(pdb_file, PDBIndex):
+        return pdb_file.read(record=('ATOM', 'HETATM'), chain=chains)
+    stages = [partial(record_filter, records=('ATOM', 'HETATM'))]
+    if chains is not None:
+        stages.append(partial(chain_filter, chains=chains))
+    return list(run_pipeline(read_lines(pdb_file), stages))
 
 def change_chain_id(atoms, new_chain):
     """Change chain ID in a list of ATOM lines."""
-    new_atoms = []
-    for line in atoms:
-        new_line = line[:21] + new_chain + line[22:]
-        new_atoms.append(new_line)
-    return new_atoms
+    return list(rename_chains(atoms, new_chain))
 
 def extract_transformation_matrix(template_pdb, chain_from, chain_to):
     """
@@ -77,14 +76,11 @@ def main():
     
     # Read DNA and Mg from template
     print("\nReading DNA and Mg2+ from template...")
-    dna_atoms = read_pdb_atoms(TEMPLATE_PDB, chains=['E', 'F', 'G', 'H'])
+    template_index = PDBIndex(TEMPLATE_PDB)
+    dna_atoms = read_pdb_atoms(template_index, chains=['E', 'F', 'G', 'H'])
     
     # Read Mg ions (HETATM with MG)
-    mg_atoms = []
-    with open(TEMPLATE_PDB) as f:
-        for line in f:
-            if line.startswith('HETATM') and ' MG ' in line:
-                mg_atoms.append(line)
+    mg_atoms = template_index.read(record='HETATM', resname='MG')
     
     print(f"  DNA atoms: {len(dna_atoms)}")
     print(f"  Mg atoms: {len(mg_atoms)}")
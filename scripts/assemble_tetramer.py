@@ -6,101 +6,34 @@ Using relaxed homology models and DNA/ions from 5BS8 template
 import os
 import numpy as np
 
+from pdb_structure import parse_pdb_lines, read_structure, concatenate
+from oligomer import derive_operator, build_oligomer
+from pdb_index import PDBIndex
+from clash_detection import assess_assembly, format_clash_report, write_clash_table
+from rigid_body import relieve_clashes
+
+# Assemblies with more inter-chain heavy-atom clashes than this are flagged;
+# set REJECT_CLASHING_MODELS to skip writing them altogether
+MAX_INTERCHAIN_CLASHES = 25
+REJECT_CLASHING_MODELS = False
+# Nudge the symmetry copy (chains C/D) as a rigid body when the check fails
+RELIEVE_CLASHES = True
+
 def read_pdb(filename):
     """Read PDB file and return list of lines"""
     with open(filename, 'r') as f:
         return [line for line in f if line.startswith(('ATOM', 'HETATM', 'TER'))]
 
-def get_atoms_by_chain(pdb_lines, chain_id):
-    """Extract atoms for a specific chain"""
-    return [line for line in pdb_lines if len(line) > 21 and line[21] == chain_id]
-
-def change_chain_id(pdb_lines, new_chain_id):
-    """Change chain ID in PDB lines"""
-    modified = []
-    for line in pdb_lines:
-        if line.startswith(('ATOM', 'HETATM', 'TER')):
-            modified.append(line[:21] + new_chain_id + line[22:])
-        else:
-            modified.append(line)
-    return modified
-
-def get_ca_coords(pdb_lines):
-    """Extract CA atom coordinates"""
-    coords = []
-    for line in pdb_lines:
-        if line.startswith('ATOM') and line[12:16].strip() == 'CA':
-            x = float(line[30:38])
-            y = float(line[38:46])
-            z = float(line[46:54])
-            coords.append([x, y, z])
-    return np.array(coords)
-
-def extract_transformation(template_chain_a, template_chain_c):
-    """
-    Calculate transformation matrix from chain A to chain C
-    This gives us the C2 symmetry operation
+def get_atoms_by_chain(template, chain_id):
     """
-    ca_A = get_ca_coords(template_chain_a)
-    ca_C = get_ca_coords(template_chain_c)
-    
-    # Use overlapping residues (they may have different lengths due to gaps)
-    min_len = min(len(ca_A), len(ca_C))
-    ca_A = ca_A[:min_len]
-    ca_C = ca_C[:min_len]
-    
-    # Center both sets
-    center_A = np.mean(ca_A, axis=0)
-    center_C = np.mean(ca_C, axis=0)
-    
-    ca_A_centered = ca_A - center_A
-    ca_C_centered = ca_C - center_C
-    
-    # Use Kabsch algorithm to find rotation
-    H = ca_A_centered.T @ ca_C_centered
-    U, S, Vt = np.linalg.svd(H)
-    
-    # Ensure proper rotation (not reflection)
-    d = np.linalg.det(Vt.T @ U.T)
-    if d < 0:
-        Vt[-1, :] *= -1
-    
-    R = Vt.T @ U.T
-    t = center_C - R @ center_A
-    
-    return R, t
-
-def apply_transformation(pdb_lines, R, t):
-    """Apply rotation and translation to PDB coordinates"""
-    transformed = []
-    for line in pdb_lines:
-        if line.startswith(('ATOM', 'HETATM')):
-            x = float(line[30:38])
-            y = float(line[38:46])
-            z = float(line[46:54])
-            
-            coord = np.array([x, y, z])
-            new_coord = R @ coord + t
-            
-            new_line = (line[:30] + 
-                       f"{new_coord[0]:8.3f}{new_coord[1]:8.3f}{new_coord[2]:8.3f}" + 
-                       line[54:])
-            transformed.append(new_line)
-        else:
-            transformed.append(line)
-    return transformed
+    Extract atoms for a specific chain
 
-def renumber_atoms(pdb_lines, start_num=1):
-    """Renumber atoms sequentially"""
-    renumbered = []
-    atom_num = start_num
-    for line in pdb_lines:
-        if line.startswith(('ATOM', 'HETATM')):
-            renumbered.append(line[:6] + f"{atom_num:5d}" + line[11:])
-            atom_num += 1
-        else:
-            renumbered.append(line)
-    return renumbered, atom_num
+    template may be a PDBIndex (direct seek-and-read of the chain's byte
+    ranges) or a list of PDB lines.
+    """
+    if isinstance(template, PDBIndex):
+        return template.read_chain(chain_id)
+    return [line for line in template if len(line) > 21 and line[21] == chain_id]
 
 def main():
     # Paths
@@ -111,114 +44,90 @@ def main():
     output_file = os.path.join(base_dir, 'output/mabs_gyrase_tetramer_dna_mg.pdb')
     
     print("Reading input files...")
-    template = read_pdb(template_file)
-    gyrA = read_pdb(gyrA_file)
-    gyrB = read_pdb(gyrB_file)
-    
-    # Get template chains for transformation calculation
-    template_chain_A = get_atoms_by_chain(template, 'A')
-    template_chain_B = get_atoms_by_chain(template, 'B')
-    template_chain_C = get_atoms_by_chain(template, 'C')
-    template_chain_D = get_atoms_by_chain(template, 'D')
+    # One pass over the template; chains and ions are then read by byte offset
+    template = PDBIndex(template_file)
+    template_structure = parse_pdb_lines(template.read(chain=('A', 'B', 'C', 'D')))
+    gyrA = read_structure(gyrA_file, records=('ATOM',))
+    gyrB = read_structure(gyrB_file, records=('ATOM',))
     
-    print(f"Template chain A: {len(template_chain_A)} lines")
-    print(f"Template chain C: {len(template_chain_C)} lines")
-    
-    # Calculate transformation from chain A to chain C
+    # Calculate the two-fold relating protomer A/B to C/D from residue-matched CAs
     print("Calculating symmetry transformation...")
-    R, t = extract_transformation(template_chain_A, template_chain_C)
+    R, t, info = derive_operator(template_structure, {'A': 'C', 'B': 'D'})
     print(f"Rotation matrix:\n{R}")
     print(f"Translation vector: {t}")
+    print(f"Matched residues: {info['matched']} (superposition RMSD {info['rmsd']:.2f} Å)")
     
-    # Create GyrA chain A (original)
-    gyrA_chainA = change_chain_id(gyrA, 'A')
-    
-    # Create GyrA chain C (symmetry copy)
-    gyrA_chainC_raw = apply_transformation(gyrA, R, t)
-    gyrA_chainC = change_chain_id(gyrA_chainC_raw, 'C')
+    # Protomer: GyrA as chain A, GyrB as chain B (both models are written as chain A)
+    protomer = concatenate([gyrA.rename_chains({gyrA.chain_ids()[0]: 'A'}),
+                            gyrB.rename_chains({gyrB.chain_ids()[0]: 'B'})])
     
-    # Create GyrB chain B (original)
-    gyrB_chainB = change_chain_id(gyrB, 'B')
-    
-    # Create GyrB chain D (symmetry copy)
-    gyrB_chainD_raw = apply_transformation(gyrB, R, t)
-    gyrB_chainD = change_chain_id(gyrB_chainD_raw, 'D')
+    # Chains A/B (original) and C/D (symmetry copy) in one vectorized step
+    tetramer = build_oligomer(protomer, [(np.eye(3), np.zeros(3), {}),
+                                         (R, t, {'A': 'C', 'B': 'D'})])
     
     # Extract DNA chains (E, F, G, H) from template
     print("Extracting DNA and Mg²⁺ from template...")
     dna_chains = []
     for chain_id in ['E', 'F', 'G', 'H']:
         dna_chain = get_atoms_by_chain(template, chain_id)
+        # Mg²⁺ ions are collected separately below (avoid duplicating MG E/F 101)
+        dna_chain = [line for line in dna_chain if line[17:20].strip() != 'MG']
         if dna_chain:
             dna_chains.extend(dna_chain)
             print(f"  DNA chain {chain_id}: {len(dna_chain)} atoms")
     
     # Extract Mg²⁺ ions
-    mg_ions = [line for line in template if 'MG    MG' in line or ' MG ' in line[17:20]]
+    mg_ions = template.read(record='HETATM', resname='MG')
     print(f"  Mg²⁺ ions: {len(mg_ions)}")
     
     # Assemble the full complex
     print("Assembling tetramer complex...")
-    complex_lines = []
-    
-    # Header
-    complex_lines.append("REMARK   M. abscessus DNA gyrase heterotetramer with DNA and Mg2+\n")
-    complex_lines.append("REMARK   GyrA: UniProt B1ME58, GyrB: UniProt B1ME45\n")
-    complex_lines.append("REMARK   Template: PDB 5BS8 (M. tuberculosis DNA gyrase)\n")
-    complex_lines.append("REMARK   Chain A: GyrA subunit 1\n")
-    complex_lines.append("REMARK   Chain B: GyrB subunit 1\n")
-    complex_lines.append("REMARK   Chain C: GyrA subunit 2 (symmetry copy)\n")
-    complex_lines.append("REMARK   Chain D: GyrB subunit 2 (symmetry copy)\n")
-    complex_lines.append("REMARK   Chains E-H: DNA from template\n")
-    complex_lines.append("REMARK   Mg2+ ions from template\n")
-    
-    # Add protein chains
-    complex_lines.extend(gyrA_chainA)
-    complex_lines.append("TER\n")
-    complex_lines.extend(gyrB_chainB)
-    complex_lines.append("TER\n")
-    complex_lines.extend(gyrA_chainC)
-    complex_lines.append("TER\n")
-    complex_lines.extend(gyrB_chainD)
-    complex_lines.append("TER\n")
-    
-    # Add DNA chains
-    complex_lines.extend(dna_chains)
-    complex_lines.append("TER\n")
-    
-    # Add Mg²⁺ ions
-    complex_lines.extend(mg_ions)
-    
-    complex_lines.append("END\n")
-    
-    # Renumber atoms
-    print("Renumbering atoms...")
-    final_lines = []
-    atom_num = 1
-    for line in complex_lines:
-        if line.startswith(('ATOM', 'HETATM')):
-            final_lines.append(line[:6] + f"{atom_num:5d}" + line[11:])
-            atom_num += 1
-        else:
-            final_lines.append(line)
-    
-    # Write output
+    complex_structure = concatenate([tetramer, parse_pdb_lines(dna_chains), parse_pdb_lines(mg_ions)])
+    
+    # Check every chain pair for clashes introduced by the symmetry copy
+    print("Checking inter-chain clashes...")
+    clashes, clash_table, passed = assess_assembly(complex_structure, MAX_INTERCHAIN_CLASHES)
+    print('\n'.join(format_clash_report(complex_structure, clashes, clash_table)))
+    if not passed and RELIEVE_CLASHES:
+        print("Relieving clashes of the symmetry copy (rigid-body C/D)...")
+        complex_structure, _, relief = relieve_clashes(complex_structure, bodies=('CD',))
+        print(f"  Soft clash score: {relief['history'][0]:.2f} -> {relief['history'][-1]:.2f} "
+              f"in {relief['iterations']} steps")
+        clashes, clash_table, passed = assess_assembly(complex_structure, MAX_INTERCHAIN_CLASHES)
+        print('\n'.join(format_clash_report(complex_structure, clashes, clash_table)))
+    clash_file = os.path.splitext(output_file)[0] + '_clashes.tsv'
+    write_clash_table(clash_table, clash_file)
+    print(f"Per-residue clash table: {clash_file}")
+    if not passed:
+        print(f"WARNING: {len(clashes['i'])} inter-chain clashes exceed the limit of {MAX_INTERCHAIN_CLASHES}")
+        if REJECT_CLASHING_MODELS:
+            print("Assembly rejected; no model written.")
+            return
+    
+    remarks = [
+        "M. abscessus DNA gyrase heterotetramer with DNA and Mg2+",
+        "GyrA: UniProt B1ME58, GyrB: UniProt B1ME45",
+        "Template: PDB 5BS8 (M. tuberculosis DNA gyrase)",
+        "Chain A: GyrA subunit 1",
+        "Chain B: GyrB subunit 1",
+        "Chain C: GyrA subunit 2 (symmetry copy)",
+        "Chain D: GyrB subunit 2 (symmetry copy)",
+        "Chains E-H: DNA from template",
+        "Mg2+ ions from template",
+        f"Inter-chain clashes: {len(clashes['i'])}" + ("" if passed else " (FLAGGED)"),
+    ]
+    
+    # Write output (atoms are renumbered on output)
     print(f"Writing output to {output_file}...")
-    with open(output_file, 'w') as f:
-        f.writelines(final_lines)
+    complex_structure.write(output_file, remarks)
     
     # Count atoms per chain in output
     print("\nFinal complex composition:")
-    chain_counts = {}
-    for line in final_lines:
-        if line.startswith(('ATOM', 'HETATM')) and len(line) > 21:
-            chain = line[21]
-            chain_counts[chain] = chain_counts.get(chain, 0) + 1
-    
-    for chain, count in sorted(chain_counts.items()):
+    chain_ids, counts = np.unique(complex_structure.chain, return_counts=True)
+    for chain, count in zip(chain_ids, counts):
         print(f"  Chain {chain}: {count} atoms")
     
-    print(f"\nTotal atoms: {sum(chain_counts.values())}")
+    print(f"\nTotal atoms: {len(complex_structure)}")
     print(f"Output file: {output_file}")
     print("\nTetramer assembly complete!")
 
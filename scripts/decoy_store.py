@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Compact binary container for decoy ensembles.
+
+Rosetta writes one PDB per decoy. A decoy store keeps a whole ensemble in
+one directory:
+
+    <name>.decoys/
+        topology.npz   atom names, residues, chains, elements (shared by all decoys)
+        coords.npy     float32 array (n_decoys, n_atoms, 3), opened with mmap
+        names.npy      decoy names (the score-file description)
+        scores.npz     one float column per score term, aligned with names
+
+Opening a store reads only the topology and scores; coordinates are
+memory-mapped, so selecting e.g. all CA atoms of every decoy is one strided
+read instead of thousands of file opens and text parses.
+
+Usage:
+    python decoy_store.py import --pdbs output/models/ --scores output/scores.sc \
+        --output output/models.decoys
+    python decoy_store.py export --store output/models.decoys --names mabs_gyrase_0001 \
+        --output-dir output/top_models
+    python decoy_store.py info --store output/models.decoys
+"""
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from pdb_structure import _FIELDS, Structure, read_structure
+from score_files import ScoreTable, read_score_files, top_k
+
+# Topology columns that must agree between decoys of one store
+_TOPOLOGY_CHECK = ('name', 'resname', 'chain', 'resseq')
+
+
+def _decoy_name(pdb_file) -> str:
+    name = Path(pdb_file).name
+    return name[:-4] if name.endswith('.pdb') else name
+
+
+def import_pdbs(pdb_files: Sequence[str], store_path: str, score_files: Sequence[str] = (),
+                records=('ATOM', 'HETATM')) -> 'DecoyStore':
+    """
+    Pack decoy PDBs sharing one topology into a store.
+
+    Score rows are matched to decoys by description; decoys without a row get NaN.
+    Raises ValueError if a decoy's atoms differ from the first decoy's.
+    """
+    pdb_files = list(pdb_files)
+    if not pdb_files:
+        raise ValueError("No PDB files to import")
+    os.makedirs(store_path, exist_ok=True)
+
+    topology = read_structure(pdb_files[0], records)
+    coords = np.lib.format.open_memmap(os.path.join(store_path, 'coords.npy'), mode='w+',
+                                       dtype=np.float32, shape=(len(pdb_files), len(topology), 3))
+    coords[0] = topology.coords
+    for n, pdb_file in enumerate(pdb_files[1:], 1):
+        decoy = read_structure(pdb_file, records)
+        if len(decoy) != len(topology) or any(
+                not np.array_equal(getattr(decoy, f), getattr(topology, f)) for f in _TOPOLOGY_CHECK):
+            raise ValueError(f"{pdb_file}: atoms differ from {pdb_files[0]}")
+        coords[n] = decoy.coords
+    coords.flush()
+    del coords
+
+    np.savez(os.path.join(store_path, 'topology.npz'),
+             **{field: getattr(topology, field) for field in _FIELDS})
+    names = np.array([_decoy_name(p) for p in pdb_files])
+    np.save(os.path.join(store_path, 'names.npy'), names)
+    _save_scores(store_path, names, read_score_files(score_files) if score_files else None)
+    return DecoyStore(store_path)
+
+
+def _save_scores(store_path: str, names: np.ndarray, table: ScoreTable = None):
+    columns = {}
+    if table is not None and len(table):
+        row_of = {str(name): row for row, name in enumerate(table.description)}
+        rows = np.array([row_of.get(str(name), -1) for name in names])
+        for term in table.numeric_terms():
+            values = np.append(table[term], np.nan)   # index -1 picks the NaN
+            columns[term] = values[rows]
+    np.savez(os.path.join(store_path, 'scores.npz'), **columns)
+
+
+class DecoyStore:
+    """Read access to a decoy store; coordinates stay memory-mapped."""
+
+    def __init__(self, store_path: str):
+        self.path = store_path
+        with np.load(os.path.join(store_path, 'topology.npz')) as data:
+            columns = {field: data[field] for field in _FIELDS}
+        self.names = np.load(os.path.join(store_path, 'names.npy'))
+        self.coords = np.load(os.path.join(store_path, 'coords.npy'), mmap_mode='r')
+        self.topology = Structure(np.zeros((self.coords.shape[1], 3)), **columns)
+        with np.load(os.path.join(store_path, 'scores.npz')) as data:
+            score_columns = {term: data[term] for term in data.files}
+        score_columns['description'] = self.names
+        self.scores = ScoreTable(score_columns, [*sorted(set(score_columns) - {'description'}), 'description'])
+        self._index = {str(name): n for n, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def index_of(self, name: str) -> int:
+        return self._index[name]
+
+    def structure(self, index: int) -> Structure:
+        """One decoy as a Structure (float64 coordinates)."""
+        return self.topology.with_coords(self.coords[index])
+
+    def atom_coords(self, atom_mask: np.ndarray = None, indices=None) -> np.ndarray:
+        """
+        Coordinates of the selected atoms for the selected decoys.
+
+        Returns:
+            (n_decoys, n_selected, 3) float64 array
+        """
+        indices = slice(None) if indices is None else indices
+        atoms = slice(None) if atom_mask is None else np.nonzero(atom_mask)[0]
+        return np.asarray(self.coords[indices][:, atoms], dtype=float)
+
+    def ca_coords(self, indices=None) -> np.ndarray:
+        return self.atom_coords(self.topology.atom_mask('CA'), indices)
+
+    def export_pdb(self, index: int, filename: str, remarks: Iterable[str] = ()):
+        self.structure(index).write(filename, remarks)
+
+    def export_pdbs(self, indices: Iterable[int], output_dir: str) -> List[str]:
+        """Write decoys back out as <output_dir>/<name>.pdb."""
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+        for index in indices:
+            filename = os.path.join(output_dir, f"{self.names[index]}.pdb")
+            remarks = [f"{term} {self.scores[term][index]:.3f}" for term in self.scores.numeric_terms()
+                       if not np.isnan(self.scores[term][index])]
+            self.export_pdb(index, filename, remarks)
+            written.append(filename)
+        return written
+
+
+def batch_rmsd(mobile: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """
+    RMSD after optimal superposition of every conformation in mobile onto reference.
+
+    mobile: (n, m, 3); reference: (m, 3). Uses a batched SVD (Kabsch) over all n.
+    """
+    P = mobile - mobile.mean(axis=1, keepdims=True)
+    Q = reference - reference.mean(axis=0)
+    H = np.einsum('nmi,mj->nij', P, Q)
+    U, S, Vt = np.linalg.svd(H)
+    d = np.sign(np.linalg.det(np.einsum('nij,njk->nik', U, Vt)))
+    S[:, 2] *= d
+    sq = (np.einsum('nmi,nmi->n', P, P) + np.sum(Q * Q) - 2 * S.sum(axis=1)) / P.shape[1]
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
+def leader_clusters(coords: np.ndarray, order: np.ndarray, radius: float = 2.0) -> Dict[str, np.ndarray]:
+    """
+    Leader clustering of conformations visited in the given order (e.g. best score first).
+
+    Returns:
+        Dict with 'cluster' (per-conformation cluster number, 0-based) and
+        'leaders' (conformation index of each cluster's leader)
+    """
+    cluster = np.full(len(coords), -1)
+    leaders = []
+    for index in order:
+        if cluster[index] >= 0:
+            continue
+        leaders.append(index)
+        unassigned = np.nonzero(cluster < 0)[0]
+        close = batch_rmsd(coords[unassigned], coords[index]) <= radius
+        cluster[unassigned[close]] = len(leaders) - 1
+    return {'cluster': cluster, 'leaders': np.array(leaders, dtype=int)}
+
+
+def _pdb_inputs(paths: Sequence[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(str(p) for p in Path(path).glob('*.pdb')))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack decoy PDBs into a compact store and back')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    imp = sub.add_parser('import', help='Pack PDBs (files or directories) into a store')
+    imp.add_argument('--pdbs', nargs='+', required=True, help='Decoy PDB files or directories')
+    imp.add_argument('--scores', nargs='*', default=[], help='Score file(s) for the decoys')
+    imp.add_argument('--output', required=True, help='Store directory (e.g. output/models.decoys)')
+
+    exp = sub.add_parser('export', help='Write decoys from a store as PDB files')
+    exp.add_argument('--store', required=True)
+    exp.add_argument('--names', nargs='*', default=[], help='Decoy names to export')
+    exp.add_argument('--top', type=int, default=0, help='Export the N best decoys by total_score')
+    exp.add_argument('--output-dir', required=True)
+
+    info = sub.add_parser('info', help='Summarize a store')
+    info.add_argument('--store', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        pdb_files = _pdb_inputs(args.pdbs)
+        print(f"Packing {len(pdb_files)} decoys into {args.output}")
+        store = import_pdbs(pdb_files, args.output, args.scores)
+        size = sum(f.stat().st_size for f in Path(args.output).iterdir())
+        print(f"Stored {len(store)} decoys x {store.coords.shape[1]} atoms ({size / 1e6:.1f} MB)")
+    elif args.command == 'export':
+        store = DecoyStore(args.store)
+        indices = [store.index_of(name) for name in args.names]
+        if args.top:
+            indices.extend(int(i) for i in top_k(store.scores, args.top, 'total_score'))
+        for filename in store.export_pdbs(indices, args.output_dir):
+            print(f"  {filename}")
+    else:
+        store = DecoyStore(args.store)
+        print(f"{args.store}: {len(store)} decoys, {store.coords.shape[1]} atoms, "
+              f"chains {''.join(store.topology.chain_ids())}")
+        print(f"Score terms: {', '.join(store.scores.numeric_terms()) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Live incremental decoy ranking while Rosetta jobs are running.
+
+Score files (glob patterns, re-expanded on every poll so job directories
+created later are picked up) are tailed from their last byte offset; a
+file that is deleted, replaced or truncated (a retried job discards its
+failed attempt) is re-read from the start and the decoys read from the
+old file are dropped. Each new decoy updates running score statistics (Welford), a bounded top-N
+heap and a leader clustering on CA coordinates as soon as its model file
+appears in the model directories. ranked_models.txt is rewritten
+atomically (temporary file + os.replace), so it can be read at any time.
+
+The watch stops when no new decoys arrive for --idle seconds, or early
+once the best model has not changed for --converge consecutive decoys.
+
+Usage:
+    python decoy_watch.py --scores 'output/models/jobs/job_*/score.sc' \
+        --models output/models output/models/jobs --output output/ --converge 200
+"""
+import argparse
+import glob
+import heapq
+import math
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pdb_structure import kabsch, read_structure, rmsd
+from score_files import is_header
+
+MODEL_SUFFIXES = ('.pdb',)
+
+
+class RunningStats:
+    """Mean/variance/min/max of a stream of values (Welford's algorithm)."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class ScoreTail:
+    """
+    Incremental reader of one growing score file.
+
+    A file that is deleted, replaced (new inode) or truncated is read again
+    from the start; `reset` is set for that call so the caller can discard
+    the rows it had from the old file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.header = None
+        self.identity = None
+        self.reset = False
+
+    def _restart(self, identity=None):
+        self.reset = self.reset or self.identity is not None
+        self.identity = identity
+        self.offset = 0
+        self.header = None
+
+    def read_new(self) -> List[Dict[str, str]]:
+        """Rows appended since the last call; a trailing partial line is left for next time."""
+        self.reset = False
+        try:
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                identity = (st.st_dev, st.st_ino)
+                if identity != self.identity or st.st_size < self.offset:
+                    self._restart(identity)
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            if self.identity is not None:
+                self._restart()
+            return []
+        end = data.rfind(b'\n') + 1
+        self.offset += end
+        rows = []
+        for line in data[:end].decode().splitlines():
+            if not line.startswith('SCORE:'):
+                continue
+            parts = line.split()
+            if is_header(parts):
+                self.header = tuple(parts[1:])
+            elif self.header is not None and len(parts) - 1 == len(self.header):
+                rows.append(dict(zip(self.header, parts[1:])))
+        return rows
+
+
+class LeaderClustering:
+    """
+    Greedy leader clustering on CA coordinates.
+
+    A decoy joins the first leader within radius (CA RMSD after superposition),
+    otherwise it becomes a new leader. Decoys are assigned in arrival order.
+    """
+
+    def __init__(self, radius: float = 2.0):
+        self.radius = radius
+        self.leaders: List[Tuple[str, np.ndarray]] = []
+        self.assignment: Dict[str, int] = {}
+        self.sizes: List[int] = []
+
+    def remove(self, name: str):
+        """Drop a decoy from its cluster; a leader stays as its cluster's reference coordinates."""
+        cluster = self.assignment.pop(name, None)
+        if cluster is not None:
+            self.sizes[cluster] -= 1
+
+    def add(self, name: str, ca: np.ndarray) -> int:
+        for cluster, (_, leader) in enumerate(self.leaders):
+            if len(leader) != len(ca):
+                continue
+            R, t = kabsch(ca, leader)
+            if rmsd(ca @ R.T + t, leader) <= self.radius:
+                self.assignment[name] = cluster
+                self.sizes[cluster] += 1
+                return cluster
+        self.leaders.append((name, ca))
+        self.sizes.append(1)
+        self.assignment[name] = len(self.leaders) - 1
+        return self.assignment[name]
+
+
+def ca_coordinates(model_file: str) -> np.ndarray:
+    structure = read_structure(model_file, records=('ATOM',))
+    return structure.coords[structure.atom_mask('CA')]
+
+
+def write_atomic(path: str, text: str):
+    """Replace path with text so readers never see a partially written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class DecoyWatcher:
+    """Incremental ranking state fed from score files and model directories."""
+
+    def __init__(self, score_patterns: Sequence[str], model_dirs: Sequence[str], output_dir: str,
+                 term: str = 'total_score', top_n: int = 10, cluster_radius: float = 2.0):
+        self.score_patterns = list(score_patterns)
+        self.model_dirs = list(model_dirs)
+        self.output_dir = output_dir
+        self.term = term
+        self.top_n = top_n
+        self.tails: Dict[str, ScoreTail] = {}
+        self.stats = RunningStats()
+        self.scores: Dict[str, float] = {}
+        self.sources: Dict[str, str] = {}    # decoy -> score file it was read from
+        self.arrival: Dict[str, int] = {}
+        self.arrivals = 0
+        self.heap: List[Tuple[float, int, str]] = []   # max-heap (negated) of the top N
+        self.clustering = LeaderClustering(cluster_radius) if cluster_radius > 0 else None
+        self.unclustered: List[str] = []
+        self.model_files: Dict[str, str] = {}
+        self.best: Optional[str] = None
+        self.since_best_changed = 0
+
+    def _scan_scores(self) -> List[Tuple[str, Dict[str, str]]]:
+        """New (score file, row) pairs; decoys of deleted, replaced or truncated files are evicted."""
+        paths = {path for pattern in self.score_patterns for path in glob.glob(pattern)}
+        rows = []
+        # Known files are polled even when the glob no longer finds them, to notice deletion
+        for path in sorted(paths | set(self.tails)):
+            if path not in self.tails:
+                self.tails[path] = ScoreTail(path)
+            tail = self.tails[path]
+            new_rows = tail.read_new()
+            if tail.reset:
+                self.evict([name for name, source in self.sources.items() if source == path])
+            rows.extend((path, row) for row in new_rows)
+        return rows
+
+    def _scan_models(self):
+        # Rebuilt on every scan so models deleted with a discarded attempt are forgotten
+        self.model_files = {}
+        for directory in self.model_dirs:
+            for path in Path(directory).glob('**/*'):
+                for suffix in MODEL_SUFFIXES:
+                    if path.name.endswith(suffix):
+                        # Decoys moved from job directories keep their name; the latest path wins
+                        self.model_files[path.name[:-len(suffix)]] = str(path)
+
+    def add_decoy(self, name: str, value: float, source: Optional[str] = None):
+        if name in self.scores:
+            # Rescored decoy (e.g. a retried job reusing its names): the new score replaces the old
+            self.evict([name])
+        self.arrivals += 1
+        self.scores[name] = value
+        self.sources[name] = source
+        self.arrival[name] = self.arrivals
+        self.stats.add(value)
+        entry = (-value, -self.arrivals, name)   # earlier decoy wins ties
+        if len(self.heap) < self.top_n:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+        best = max(self.heap)[2]
+        if best == self.best:
+            self.since_best_changed += 1
+        else:
+            self.best, self.since_best_changed = best, 0
+        if self.clustering is not None:
+            self.unclustered.append(name)
+
+    def evict(self, names: Sequence[str]):
+        """Forget decoys (e.g. of a discarded job attempt) and rebuild the statistics and top N."""
+        names = set(names)
+        if not names:
+            return
+        for name in names:
+            self.scores.pop(name, None)
+            self.sources.pop(name, None)
+            self.arrival.pop(name, None)
+            if self.clustering is not None:
+                self.clustering.remove(name)
+        self.unclustered = [name for name in self.unclustered if name not in names]
+        self.stats = RunningStats()
+        self.heap = []
+        for name, value in self.scores.items():
+            self.stats.add(value)
+            entry = (-value, -self.arrival[name], name)
+            if len(self.heap) < self.top_n:
+                heapq.heappush(self.heap, entry)
+            elif entry > self.heap[0]:
+                heapq.heapreplace(self.heap, entry)
+        best = max(self.heap)[2] if self.heap else None
+        if best != self.best:
+            self.best, self.since_best_changed = best, 0
+
+    def _cluster_pending(self):
+        pending = []
+        for name in self.unclustered:
+            path = self.model_files.get(name)
+            if path is None or not os.path.exists(path):
+                pending.append(name)
+                continue
+            try:
+                ca = ca_coordinates(path)
+            except (OSError, ValueError):
+                # Model still being written
+                pending.append(name)
+                continue
+            if len(ca):
+                self.clustering.add(name, ca)
+        self.unclustered = pending
+
+    def poll(self) -> int:
+        """Process everything new; returns the number of new decoys."""
+        rows = self._scan_scores()
+        for source, row in rows:
+            try:
+                value = float(row[self.term])
+            except (KeyError, ValueError):
+                continue
+            if not math.isnan(value):
+                self.add_decoy(row.get('description', f"model_{self.arrivals + 1}"), value, source)
+        if self.clustering is not None and self.unclustered:
+            self._scan_models()
+            self._cluster_pending()
+        return len(rows)
+
+    def top(self) -> List[Tuple[float, str]]:
+        return [(-neg, name) for neg, _, name in sorted(self.heap, reverse=True)]
+
+    def cluster_of(self, name: str) -> str:
+        if self.clustering is None or name not in self.clustering.assignment:
+            return '-'
+        return str(self.clustering.assignment[name] + 1)
+
+    def write_ranking(self):
+        """Atomically rewrite ranked_models.txt (all decoys) and the live summary."""
+        ranked = sorted(self.scores.items(), key=lambda item: item[1])
+        lines = ["Rank\tModel\tTotal_Score\tCluster\n"]
+        lines.extend(f"{i}\t{name}\t{value}\t{self.cluster_of(name)}\n"
+                     for i, (name, value) in enumerate(ranked, 1))
+        write_atomic(os.path.join(self.output_dir, 'ranked_models.txt'), ''.join(lines))
+        write_atomic(os.path.join(self.output_dir, 'watch_status.txt'), '\n'.join(self.summary()) + '\n')
+
+    def summary(self) -> List[str]:
+        lines = [f"Decoys: {self.stats.n}",
+                 f"{self.term}: mean {self.stats.mean:.2f}  stdev {self.stats.stdev:.2f}  "
+                 f"min {self.stats.min:.2f}  max {self.stats.max:.2f}",
+                 f"Best model unchanged for {self.since_best_changed} decoys"]
+        if self.clustering is not None:
+            lines.append(f"Clusters: {sum(size > 0 for size in self.clustering.sizes)} "
+                         f"(largest {max(self.clustering.sizes, default=0)}, "
+                         f"{len(self.unclustered)} decoys awaiting models)")
+        lines.append(f"Top {len(self.heap)}:")
+        lines.extend(f"  {i}. {name}  {value:.2f}  cluster {self.cluster_of(name)}"
+                     for i, (value, name) in enumerate(self.top(), 1))
+        return lines
+
+
+def watch(watcher: DecoyWatcher, interval: float = 10.0, idle: float = 600.0,
+          converge: int = 0, max_decoys: int = 0) -> str:
+    """
+    Poll until idle for `idle` seconds, the best model is stable for `converge`
+    decoys, or `max_decoys` have been seen. Returns the reason for stopping.
+    """
+    last_new = time.time()
+    while True:
+        if watcher.poll():
+            last_new = time.time()
+            watcher.write_ranking()
+            print('\n'.join(watcher.summary()[:3]))
+        if converge and watcher.stats.n and watcher.since_best_changed >= converge:
+            return f"best model {watcher.best} unchanged for {converge} decoys"
+        if max_decoys and watcher.stats.n >= max_decoys:
+            return f"{max_decoys} decoys scored"
+        if time.time() - last_new > idle:
+            return f"no new decoys for {idle:.0f} s"
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank decoys incrementally while Rosetta runs')
+    parser.add_argument('--scores', nargs='+', required=True,
+                        help='Score files or glob patterns (quote them), re-expanded on every poll')
+    parser.add_argument('--models', nargs='*', default=['output/models/'],
+                        help='Directories searched (recursively) for decoy PDBs')
+    parser.add_argument('--output', default='output/', help='Directory for ranked_models.txt')
+    parser.add_argument('--term', default='total_score', help='Score term to rank by')
+    parser.add_argument('--top', type=int, default=10, help='Number of top models to track')
+    parser.add_argument('--cluster-radius', type=float, default=2.0,
+                        help='CA RMSD radius for leader clustering (0 disables clustering)')
+    parser.add_argument('--interval', type=float, default=10.0, help='Seconds between polls')
+    parser.add_argument('--idle', type=float, default=600.0,
+                        help='Stop after this many seconds without new decoys')
+    parser.add_argument('--converge', type=int, default=0,
+                        help='Stop once the best model is unchanged for this many decoys')
+    parser.add_argument('--max-decoys', type=int, default=0, help='Stop after this many decoys')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    watcher = DecoyWatcher(args.scores, args.models, args.output, args.term,
+                           args.top, args.cluster_radius)
+    try:
+        reason = watch(watcher, args.interval, args.idle, args.converge, args.max_decoys)
+    except KeyboardInterrupt:
+        reason = 'interrupted'
+    watcher.poll()
+    watcher.write_ranking()
+    print(f"\nStopped: {reason}")
+    print('\n'.join(watcher.summary()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Backbone and side-chain dihedral angles with Ramachandran classification.
+
+phi/psi/omega and chi1-chi4 are computed for every residue of every chain
+in one vectorized pass: per-residue atom index tables are filled with NumPy
+scatter assignments and all torsions are evaluated with batched cross
+products. Chain breaks (C-N > 2.0 Å) leave the affected angles as NaN.
+
+Residues are classified as favored / allowed / outlier by looking up
+(phi, psi) in 1-degree grids for the general, glycine, proline,
+pre-proline and Ile/Val cases. The grids come from the MolProbity Top8000
+percentile contours (rama8000-*.data from the rlabduke reference_data
+repository) when they are found in RAMA_REFERENCE_DIR (default
+input/rama8000, or the RAMA8000_DIR environment variable); favored is the
+2% contour, allowed 0.05% (general) or 0.1% (other cases). cis-proline is
+not distinguished.
+
+Without the reference files the grids are only a rough stand-in: each case
+is a periodic Gaussian mixture over its main basins with favored/allowed
+contours enclosing 98% / 99.95% of its density. These approximate contours
+miss real but sparsely populated regions (e.g. trans-Pro near psi 60-80),
+so residues there are reported as outliers; every output produced with
+them is labeled as approximate and is not validation data.
+
+Usage:
+    python dihedrals.py --pdb output/tetramer/mabs_gyrase_tetramer_protein_only.pdb \
+        --output output/validation/ramachandran_data.csv
+"""
+import argparse
+import os
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+
+from pdb_structure import Structure, read_structure
+
+# Side-chain dihedral atoms (chi1..chi4) per residue type
+CHI_ATOMS = {
+    'ARG': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD'), ('CB', 'CG', 'CD', 'NE'), ('CG', 'CD', 'NE', 'CZ')],
+    'ASN': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'OD1')],
+    'ASP': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'OD1')],
+    'CYS': [('N', 'CA', 'CB', 'SG')],
+    'GLN': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD'), ('CB', 'CG', 'CD', 'OE1')],
+    'GLU': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD'), ('CB', 'CG', 'CD', 'OE1')],
+    'HIS': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'ND1')],
+    'ILE': [('N', 'CA', 'CB', 'CG1'), ('CA', 'CB', 'CG1', 'CD1')],
+    'LEU': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD1')],
+    'LYS': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD'), ('CB', 'CG', 'CD', 'CE'), ('CG', 'CD', 'CE', 'NZ')],
+    'MET': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'SD'), ('CB', 'CG', 'SD', 'CE')],
+    'PHE': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD1')],
+    'PRO': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD')],
+    'SER': [('N', 'CA', 'CB', 'OG')],
+    'THR': [('N', 'CA', 'CB', 'OG1')],
+    'TRP': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD1')],
+    'TYR': [('N', 'CA', 'CB', 'CG'), ('CA', 'CB', 'CG', 'CD1')],
+    'VAL': [('N', 'CA', 'CB', 'CG1')],
+}
+
+# Ramachandran cases and their approximate basins: (phi, psi, sigma_phi, sigma_psi, weight)
+RAMA_CASES = ('general', 'glycine', 'proline', 'pre-proline', 'ile-val')
+_RAMA_BASINS = {
+    'general': [(-63, -43, 12, 12, 1.0), (-120, 130, 22, 22, 0.6), (-65, 145, 12, 15, 0.45),
+                (-90, 0, 18, 18, 0.15), (57, 45, 10, 12, 0.04)],
+    'glycine': [(-63, -43, 15, 15, 0.5), (63, 43, 15, 15, 0.5), (-80, 175, 25, 20, 0.35),
+                (80, -175, 25, 20, 0.35), (-120, 140, 25, 25, 0.2), (90, 0, 15, 20, 0.15)],
+    'proline': [(-65, -30, 10, 15, 0.6), (-65, 145, 10, 15, 0.8)],
+    'pre-proline': [(-120, 130, 22, 22, 0.8), (-65, 145, 12, 15, 0.6), (-63, -40, 12, 12, 0.3)],
+}
+_RAMA_BASINS['ile-val'] = _RAMA_BASINS['general']
+# Top8000 contour grids: case -> (file, allowed percentile); favored is the 2% contour for all cases
+RAMA_REFERENCE_DIR = os.environ.get('RAMA8000_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'input', 'rama8000'))
+RAMA_REFERENCE_FILES = {
+    'general': ('rama8000-general-noGPIVpreP.data', 0.0005),
+    'glycine': ('rama8000-gly-sym.data', 0.001),
+    'proline': ('rama8000-transpro.data', 0.001),
+    'pre-proline': ('rama8000-prepro-noGP.data', 0.001),
+    'ile-val': ('rama8000-ileval-nopreP.data', 0.001),
+}
+REFERENCE_FAVORED = 0.02
+FAVORED_FRACTION = 0.98
+ALLOWED_FRACTION = 0.9995
+OUTLIER, ALLOWED, FAVORED = 0, 1, 2
+REGION_LABELS = {FAVORED: 'F', ALLOWED: 'A', OUTLIER: 'O'}
+
+
+def dihedral(p0: np.ndarray, p1: np.ndarray, p2: np.ndarray, p3: np.ndarray) -> np.ndarray:
+    """Torsion angles (degrees) of (n, 3) point arrays p0-p1-p2-p3."""
+    b0 = p0 - p1
+    b1 = p2 - p1
+    b2 = p3 - p2
+    b1 = b1 / np.linalg.norm(b1, axis=-1, keepdims=True)
+    v = b0 - np.sum(b0 * b1, axis=-1, keepdims=True) * b1
+    w = b2 - np.sum(b2 * b1, axis=-1, keepdims=True) * b1
+    x = np.sum(v * w, axis=-1)
+    y = np.sum(np.cross(b1, v) * w, axis=-1)
+    return np.degrees(np.arctan2(y, x))
+
+
+def _atom_table(structure: Structure, residue_of: np.ndarray, n_residues: int, names) -> Dict[str, np.ndarray]:
+    """Per-residue atom index for each name (-1 where missing; first altloc wins)."""
+    table = {}
+    primary = np.isin(structure.altloc, ['', 'A'])
+    for name in names:
+        idx = np.full(n_residues, -1)
+        atoms = np.nonzero((structure.name == name) & primary)[0][::-1]
+        idx[residue_of[atoms]] = atoms   # reversed so the first occurrence is written last
+        table[name] = idx
+    return table
+
+
+def _torsion(coords: np.ndarray, i0, i1, i2, i3) -> np.ndarray:
+    valid = (i0 >= 0) & (i1 >= 0) & (i2 >= 0) & (i3 >= 0)
+    angles = np.full(len(i0), np.nan)
+    if valid.any():
+        angles[valid] = dihedral(coords[i0[valid]], coords[i1[valid]], coords[i2[valid]], coords[i3[valid]])
+    return angles
+
+
+def compute_dihedrals(structure: Structure, max_peptide_bond: float = 2.0) -> Dict[str, np.ndarray]:
+    """
+    phi, psi, omega and chi1-chi4 for every amino-acid residue.
+
+    Returns:
+        Dict of per-residue arrays: 'chain', 'resseq', 'icode', 'resname',
+        'phi', 'psi', 'omega', 'chi1'..'chi4' (degrees, NaN where undefined)
+    """
+    protein = structure.select(np.isin(structure.record, ['ATOM', 'HETATM']) &
+                               ~np.isin(structure.resname, ['HOH', 'WAT']))
+    index, starts = protein.residue_index()
+    n_res = len(starts)
+    atoms = _atom_table(protein, index, n_res,
+                        {'N', 'CA', 'C'} | {a for chis in CHI_ATOMS.values() for chi in chis for a in chi})
+    N, CA, C = atoms['N'], atoms['CA'], atoms['C']
+    amino = (N >= 0) & (CA >= 0) & (C >= 0)
+    xyz = protein.coords
+    chain = protein.chain[starts]
+
+    # Residue i-1 -> i is a peptide bond when both are amino acids of one chain with C-N bonded
+    prev_N, prev_CA, prev_C = (np.concatenate([[-1], a[:-1]]) for a in (N, CA, C))
+    linked = np.zeros(n_res, dtype=bool)
+    linked[1:] = amino[1:] & amino[:-1] & (chain[1:] == chain[:-1])
+    bond = np.full(n_res, np.inf)
+    bond[linked] = np.linalg.norm(xyz[prev_C[linked]] - xyz[N[linked]], axis=1)
+    linked &= bond < max_peptide_bond
+
+    phi = _torsion(xyz, np.where(linked, prev_C, -1), N, CA, C)
+    omega = _torsion(xyz, np.where(linked, prev_CA, -1), np.where(linked, prev_C, -1), N, CA)
+    next_linked = np.append(linked[1:], False)
+    next_N = np.where(next_linked, np.append(N[1:], -1), -1)
+    psi = _torsion(xyz, N, CA, C, next_N)
+
+    resname = protein.resname[starts]
+    result = {
+        'chain': chain,
+        'resseq': protein.resseq[starts],
+        'icode': protein.icode[starts],
+        'resname': resname,
+        'phi': phi,
+        'psi': psi,
+        'omega': omega,
+    }
+    for k in range(4):
+        chi = np.full(n_res, np.nan)
+        for name, chis in CHI_ATOMS.items():
+            if len(chis) <= k:
+                continue
+            rows = np.nonzero(resname == name)[0]
+            if len(rows):
+                a0, a1, a2, a3 = (atoms[a][rows] for a in chis[k])
+                chi[rows] = _torsion(xyz, a0, a1, a2, a3)
+        result[f'chi{k + 1}'] = chi
+    return {key: value[amino] for key, value in result.items()}
+
+
+def _wrapped(delta: np.ndarray) -> np.ndarray:
+    return (delta + 180.0) % 360.0 - 180.0
+
+
+def uses_reference_grids() -> bool:
+    """True when all Top8000 contour files are available (else the grids are approximate)."""
+    return all(os.path.exists(os.path.join(RAMA_REFERENCE_DIR, name))
+               for name, _ in RAMA_REFERENCE_FILES.values())
+
+
+def read_reference_grid(path: str, allowed: float) -> np.ndarray:
+    """
+    Region grid from a Top8000 contour file ('phi psi percentile' rows on a regular grid).
+
+    Each 1-degree bin takes the value of the nearest reference grid point.
+    """
+    table = np.loadtxt(path, comments='#')
+    phis, psis = np.unique(table[:, 0]), np.unique(table[:, 1])
+    values = np.zeros((len(phis), len(psis)))
+    values[np.searchsorted(phis, table[:, 0]), np.searchsorted(psis, table[:, 1])] = table[:, 2]
+    centers = np.arange(-179.5, 180.0, 1.0)
+    step_phi, step_psi = 360.0 / len(phis), 360.0 / len(psis)
+    i = np.round(_wrapped(centers - phis[0]) / step_phi).astype(int) % len(phis)
+    j = np.round(_wrapped(centers - psis[0]) / step_psi).astype(int) % len(psis)
+    percentile = values[np.ix_(i, j)]
+    grid = np.full(percentile.shape, OUTLIER, dtype=np.int8)
+    grid[percentile >= allowed] = ALLOWED
+    grid[percentile >= REFERENCE_FAVORED] = FAVORED
+    return grid
+
+
+@lru_cache(maxsize=None)
+def ramachandran_grid(case: str = 'general') -> np.ndarray:
+    """
+    (360, 360) region grid indexed [phi + 180, psi + 180] at 1-degree bins.
+
+    Values are FAVORED, ALLOWED or OUTLIER; read from the Top8000 contours
+    when available (see uses_reference_grids), otherwise approximated.
+    Computed once per case and cached.
+    """
+    if uses_reference_grids():
+        name, allowed = RAMA_REFERENCE_FILES[case]
+        return read_reference_grid(os.path.join(RAMA_REFERENCE_DIR, name), allowed)
+    centers = np.arange(-179.5, 180.0, 1.0)
+    phi, psi = np.meshgrid(centers, centers, indexing='ij')
+    density = np.zeros_like(phi)
+    for p0, s0, sp, ss, weight in _RAMA_BASINS[case]:
+        norm = weight / (sp * ss)
+        density += norm * np.exp(-0.5 * ((_wrapped(phi - p0) / sp) ** 2 + (_wrapped(psi - s0) / ss) ** 2))
+    # Density thresholds enclosing the favored / allowed fractions of the mass
+    flat = np.sort(density.ravel())[::-1]
+    cumulative = np.cumsum(flat) / flat.sum()
+    favored_level = flat[np.searchsorted(cumulative, FAVORED_FRACTION)]
+    allowed_level = flat[np.searchsorted(cumulative, ALLOWED_FRACTION)]
+    grid = np.full(density.shape, OUTLIER, dtype=np.int8)
+    grid[density >= allowed_level] = ALLOWED
+    grid[density >= favored_level] = FAVORED
+    return grid
+
+
+def ramachandran_cases(resname: np.ndarray, chain: np.ndarray = None) -> np.ndarray:
+    """
+    Case index (into RAMA_CASES) of each residue.
+
+    Pre-proline is decided by the next residue, and only within a chain
+    when chain is given; Gly and Pro take precedence over pre-proline, which
+    takes precedence over Ile/Val.
+    """
+    case = np.zeros(len(resname), dtype=int)
+    case[np.isin(resname, ['ILE', 'VAL'])] = RAMA_CASES.index('ile-val')
+    pre_pro = np.append(resname[1:] == 'PRO', False)
+    if chain is not None:
+        pre_pro &= np.append(chain[1:] == chain[:-1], False)
+    case[pre_pro] = RAMA_CASES.index('pre-proline')
+    case[resname == 'GLY'] = RAMA_CASES.index('glycine')
+    case[resname == 'PRO'] = RAMA_CASES.index('proline')
+    return case
+
+
+def classify_ramachandran(phi: np.ndarray, psi: np.ndarray, resname: np.ndarray,
+                          chain: np.ndarray = None) -> np.ndarray:
+    """
+    Region of each residue (FAVORED/ALLOWED/OUTLIER; -1 where phi or psi is undefined).
+    """
+    case = ramachandran_cases(resname, chain)
+    grids = np.stack([ramachandran_grid(name) for name in RAMA_CASES])
+    defined = ~(np.isnan(phi) | np.isnan(psi))
+    region = np.full(len(phi), -1, dtype=int)
+    i = np.floor(phi[defined] + 180.0).astype(int) % 360
+    j = np.floor(psi[defined] + 180.0).astype(int) % 360
+    region[defined] = grids[case[defined], i, j]
+    return region
+
+
+def ramachandran_analysis(structure: Structure) -> Dict[str, np.ndarray]:
+    """compute_dihedrals plus 'case' and 'region' columns."""
+    data = compute_dihedrals(structure)
+    data['case'] = ramachandran_cases(data['resname'], data['chain'])
+    data['region'] = classify_ramachandran(data['phi'], data['psi'], data['resname'], data['chain'])
+    return data
+
+
+def ramachandran_summary(data: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Residue counts and percentages per region (residues with phi and psi only)."""
+    region = data['region']
+    total = int(np.sum(region >= 0))
+    summary = {'total': total, 'reference': 'Top8000' if uses_reference_grids() else 'approximate'}
+    for code, label in ((FAVORED, 'favored'), (ALLOWED, 'allowed'), (OUTLIER, 'outliers')):
+        count = int(np.sum(region == code))
+        summary[label] = count
+        summary[f'{label}_pct'] = 100.0 * count / total if total else 0.0
+    return summary
+
+
+def outlier_labels(data: Dict[str, np.ndarray]) -> List[str]:
+    """'Gly156A'-style labels of the Ramachandran outliers."""
+    rows = np.nonzero(data['region'] == OUTLIER)[0]
+    return [f"{str(data['resname'][k]).capitalize()}{data['resseq'][k]}{data['icode'][k]}{data['chain'][k]}"
+            for k in rows]
+
+
+def write_ramachandran_csv(data: Dict[str, np.ndarray], output_file: str, title: str = ''):
+    """Write per-residue phi/psi/region rows in the ramachandran_data.csv layout."""
+    summary = ramachandran_summary(data)
+    with open(output_file, 'w') as f:
+        f.write(f"# Ramachandran plot data{' for ' + title if title else ''}\n")
+        f.write("# Format: residue_id, chain, resname, phi, psi, region\n")
+        f.write("# Regions: F=favored, A=allowed, O=outlier\n")
+        if summary['reference'] == 'approximate':
+            f.write("# WARNING: approximate contours (Gaussian-mixture model, not the Top8000 reference);\n"
+                    "# regions are indicative only and not validation results\n")
+        for k in np.nonzero(data['region'] >= 0)[0]:
+            f.write(f"{data['resseq'][k]}{data['icode'][k]},{data['chain'][k]},{data['resname'][k]},"
+                    f"{data['phi'][k]:.1f},{data['psi'][k]:.1f},{REGION_LABELS[int(data['region'][k])]}\n")
+        f.write("\n# Summary:\n")
+        f.write(f"# Total residues analyzed: {summary['total']}\n")
+        f.write(f"# Favored: {summary['favored']} ({summary['favored_pct']:.1f}%)\n")
+        f.write(f"# Allowed: {summary['allowed']} ({summary['allowed_pct']:.1f}%)\n")
+        f.write(f"# Outliers: {summary['outliers']} ({summary['outliers_pct']:.1f}%)\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backbone/side-chain dihedrals and Ramachandran classes')
+    parser.add_argument('--pdb', required=True, help='Model PDB')
+    parser.add_argument('--output', default=None, help='Per-residue CSV (ramachandran_data.csv layout)')
+    args = parser.parse_args()
+
+    data = ramachandran_analysis(read_structure(args.pdb))
+    summary = ramachandran_summary(data)
+    print(f"Residues with phi/psi: {summary['total']} ({summary['reference']} contours)")
+    if summary['reference'] == 'approximate':
+        print(f"  Top8000 contour files not found in {RAMA_REFERENCE_DIR}; regions are approximate")
+    print(f"  Favored:  {summary['favored']:5d} ({summary['favored_pct']:.1f}%)")
+    print(f"  Allowed:  {summary['allowed']:5d} ({summary['allowed_pct']:.1f}%)")
+    print(f"  Outliers: {summary['outliers']:5d} ({summary['outliers_pct']:.1f}%)")
+    cis = np.sum(np.abs(data['omega']) < 30)
+    print(f"cis peptides: {cis}")
+    labels = outlier_labels(data)
+    if labels:
+        print("Outliers: " + ", ".join(labels[:30]) + (" ..." if len(labels) > 30 else ""))
+    if args.output:
+        write_ramachandran_csv(data, args.output, args.pdb)
+        print(f"Saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,34 +4,31 @@ Extract protein-only chains from the tetramer PDB
 """
 import os
 
+from pdb_index import PDBIndex
+from pdb_pipeline import append_end, renumber_atoms, run_pipeline, write_lines
+
 base_dir = '/Users/nb/Desktop/rosetta-cm'
 input_file = os.path.join(base_dir, 'output/mabs_gyrase_tetramer_dna_mg.pdb')
 output_file = os.path.join(base_dir, 'output/mabs_gyrase_tetramer_protein_only.pdb')
 
 protein_chains = ['A', 'B', 'C', 'D']
 
-with open(input_file, 'r') as f_in, open(output_file, 'w') as f_out:
-    atom_num = 1
-    for line in f_in:
-        if line.startswith('REMARK'):
-            f_out.write(line)
-        elif line.startswith('ATOM'):
-            chain_id = line[21]
-            if chain_id in protein_chains:
-                # Renumber atoms
-                new_line = line[:6] + f"{atom_num:5d}" + line[11:]
-                f_out.write(new_line)
-                atom_num += 1
-        elif line.startswith('TER'):
-            if atom_num > 1:  # Only write TER after atoms
-                f_out.write(f"TER   {atom_num:5d}\n")
-                atom_num += 1
-        elif line.startswith('END'):
-            f_out.write(line)
+# Index once, then stream only the REMARK block and the protein chains' ATOM ranges
+index = PDBIndex(input_file)
+
+def protein_lines():
+    """REMARKs followed by each protein chain's ATOM records, closed by TER"""
+    yield from index.iter(record='REMARK')
+    for chain_id in protein_chains:
+        if index.count(record='ATOM', chain=chain_id):
+            yield from index.iter(record='ATOM', chain=chain_id)
+            yield "TER\n"
+
+# Renumber atoms (TER records take the next serial)
+write_lines(run_pipeline(protein_lines(), [renumber_atoms, append_end]), output_file)
 
 print(f"Protein-only PDB written to: {output_file}")
 
 # Count atoms
-with open(output_file, 'r') as f:
-    atom_count = sum(1 for line in f if line.startswith('ATOM'))
+atom_count = PDBIndex(output_file).count(record='ATOM')
 print(f"Total protein atoms: {atom_count}")
@@ -7,91 +7,97 @@ Constraints help maintain:
 2. Known structural features
 3. Template-derived distance restraints
 
+Contacts are found between every pair of chains (protein and DNA) with a
+neighbor grid, deduplicated and written in a deterministic order.
+
 Usage:
     python generate_constraints.py --template template.pdb --output constraints.cst
+    python generate_constraints.py --template input/templates/5bs8.pdb --max-constraints 2000
+    python generate_constraints.py --template input/templates/5bs8.pdb --type interface --interface-sd 1.0
 """
 
-import os
 import argparse
-from pathlib import Path
 from typing import List, Tuple, Dict
-import math
 
-def read_pdb_coordinates(pdb_file: str) -> Dict[str, Dict[int, Dict[str, Tuple[float, float, float]]]]:
+import numpy as np
+
+from neighbor_grid import NeighborGrid
+from pdb_structure import Structure, read_structure
+
+# Atoms used for constraints: protein backbone + CB, DNA phosphate/sugar
+PROTEIN_ATOMS = ('CA', 'CB', 'N', 'C', 'O')
+DNA_ATOMS = ('P', "C4'", "C1'")
+DNA_RESIDUES = ('DA', 'DC', 'DG', 'DT', 'DU', 'A', 'C', 'G', 'T', 'U')
+
+def read_pdb_coordinates(pdb_file: str) -> Structure:
     """
-    Read coordinates from a PDB file.
+    Read the constraint atoms of a PDB file (first alternate location only).
     
     Returns:
-        Nested dict: chain -> residue_number -> atom_name -> (x, y, z)
+        Structure with protein backbone/CB and DNA P/C4'/C1' atoms
     """
-    coords = {}
-    
-    with open(pdb_file, 'r') as f:
-        for line in f:
-            if line.startswith('ATOM'):
-                chain = line[21]
-                res_num = int(line[22:26])
-                atom_name = line[12:16].strip()
-                x = float(line[30:38])
-                y = float(line[38:46])
-                z = float(line[46:54])
-                
-                if chain not in coords:
-                    coords[chain] = {}
-                if res_num not in coords[chain]:
-                    coords[chain][res_num] = {}
-                
-                coords[chain][res_num][atom_name] = (x, y, z)
-    
-    return coords
-
-def calculate_distance(coord1: Tuple[float, float, float], 
-                      coord2: Tuple[float, float, float]) -> float:
-    """Calculate Euclidean distance between two points."""
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(coord1, coord2)))
-
-def find_interface_contacts(coords: Dict, distance_cutoff: float = 8.0) -> List[Dict]:
+    structure = read_structure(pdb_file, records=('ATOM',))
+    is_dna = np.isin(structure.resname, DNA_RESIDUES)
+    keep = np.where(is_dna, np.isin(structure.name, DNA_ATOMS), np.isin(structure.name, PROTEIN_ATOMS))
+    keep &= np.isin(structure.altloc, ['', 'A'])
+    return structure.select(keep)
+
+def residue_ids(structure: Structure) -> np.ndarray:
+    """Chain-aware Rosetta residue IDs ('45A', '112C', ...)."""
+    return np.char.add(np.char.add(structure.resseq.astype(str), structure.icode), structure.chain)
+
+def find_interface_contacts(structure: Structure, distance_cutoff: float = 8.0,
+                            chains: str = None, max_contacts: int = None) -> List[Dict]:
     """
-    Find contacts at the dimer interface.
+    Find atom contacts between every pair of chains.
+    
+    Pairs come from a neighbor-grid search and are deduplicated on the integer
+    key i * n_atoms + j (i < j). With max_contacts, the shortest contacts are
+    kept. Contacts are returned in atom order (chain, residue, atom).
     
     Returns list of contact dictionaries with:
     - chain1, res1, atom1
     - chain2, res2, atom2
     - distance
     """
-    contacts = []
-    chains = list(coords.keys())
-    
-    if len(chains) < 2:
-        return contacts
-    
-    chain_a, chain_b = chains[0], chains[1]
-    
-    for res1 in coords[chain_a]:
-        for atom1, coord1 in coords[chain_a][res1].items():
-            # Only use backbone and CB atoms for constraints
-            if atom1 not in ['CA', 'CB', 'N', 'C', 'O']:
-                continue
-            
-            for res2 in coords[chain_b]:
-                for atom2, coord2 in coords[chain_b][res2].items():
-                    if atom2 not in ['CA', 'CB', 'N', 'C', 'O']:
-                        continue
-                    
-                    dist = calculate_distance(coord1, coord2)
-                    
-                    if dist < distance_cutoff:
-                        contacts.append({
-                            'chain1': chain_a,
-                            'res1': res1,
-                            'atom1': atom1,
-                            'chain2': chain_b,
-                            'res2': res2,
-                            'atom2': atom2,
-                            'distance': dist
-                        })
-    
-    return contacts
+    if chains is not None:
+        structure = structure.select(np.isin(structure.chain, list(chains)))
+    n = len(structure)
+    if n < 2:
+        return []
+    
+    grid = NeighborGrid(structure.coords, cell_size=distance_cutoff)
+    i, j, dist = grid.pairs(distance_cutoff)
+    inter = structure.chain[i] != structure.chain[j]
+    i, j, dist = i[inter], j[inter], dist[inter]
+    
+    keys, first = np.unique(np.minimum(i, j).astype(np.int64) * n + np.maximum(i, j), return_index=True)
+    dist = dist[first]
+    if max_contacts is not None and len(keys) > max_contacts:
+        # Distance priority; the key breaks ties deterministically
+        keep = np.lexsort((keys, dist))[:max_contacts]
+        keep.sort()
+        keys, dist = keys[keep], dist[keep]
+    i, j = keys // n, keys % n
+    
+    ids = residue_ids(structure)
+    return [{
+        'chain1': str(structure.chain[a]),
+        'res1': str(ids[a]),
+        'atom1': str(structure.name[a]),
+        'chain2': str(structure.chain[b]),
+        'res2': str(ids[b]),
+        'atom2': str(structure.name[b]),
+        'distance': float(d),
+    } for a, b, d in zip(i, j, dist)]
+
+def chain_pair_counts(contacts: List[Dict]) -> Dict[Tuple[str, str], int]:
+    """Number of contacts per chain pair, in sorted chain-pair order."""
+    counts = {}
+    for contact in contacts:
+        pair = tuple(sorted((contact['chain1'], contact['chain2'])))
+        counts[pair] = counts.get(pair, 0) + 1
+    return dict(sorted(counts.items()))
 
 def generate_distance_constraints(contacts: List[Dict], 
                                   tolerance: float = 2.0) -> List[str]:
@@ -104,7 +110,7 @@ def generate_distance_constraints(contacts: List[Dict],
     constraints = []
     
     for contact in contacts:
-        # For dimers, need to adjust residue numbering if chains are concatenated
+        # Residue IDs carry the chain (e.g. 45A), so numbering is unambiguous
         res1 = contact['res1']
         res2 = contact['res2']
         dist = contact['distance']
@@ -138,41 +144,28 @@ def generate_harmonic_constraints(contacts: List[Dict],
     
     return constraints
 
-def generate_interface_constraints(coords: Dict, 
-                                   distance_cutoff: float = 8.0) -> List[str]:
+def generate_interface_constraints(contacts: List[Dict],
+                                   stdev: float = None) -> List[str]:
     """
-    Generate constraints specifically for the dimer interface.
-    Uses CA-CA distances between chains.
+    Generate constraints specifically for the chain interfaces.
+    Uses the CA-CA contacts; without stdev, close contacts (< 5 Å) get 1.0
+    and the others 2.0.
     """
     constraints = []
-    chains = list(coords.keys())
     
-    if len(chains) < 2:
-        return constraints
-    
-    chain_a, chain_b = chains[0], chains[1]
-    
-    for res1 in coords[chain_a]:
-        if 'CA' not in coords[chain_a][res1]:
+    for contact in contacts:
+        if contact['atom1'] != 'CA' or contact['atom2'] != 'CA':
             continue
-        
-        for res2 in coords[chain_b]:
-            if 'CA' not in coords[chain_b][res2]:
-                continue
-            
-            dist = calculate_distance(
-                coords[chain_a][res1]['CA'],
-                coords[chain_b][res2]['CA']
-            )
-            
-            if dist < distance_cutoff:
-                # Strong constraint for close contacts
-                stdev = 1.0 if dist < 5.0 else 2.0
-                constraint = (
-                    f"AtomPair CA {res1} CA {res2} "
-                    f"HARMONIC {dist:.2f} {stdev:.2f}"
-                )
-                constraints.append(constraint)
+        dist = contact['distance']
+        if stdev is None:
+            # Strong constraint for close contacts
+            pair_stdev = 1.0 if dist < 5.0 else 2.0
+        else:
+            pair_stdev = stdev
+        constraints.append(
+            f"AtomPair CA {contact['res1']} CA {contact['res2']} "
+            f"HARMONIC {dist:.2f} {pair_stdev:.2f}"
+        )
     
     return constraints
 
@@ -180,7 +173,7 @@ def write_constraint_file(constraints: List[str], output_file: str):
     """Write constraints to file."""
     with open(output_file, 'w') as f:
         f.write("# RosettaCM Distance Constraints\n")
-        f.write("# Generated for dimeric homology modeling\n")
+        f.write("# Generated for all chain pairs of the template\n")
         f.write("#\n")
         for constraint in constraints:
             f.write(constraint + '\n')
@@ -197,32 +190,52 @@ def main():
                         help='Distance cutoff for interface contacts')
     parser.add_argument('--tolerance', type=float, default=2.0,
                         help='Tolerance for distance constraints')
-    parser.add_argument('--type', choices=['harmonic', 'bounded'], default='harmonic',
-                        help='Type of constraint function')
+    parser.add_argument('--type', choices=['harmonic', 'bounded', 'interface'], default='harmonic',
+                        help='Type of constraint function for the contacts; CA-CA interface constraints '
+                             'are always added (interface: write only those)')
+    parser.add_argument('--interface-sd', type=float, default=None,
+                        help='Stdev of the CA-CA interface harmonics '
+                             '(default: 1.0 below 5 Å, 2.0 otherwise)')
+    parser.add_argument('--chains', default=None,
+                        help='Chains to include (default: all chains, including DNA)')
+    parser.add_argument('--protein-only', action='store_true',
+                        help='Skip DNA chains')
+    parser.add_argument('--max-constraints', type=int, default=None,
+                        help='Keep at most this many constraints (shortest distances first)')
     args = parser.parse_args()
     
     # Read template coordinates
     print(f"Reading template: {args.template}")
-    coords = read_pdb_coordinates(args.template)
+    structure = read_pdb_coordinates(args.template)
+    if args.protein_only:
+        structure = structure.select(~np.isin(structure.resname, DNA_RESIDUES))
     
-    chains = list(coords.keys())
+    chains = [str(c) for c in structure.chain_ids()]
     print(f"Found {len(chains)} chains: {chains}")
     
-    # Find interface contacts
-    contacts = find_interface_contacts(coords, args.distance)
+    # Find interface contacts (deduplicated, optionally thinned, deterministic order)
+    contacts = find_interface_contacts(structure, args.distance, args.chains, args.max_constraints)
     print(f"Found {len(contacts)} interface contacts")
+    for (c1, c2), count in chain_pair_counts(contacts).items():
+        print(f"  Chains {c1}-{c2}: {count}")
     
     # Generate constraints
     if args.type == 'harmonic':
         constraints = generate_harmonic_constraints(contacts, args.tolerance)
-    else:
+    elif args.type == 'bounded':
         constraints = generate_distance_constraints(contacts, args.tolerance)
+    else:
+        constraints = []
     
     # Add interface-specific constraints
-    interface_constraints = generate_interface_constraints(coords, args.distance)
-    
-    # Combine and deduplicate
-    all_constraints = list(set(constraints + interface_constraints))
+    interface_constraints = generate_interface_constraints(contacts, args.interface_sd)
+    
+    # One constraint per atom pair: the interface constraint of a CA-CA pair replaces
+    # its contact constraint (in place), so the count never exceeds --max-constraints
+    by_pair = {}
+    for constraint in constraints + interface_constraints:
+        by_pair[' '.join(constraint.split()[1:5])] = constraint
+    all_constraints = list(by_pair.values())
     
     # Write output
     write_constraint_file(all_constraints, args.output)
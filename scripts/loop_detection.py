@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Automatic detection of disjoint (poorly modeled) regions for loop refinement.
+
+The model is mapped onto its template through the Grishin alignment used
+for threading, superposed on the aligned CA atoms with iterative outlier
+rejection, and every model residue is flagged when it
+
+  - deviates from its template residue by more than a cutoff after superposition,
+  - has no template residue (target insertion), or
+  - sits next to an alignment gap (residues missing on either side).
+
+Flagged residues are merged into regions, and regions shorter than three
+residues (often a single gap-adjacent residue, too short for KIC loop
+closure) are extended into their neighbors. refine_loops turns them into a
+Rosetta loop file, the residue-selector XML and a PyMOL script.
+
+Usage:
+    python loop_detection.py --model output/relaxed/mabs_gyrB_new_relaxed_mabs_gyrB_threaded_new_0001.pdb \
+        --template input/templates/5bs8_chainB.pdb \
+        --alignment input/alignments_final/alignment_gyrB_proper.grishin
+"""
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from pdb_structure import Structure, kabsch, read_structure
+
+# Shortest loop written for refinement; KIC needs three residues to close a loop
+MIN_LOOP_LENGTH = 3
+
+
+def parse_grishin(filename: str) -> Tuple[str, str, int, int]:
+    """
+    Read the target and template rows of a Grishin alignment.
+
+    Returns:
+        (aligned target, aligned template, target offset, template offset)
+    """
+    rows = []
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2 and parts[0].lstrip('-').isdigit():
+                rows.append((int(parts[0]), parts[1]))
+    if len(rows) < 2:
+        raise ValueError(f"{filename}: expected target and template alignment rows")
+    (target_offset, target), (template_offset, template) = rows[:2]
+    return target, template, target_offset, template_offset
+
+
+def alignment_columns(target: str, template: str) -> Dict[str, np.ndarray]:
+    """
+    Per-column residue indices of an alignment (0-based, -1 at gaps).
+
+    Returns:
+        Dict with 'target' and 'template' index arrays
+    """
+    t = np.frombuffer(target.encode(), dtype='S1') != b'-'
+    p = np.frombuffer(template.encode(), dtype='S1') != b'-'
+    return {
+        'target': np.where(t, np.cumsum(t) - 1, -1),
+        'template': np.where(p, np.cumsum(p) - 1, -1),
+    }
+
+
+def ca_residues(structure: Structure, chain: str = None):
+    """CA coordinates and residue numbers in chain order (first altloc only)."""
+    mask = structure.atom_mask('CA') & np.isin(structure.altloc, ['', 'A'])
+    if chain is not None:
+        mask &= structure.chain == chain
+    return structure.coords[mask], structure.resseq[mask]
+
+
+def iterative_superposition(P: np.ndarray, Q: np.ndarray, cycles: int = 5, rejection: float = 2.0):
+    """
+    Kabsch fit of P onto Q, refitting on pairs within rejection * RMSD of the core.
+
+    Returns:
+        (R, t, core mask)
+    """
+    core = np.ones(len(P), dtype=bool)
+    for _ in range(cycles):
+        R, t = kabsch(P[core], Q[core])
+        dev = np.linalg.norm(P @ R.T + t - Q, axis=1)
+        rms = np.sqrt(np.mean(dev[core] ** 2))
+        new_core = dev <= rejection * rms
+        if new_core.sum() < 3 or np.array_equal(new_core, core):
+            break
+        core = new_core
+    R, t = kabsch(P[core], Q[core])
+    return R, t, core
+
+
+def residue_deviations(model: Structure, template: Structure, target: str, template_row: str,
+                       model_chain: str = None, template_chain: str = None,
+                       target_offset: int = 0, template_offset: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Per-residue CA deviation of the model from its template after superposition.
+
+    Model residues are numbered by target sequence position (as threading
+    writes them); template residues are taken in PDB order, as Rosetta reads
+    the template row of the alignment.
+
+    Returns:
+        Dict of per-model-residue arrays: 'resseq', 'template_resseq' (-1 if
+        unaligned), 'deviation' (NaN if unaligned) and 'gap_adjacent'; plus
+        'core_rmsd' and 'n_core' for the superposition
+    """
+    model_xyz, model_resseq = ca_residues(model, model_chain)
+    template_xyz, template_resseq = ca_residues(template, template_chain)
+    columns = alignment_columns(target, template_row)
+
+    # Target sequence position (1-based) -> template residue index for aligned columns
+    both = (columns['target'] >= 0) & (columns['template'] >= 0)
+    target_pos = columns['target'][both] + 1 + target_offset
+    template_idx = columns['template'][both] + template_offset
+    valid = (template_idx >= 0) & (template_idx < len(template_xyz))
+    target_pos, template_idx = target_pos[valid], template_idx[valid]
+
+    # Model residues whose target position is aligned
+    order = np.argsort(target_pos)
+    where = np.searchsorted(target_pos[order], model_resseq)
+    where = np.minimum(where, len(order) - 1)
+    aligned = target_pos[order][where] == model_resseq
+    partner = np.where(aligned, template_idx[order][where], -1)
+
+    R, t, core = iterative_superposition(model_xyz[aligned], template_xyz[partner[aligned]])
+    deviation = np.full(len(model_resseq), np.nan)
+    deviation[aligned] = np.linalg.norm(model_xyz[aligned] @ R.T + t - template_xyz[partner[aligned]], axis=1)
+
+    # Residues flanking a gap in either sequence
+    gap_columns = (columns['target'] < 0) ^ (columns['template'] < 0)
+    near_gap = np.zeros(len(gap_columns), dtype=bool)
+    near_gap[:-1] |= gap_columns[1:]
+    near_gap[1:] |= gap_columns[:-1]
+    flank_pos = columns['target'][near_gap & (columns['target'] >= 0)] + 1 + target_offset
+
+    core_dev = deviation[aligned][core]
+    return {
+        'resseq': model_resseq,
+        'template_resseq': np.where(aligned, template_resseq[np.maximum(partner, 0)], -1),
+        'deviation': deviation,
+        'gap_adjacent': np.isin(model_resseq, flank_pos),
+        'core_rmsd': float(np.sqrt(np.mean(core_dev ** 2))),
+        'n_core': int(core.sum()),
+    }
+
+
+def flagged_regions(resseq: np.ndarray, flagged: np.ndarray, merge_gap: int = 2,
+                    min_length: int = 1) -> List[Tuple[int, int]]:
+    """
+    Contiguous (start, end) residue ranges of flagged residues.
+
+    Runs separated by at most merge_gap unflagged residues are joined;
+    residue-number breaks always start a new region.
+    """
+    index = np.nonzero(flagged)[0]
+    if not len(index):
+        return []
+    # Split where residues are more than merge_gap positions apart or numbering jumps
+    steps = np.diff(index)
+    number_steps = np.diff(resseq[index])
+    breaks = np.nonzero((steps > merge_gap + 1) | (number_steps != steps))[0]
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(index) - 1]])
+    return [(int(resseq[index[s]]), int(resseq[index[e]])) for s, e in zip(starts, ends)
+            if resseq[index[e]] - resseq[index[s]] + 1 >= min_length]
+
+
+def extend_regions(regions: List[Tuple[int, int]], resseq: np.ndarray, min_length: int = MIN_LOOP_LENGTH,
+                   merge_gap: int = 2) -> List[Tuple[int, int]]:
+    """
+    Grow regions shorter than min_length into their neighboring residues.
+
+    Regions grow alternately at the end and the start, only over residues
+    of resseq that continue the numbering (so never across a chain break or
+    terminus; such a region stays shorter). Regions that then lie at most
+    merge_gap residues apart are joined.
+    """
+    position = {int(r): k for k, r in enumerate(resseq)}
+    segment = np.concatenate([[0], np.cumsum(np.diff(resseq) != 1)])
+    spans = []
+    for start, end in regions:
+        s, e = position[start], position[end]
+        grow_end = True
+        while e - s + 1 < min_length:
+            can_end = e + 1 < len(resseq) and segment[e + 1] == segment[e]
+            can_start = s > 0 and segment[s - 1] == segment[s]
+            if not (can_end or can_start):
+                break
+            if can_end and (grow_end or not can_start):
+                e += 1
+            else:
+                s -= 1
+            grow_end = not grow_end
+        if spans and segment[s] == segment[spans[-1][1]] and s - spans[-1][1] - 1 <= merge_gap:
+            spans[-1][1] = max(spans[-1][1], e)
+        else:
+            spans.append([s, e])
+    return [(int(resseq[s]), int(resseq[e])) for s, e in spans]
+
+
+def detect_disjoint_regions(model_file: str, template_file: str, alignment_file: str,
+                            model_chain: str = None, template_chain: str = None,
+                            deviation_cutoff: float = 3.0, merge_gap: int = 2,
+                            min_length: int = 1,
+                            min_loop_length: int = MIN_LOOP_LENGTH) -> Tuple[List[Tuple[int, int]], Dict]:
+    """
+    Loop regions of a threaded/relaxed model, detected against its template.
+
+    Flagged runs shorter than min_length are dropped; the remaining regions
+    are extended to at least min_loop_length residues.
+
+    Returns:
+        (list of (start, end) model residue ranges, per-residue detail dict)
+    """
+    target, template_row, target_offset, template_offset = parse_grishin(alignment_file)
+    detail = residue_deviations(read_structure(model_file, ('ATOM',)),
+                                read_structure(template_file, ('ATOM',)),
+                                target, template_row, model_chain, template_chain,
+                                target_offset, template_offset)
+    deviation = detail['deviation']
+    flagged = np.isnan(deviation) | (np.nan_to_num(deviation) > deviation_cutoff) | detail['gap_adjacent']
+    detail['flagged'] = flagged
+    regions = flagged_regions(detail['resseq'], flagged, merge_gap, min_length)
+    return extend_regions(regions, detail['resseq'], min_loop_length, merge_gap), detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect disjoint regions of a model against its template')
+    parser.add_argument('--model', required=True, help='Threaded or relaxed model PDB')
+    parser.add_argument('--template', required=True, help='Template PDB used for threading')
+    parser.add_argument('--alignment', required=True, help='Grishin alignment (target, template)')
+    parser.add_argument('--model-chain', default=None)
+    parser.add_argument('--template-chain', default=None)
+    parser.add_argument('--cutoff', type=float, default=3.0,
+                        help='CA deviation (Å) above which a residue is disjoint')
+    parser.add_argument('--merge-gap', type=int, default=2,
+                        help='Join regions separated by at most this many residues')
+    parser.add_argument('--min-length', type=int, default=1, help='Shortest flagged run reported')
+    parser.add_argument('--min-loop-length', type=int, default=MIN_LOOP_LENGTH,
+                        help='Shorter regions are extended into neighboring residues to this length')
+    args = parser.parse_args()
+
+    regions, detail = detect_disjoint_regions(args.model, args.template, args.alignment,
+                                              args.model_chain, args.template_chain,
+                                              args.cutoff, args.merge_gap, args.min_length,
+                                              args.min_loop_length)
+    print(f"Superposition core: {detail['n_core']} CA atoms, RMSD {detail['core_rmsd']:.2f} Å")
+    print(f"Disjoint regions ({len(regions)}, {int(detail['flagged'].sum())} residues flagged):")
+    for start, end in regions:
+        in_region = (detail['resseq'] >= start) & (detail['resseq'] <= end)
+        worst = np.nanmax(detail['deviation'][in_region]) if np.any(~np.isnan(detail['deviation'][in_region])) else np.nan
+        print(f"  {start:5d}-{end:<5d} ({end - start + 1:3d} residues, max deviation {worst:.2f} Å)")
+
+
+if __name__ == '__main__':
+    main()
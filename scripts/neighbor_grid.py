@@ -0,0 +1,113 @@
+"""
+Uniform-cell neighbor grid for fixed-radius searches on atom coordinates.
+
+Atoms are hashed into cubic cells of edge >= the search radius, sorted by
+cell key, and each query point scans the 27 surrounding cells with
+searchsorted range lookups. Candidate pairs for all query points are
+expanded with NumPy index arithmetic, so there is no per-atom Python loop.
+
+Usage:
+    from neighbor_grid import NeighborGrid
+
+    grid = NeighborGrid(coords, cell_size=4.0)
+    i, j, d = grid.pairs(4.0)             # all pairs within one set, i < j
+    q, g, d = grid.query(other, 4.0)      # points of another set vs the grid
+"""
+import numpy as np
+
+# 27 neighboring cell offsets (including the cell itself)
+_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+class NeighborGrid:
+    """Spatial hash of a coordinate set for fixed-radius neighbor queries."""
+
+    def __init__(self, coords, cell_size=4.0):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+        if len(self.coords):
+            self.origin = self.coords.min(axis=0)
+            cells = self._cells(self.coords)
+            self.dims = cells.max(axis=0) + 1
+        else:
+            self.origin = np.zeros(3)
+            cells = np.zeros((0, 3), dtype=np.int64)
+            self.dims = np.ones(3, dtype=np.int64)
+        keys = self._keys(cells)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _keys(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def candidates(self, points):
+        """
+        All (query index, grid index) pairs sharing a cell neighborhood.
+
+        Returns:
+            (query_idx, grid_idx) integer arrays
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        cells = self._cells(points)
+        query_parts, grid_parts = [], []
+        for offset in _OFFSETS:
+            neighbor = cells + offset
+            valid = np.all((neighbor >= 0) & (neighbor < self.dims), axis=1)
+            if not valid.any():
+                continue
+            query = np.nonzero(valid)[0]
+            keys = self._keys(neighbor[valid])
+            lo = np.searchsorted(self.sorted_keys, keys, side='left')
+            hi = np.searchsorted(self.sorted_keys, keys, side='right')
+            counts = hi - lo
+            total = counts.sum()
+            if total == 0:
+                continue
+            # Expand each [lo, hi) range into explicit sorted-grid positions
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            positions = np.arange(total) + starts
+            query_parts.append(np.repeat(query, counts))
+            grid_parts.append(self.order[positions])
+        if not query_parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(query_parts), np.concatenate(grid_parts)
+
+    def query(self, points, radius, chunk_size=50000):
+        """
+        Grid atoms within radius of each query point.
+
+        Queries are processed in chunks to bound memory of the candidate lists.
+
+        Returns:
+            (query_idx, grid_idx, distance) arrays
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds grid cell size {self.cell_size}")
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        out_q, out_g, out_d = [], [], []
+        for start in range(0, len(points), chunk_size):
+            q, g = self.candidates(points[start:start + chunk_size])
+            diff = points[start + q] - self.coords[g]
+            dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            keep = dist <= radius
+            out_q.append(q[keep] + start)
+            out_g.append(g[keep])
+            out_d.append(dist[keep])
+        if not out_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(out_q), np.concatenate(out_g), np.concatenate(out_d)
+
+    def pairs(self, radius):
+        """
+        Unique pairs (i < j) of grid atoms within radius of each other.
+
+        Returns:
+            (i, j, distance) arrays
+        """
+        i, j, d = self.query(self.coords, radius)
+        keep = i < j
+        return i[keep], j[keep], d[keep]
@@ -0,0 +1,127 @@
+"""
+Symmetry operators and oligomer assembly from array-backed chains.
+
+Operators are derived from a template (e.g. 5BS8) by superposing CA atoms of
+residues that are present in both the reference and the symmetry-related
+chains with the same residue number, insertion code and residue name, so
+chains of different length (crystallographic gaps) are never paired
+positionally. All copies of the asymmetric unit are then generated in a
+single vectorized step.
+
+Usage:
+    from pdb_structure import read_structure
+    from oligomer import derive_operator, build_oligomer
+
+    template = read_structure('input/templates/5bs8.pdb')
+    R, t, info = derive_operator(template, {'A': 'C', 'B': 'D'})
+    tetramer = build_oligomer(protomer, [(np.eye(3), np.zeros(3), {}),
+                                         (R, t, {'A': 'C', 'B': 'D'})])
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from pdb_structure import Structure, concatenate, kabsch, rmsd
+
+
+def ca_by_residue(structure: Structure, chain_id: str) -> Dict[Tuple[int, str], Tuple[str, np.ndarray]]:
+    """
+    Map (resseq, icode) -> (resname, CA coordinate) for one chain.
+
+    Only the first CA of each residue is kept (alternate locations are ignored).
+    """
+    mask = (structure.chain == chain_id) & (structure.name == 'CA')
+    residues = {}
+    for resseq, icode, resname, coord in zip(structure.resseq[mask], structure.icode[mask],
+                                             structure.resname[mask], structure.coords[mask]):
+        residues.setdefault((int(resseq), str(icode)), (str(resname), coord))
+    return residues
+
+
+def matched_ca_pairs(ref: Structure, ref_chain: str,
+                     mob: Structure, mob_chain: str) -> Tuple[np.ndarray, np.ndarray, List[Tuple[int, str]]]:
+    """
+    Paired CA coordinates of residues present in both chains with identical residue names.
+
+    Returns:
+        (ref_coords, mob_coords, residue keys) ordered by residue number
+    """
+    ref_ca = ca_by_residue(ref, ref_chain)
+    mob_ca = ca_by_residue(mob, mob_chain)
+    keys = sorted(k for k in ref_ca.keys() & mob_ca.keys() if ref_ca[k][0] == mob_ca[k][0])
+    if not keys:
+        return np.zeros((0, 3)), np.zeros((0, 3)), []
+    ref_xyz = np.array([ref_ca[k][1] for k in keys])
+    mob_xyz = np.array([mob_ca[k][1] for k in keys])
+    return ref_xyz, mob_xyz, keys
+
+
+def derive_operator(template: Structure, chain_map: Dict[str, str]) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Rigid operator mapping the source chains of chain_map onto their partners.
+
+    For 5BS8, {'A': 'C', 'B': 'D'} gives the two-fold relating the GyrA/GyrB
+    protomer A/B to C/D. Residue-matched CA pairs from every chain pair are
+    superposed together.
+
+    Returns:
+        (R, t, info) with info holding the number of matched residues and RMSD
+    """
+    source, target = [], []
+    matched = {}
+    for src, dst in chain_map.items():
+        src_xyz, dst_xyz, keys = matched_ca_pairs(template, src, template, dst)
+        source.append(src_xyz)
+        target.append(dst_xyz)
+        matched[f"{src}->{dst}"] = len(keys)
+    source = np.concatenate(source)
+    target = np.concatenate(target)
+    if len(source) < 3:
+        raise ValueError(f"Too few matched residues to derive operator for {chain_map}")
+
+    R, t = kabsch(source, target)
+    info = {
+        'matched': matched,
+        'n_matched': len(source),
+        'rmsd': rmsd(source @ R.T + t, target),
+    }
+    return R, t, info
+
+
+def derive_operators(template: Structure, copies: List[Dict[str, str]]) -> List[Tuple[np.ndarray, np.ndarray, Dict[str, str]]]:
+    """
+    Operators for an oligomer described as a list of chain maps.
+
+    The first entry is conventionally the identity copy (e.g. {'A': 'A', 'B': 'B'}).
+    Each returned operator carries the chain renaming for its copy.
+    """
+    operators = []
+    for chain_map in copies:
+        if all(src == dst for src, dst in chain_map.items()):
+            operators.append((np.eye(3), np.zeros(3), dict(chain_map)))
+        else:
+            R, t, _ = derive_operator(template, chain_map)
+            operators.append((R, t, dict(chain_map)))
+    return operators
+
+
+def build_oligomer(asu: Structure, operators: List[Tuple[np.ndarray, np.ndarray, Dict[str, str]]]) -> Structure:
+    """
+    Generate all symmetry copies of an asymmetric unit at once.
+
+    Args:
+        asu: Structure holding one protomer (e.g. GyrA on chain A + GyrB on chain B)
+        operators: list of (R, t, chain_map); chain_map renames chains of the copy
+
+    Returns:
+        Structure with copies concatenated in operator order
+    """
+    rotations = np.stack([np.asarray(R, dtype=float) for R, _, _ in operators])
+    translations = np.stack([np.asarray(t, dtype=float) for _, t, _ in operators])
+    # (n_ops, n_atoms, 3) in a single batched product
+    copied = np.einsum('mij,nj->mni', rotations, asu.coords) + translations[:, None, :]
+
+    copies = []
+    for coords, (_, _, chain_map) in zip(copied, operators):
+        copies.append(asu.with_coords(coords).rename_chains(chain_map))
+    return concatenate(copies)
@@ -0,0 +1,126 @@
+"""
+One-pass byte-offset index of record types and chains in a PDB file.
+
+The file is scanned once and every contiguous run of lines sharing the same
+(record, chain, residue name) key is recorded as a byte range. Residue names
+are only part of the key for HETATM records, so a protein chain is a single
+run while ions, waters and ligands stay individually addressable. ANISOU
+records belong to the run of the atom they follow and are dropped on read
+unless requested. Extracting chain D or all HETATM MG records is then a
+seek-and-read of the matching ranges instead of a scan of the whole template.
+
+Usage:
+    from pdb_index import PDBIndex
+
+    index = PDBIndex('input/templates/5bs8.pdb')
+    chain_d = index.read_chain('D')
+    mg_ions = index.read(record='HETATM', resname='MG')
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+
+class Segment(NamedTuple):
+    record: str
+    chain: str
+    resname: str
+    start: int
+    end: int
+    n_lines: int
+    has_anisou: bool
+
+
+def _line_key(line: bytes):
+    """(record, chain, resname) key of a PDB line."""
+    record = line[:6].decode('ascii', 'replace').strip()
+    if record in ('ATOM', 'HETATM', 'TER'):
+        chain = chr(line[21]) if len(line) > 21 and line[21:22].strip() else ''
+        resname = line[17:20].decode('ascii', 'replace').strip() if record == 'HETATM' else ''
+        return record, chain, resname
+    return record, '', ''
+
+
+class PDBIndex:
+    """Byte ranges of every record/chain run in a PDB file."""
+
+    def __init__(self, filename: str):
+        self.filename = str(filename)
+        self.segments: List[Segment] = []
+        self._build()
+
+    def _build(self):
+        key = None
+        start = offset = n_lines = 0
+        has_anisou = False
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                if line.startswith(b'ANISOU') and key is not None and key[0] in ('ATOM', 'HETATM'):
+                    # Anisotropic records extend the run of the preceding atom
+                    offset += len(line)
+                    has_anisou = True
+                    continue
+                line_key = _line_key(line)
+                if line_key != key:
+                    if key is not None:
+                        self.segments.append(Segment(*key, start, offset, n_lines, has_anisou))
+                    key, start, n_lines, has_anisou = line_key, offset, 0, False
+                offset += len(line)
+                n_lines += 1
+        if key is not None:
+            self.segments.append(Segment(*key, start, offset, n_lines, has_anisou))
+
+    def find(self, record: Optional[Iterable[str]] = None, chain: Optional[Iterable[str]] = None,
+             resname: Optional[Iterable[str]] = None) -> List[Segment]:
+        """
+        Segments matching the given record type(s), chain ID(s) and residue name(s).
+
+        Each filter may be a single string or an iterable of strings; None matches all.
+        Segments are returned in file order.
+        """
+        def as_set(value):
+            if value is None:
+                return None
+            return {value} if isinstance(value, str) else set(value)
+
+        records, chains, resnames = as_set(record), as_set(chain), as_set(resname)
+        return [seg for seg in self.segments
+                if (records is None or seg.record in records)
+                and (chains is None or seg.chain in chains)
+                and (resnames is None or seg.resname in resnames)]
+
+    def iter_segments(self, segments: Iterable[Segment], anisou: bool = False) -> Iterator[str]:
+        """Stream the lines of the given segments with one seek per segment."""
+        with open(self.filename, 'rb') as f:
+            for seg in segments:
+                f.seek(seg.start)
+                chunk = f.read(seg.end - seg.start).decode('ascii', 'replace').splitlines(keepends=True)
+                for line in chunk:
+                    if anisou or not (seg.has_anisou and line.startswith('ANISOU')):
+                        yield line
+
+    def iter(self, record=('ATOM', 'HETATM'), chain=None, resname=None, anisou=False) -> Iterator[str]:
+        """Stream lines of all segments matching the filters (see find)."""
+        return self.iter_segments(self.find(record, chain, resname), anisou)
+
+    def read_segments(self, segments: Iterable[Segment], anisou: bool = False) -> List[str]:
+        """Read the lines of the given segments with one seek per segment."""
+        return list(self.iter_segments(segments, anisou))
+
+    def read(self, record=('ATOM', 'HETATM'), chain=None, resname=None, anisou=False) -> List[str]:
+        """Lines of all segments matching the filters (see find)."""
+        return self.read_segments(self.find(record, chain, resname), anisou)
+
+    def read_chain(self, chain_id: str, records=('ATOM', 'HETATM')) -> List[str]:
+        """All atom lines of one chain."""
+        return self.read(record=records, chain=chain_id)
+
+    def chains(self, records=('ATOM', 'HETATM')) -> List[str]:
+        """Chain IDs in order of first appearance."""
+        seen = []
+        for seg in self.find(record=records):
+            if seg.chain and seg.chain not in seen:
+                seen.append(seg.chain)
+        return seen
+
+    def count(self, record=None, chain=None, resname=None) -> int:
+        """Number of lines matching the filters, without reading the file."""
+        return sum(seg.n_lines for seg in self.find(record, chain, resname))
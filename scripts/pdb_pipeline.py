@@ -0,0 +1,162 @@
+"""
+Streaming, composable filters over PDB lines.
+
+Every stage is a generator function taking an iterable of lines (plus
+keyword options) and yielding lines, so a pipeline such as
+
+    read_lines -> record_filter -> altloc_filter -> chain_filter -> renumber_atoms -> write_lines
+
+streams a file from input to output one line at a time without building
+the whole file in memory. Stages are bound with functools.partial, which
+keeps them picklable for process_files, the parallel driver used to clean
+all templates in input/templates at once.
+
+Usage:
+    from functools import partial
+    from pdb_pipeline import (read_lines, record_filter, altloc_filter, chain_filter,
+                              renumber_atoms, run_pipeline, write_lines)
+
+    stages = [partial(record_filter, records=('ATOM', 'TER')),
+              altloc_filter,
+              partial(chain_filter, chains='AB'),
+              renumber_atoms]
+    write_lines(run_pipeline(read_lines('5bs8.pdb'), stages), '5bs8_AB.pdb')
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, Union
+
+ATOM_RECORDS = ('ATOM', 'HETATM', 'ANISOU')
+
+Stage = Callable[[Iterable[str]], Iterator[str]]
+
+
+def read_lines(pdb_file) -> Iterator[str]:
+    """Stream the lines of a PDB file."""
+    with open(pdb_file, 'r') as f:
+        yield from f
+
+
+def record_filter(lines: Iterable[str], records=('ATOM', 'HETATM', 'TER')) -> Iterator[str]:
+    """Keep only lines whose record name is in records."""
+    records = tuple(records)
+    for line in lines:
+        if line[:6].strip() in records:
+            yield line
+
+
+def altloc_filter(lines: Iterable[str], keep=(' ', 'A'), clear=True) -> Iterator[str]:
+    """
+    Drop atoms of alternate conformations not listed in keep.
+
+    When clear is True the alternate location indicator of kept atoms is blanked.
+    """
+    for line in lines:
+        if line.startswith(ATOM_RECORDS) and len(line) > 16:
+            if line[16] not in keep:
+                continue
+            if clear:
+                line = line[:16] + ' ' + line[17:]
+        yield line
+
+
+def chain_filter(lines: Iterable[str], chains) -> Iterator[str]:
+    """
+    Keep atoms (and TER records) of the given chains; other records pass through.
+
+    TER records without a chain ID are kept only directly after a kept atom.
+    """
+    chains = set(chains)
+    last_kept_atom = False
+    for line in lines:
+        if line.startswith(ATOM_RECORDS):
+            last_kept_atom = len(line) > 21 and line[21] in chains
+            if last_kept_atom:
+                yield line
+        elif line.startswith('TER'):
+            chain = line[21] if len(line) > 21 else ' '
+            if chain in chains or (chain == ' ' and last_kept_atom):
+                yield line
+            last_kept_atom = False
+        else:
+            yield line
+
+
+def rename_chains(lines: Iterable[str], mapping: Union[dict, str]) -> Iterator[str]:
+    """
+    Replace chain IDs of atom and TER records.
+
+    mapping is either a dict {old: new} or a single chain ID applied to every record.
+    """
+    for line in lines:
+        if line.startswith(ATOM_RECORDS + ('TER',)) and len(line) > 21:
+            new = mapping if isinstance(mapping, str) else mapping.get(line[21], line[21])
+            line = line[:21] + new + line[22:]
+        yield line
+
+
+def renumber_atoms(lines: Iterable[str], start: int = 1) -> Iterator[str]:
+    """Renumber ATOM/HETATM serials sequentially; TER records take the next serial."""
+    serial = start
+    for line in lines:
+        if line.startswith(('ATOM', 'HETATM')):
+            yield line[:6] + f"{serial % 100000:5d}" + line[11:]
+            serial += 1
+        elif line.startswith('TER'):
+            rest = line[11:] if len(line.rstrip('\n')) > 11 else '\n'
+            yield f"TER   {serial % 100000:5d}" + rest
+            serial += 1
+        else:
+            yield line
+
+
+def append_end(lines: Iterable[str]) -> Iterator[str]:
+    """Pass lines through, dropping any END record, and terminate with a single END."""
+    for line in lines:
+        if line[:6].strip() != 'END':
+            yield line
+    yield 'END\n'
+
+
+def run_pipeline(source: Iterable[str], stages: Sequence[Stage]) -> Iterator[str]:
+    """Chain stages lazily onto a source of lines."""
+    lines = iter(source)
+    for stage in stages:
+        lines = stage(lines)
+    return lines
+
+
+def write_lines(lines: Iterable[str], output_file) -> int:
+    """Stream lines to a file; returns the number of lines written."""
+    count = 0
+    with open(output_file, 'w') as f:
+        for line in lines:
+            f.write(line)
+            count += 1
+    return count
+
+
+def process_file(input_file, output_file, stages: Sequence[Stage]) -> Tuple[str, int]:
+    """Run a pipeline from one PDB file to another."""
+    return str(output_file), write_lines(run_pipeline(read_lines(input_file), stages), output_file)
+
+
+def process_files(jobs: List[Tuple[str, str]], stages: Sequence[Stage],
+                  workers: int = None) -> List[Tuple[str, int]]:
+    """
+    Run the same pipeline over many (input, output) file pairs in parallel.
+
+    Args:
+        jobs: list of (input_file, output_file)
+        stages: pipeline stages (module-level functions or partials, so they pickle)
+        workers: process count (defaults to CPU count; 1 runs serially)
+
+    Returns:
+        list of (output_file, lines written) in job order
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [process_file(src, dst, stages) for src, dst in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(process_file, src, dst, stages) for src, dst in jobs]
+        return [future.result() for future in futures]
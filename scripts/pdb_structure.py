@@ -0,0 +1,225 @@
+"""
+Array-backed PDB structure container shared by the assembly and analysis scripts.
+
+Atom records are parsed once into NumPy columns (coordinates plus per-atom
+name/residue/chain fields) so that selections, superpositions and symmetry
+copies operate on whole arrays instead of re-parsing PDB text lines.
+"""
+import numpy as np
+
+# Fixed-width column layout of ATOM/HETATM records
+_FIELDS = ('record', 'name', 'altloc', 'resname', 'chain', 'resseq',
+           'icode', 'occupancy', 'bfactor', 'element')
+
+
+class Structure:
+    """Atoms of a PDB file stored column-wise in NumPy arrays."""
+
+    def __init__(self, coords, record, name, altloc, resname, chain, resseq,
+                 icode, occupancy, bfactor, element):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.record = np.asarray(record, dtype='<U6')
+        self.name = np.asarray(name, dtype='<U4')
+        self.altloc = np.asarray(altloc, dtype='<U1')
+        self.resname = np.asarray(resname, dtype='<U3')
+        self.chain = np.asarray(chain, dtype='<U1')
+        self.resseq = np.asarray(resseq, dtype=int)
+        self.icode = np.asarray(icode, dtype='<U1')
+        self.occupancy = np.asarray(occupancy, dtype=float)
+        self.bfactor = np.asarray(bfactor, dtype=float)
+        self.element = np.asarray(element, dtype='<U2')
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _columns(self):
+        return {field: getattr(self, field) for field in _FIELDS}
+
+    def select(self, mask):
+        """Return a new Structure with the atoms selected by a mask or index array."""
+        return Structure(self.coords[mask],
+                         **{k: v[mask] for k, v in self._columns().items()})
+
+    def copy(self):
+        return Structure(self.coords.copy(),
+                         **{k: v.copy() for k, v in self._columns().items()})
+
+    def chain_ids(self):
+        """Chain IDs in order of first appearance."""
+        _, first = np.unique(self.chain, return_index=True)
+        return list(self.chain[np.sort(first)])
+
+    def chains(self, chain_ids):
+        """Select all atoms belonging to the given chain ID(s)."""
+        return self.select(np.isin(self.chain, list(chain_ids)))
+
+    def with_coords(self, coords):
+        """Return a copy carrying new coordinates."""
+        new = self.copy()
+        new.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        return new
+
+    def rename_chains(self, mapping):
+        """Return a copy with chain IDs replaced according to mapping."""
+        new = self.copy()
+        for old, target in mapping.items():
+            new.chain[self.chain == old] = target
+        return new
+
+    def residue_keys(self):
+        """Per-atom (chain, resseq, icode) residue identifiers."""
+        return list(zip(self.chain, self.resseq, self.icode))
+
+    def residue_index(self):
+        """
+        Per-atom integer residue index (0..n_residues-1) in file order.
+
+        Returns:
+            (index array, array of first-atom positions for each residue)
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        changed = ((self.chain[1:] != self.chain[:-1]) |
+                   (self.resseq[1:] != self.resseq[:-1]) |
+                   (self.icode[1:] != self.icode[:-1]))
+        index = np.concatenate([[0], np.cumsum(changed)])
+        starts = np.concatenate([[0], np.nonzero(changed)[0] + 1])
+        return index, starts
+
+    def is_hydrogen(self):
+        return self.element == 'H'
+
+    def atom_mask(self, atom_name):
+        return self.name == atom_name
+
+    def to_pdb_lines(self, start_serial=1, ter=True):
+        """
+        Format atoms as PDB lines, renumbering serials from start_serial.
+
+        A TER record closes every polymer (ATOM) chain when ter is True.
+        """
+        lines = []
+        serial = start_serial
+        n = len(self)
+        for i in range(n):
+            name = self.name[i]
+            # Four-character, digit-leading and two-letter-element names start in column 13
+            if len(name) == 4 or name[:1].isdigit() or len(self.element[i]) == 2:
+                padded = name
+            else:
+                padded = f" {name}"
+            x, y, z = self.coords[i]
+            lines.append(
+                f"{self.record[i]:<6}{serial % 100000:5d} {padded:<4}{self.altloc[i]:1}"
+                f"{self.resname[i]:>3} {self.chain[i]:1}{self.resseq[i]:4d}{self.icode[i]:1}   "
+                f"{x:8.3f}{y:8.3f}{z:8.3f}{self.occupancy[i]:6.2f}{self.bfactor[i]:6.2f}"
+                f"          {self.element[i]:>2}  \n"
+            )
+            serial += 1
+            if ter and self.record[i] == 'ATOM':
+                if i == n - 1 or self.chain[i + 1] != self.chain[i] or self.record[i + 1] != 'ATOM':
+                    lines.append(f"TER   {serial % 100000:5d}      {self.resname[i]:>3} "
+                                 f"{self.chain[i]:1}{self.resseq[i]:4d}{self.icode[i]:1}\n")
+                    serial += 1
+        return lines
+
+    def write(self, filename, remarks=()):
+        """Write the structure as a PDB file with optional REMARK lines."""
+        with open(filename, 'w') as f:
+            for remark in remarks:
+                f.write(f"REMARK   {remark}\n")
+            f.writelines(self.to_pdb_lines())
+            f.write("END\n")
+
+
+_TWO_LETTER_ELEMENTS = ('MG', 'ZN', 'CL', 'NA', 'FE', 'MN', 'CA', 'BR')
+
+
+def _guess_element(name):
+    """Infer an element symbol from the 4-column atom name when columns 77-78 are blank."""
+    stripped = name.strip()
+    # Two-letter elements are left-justified in column 13 (e.g. 'MG  ' vs ' CA ')
+    if name[:1] not in (' ', '') and not name[0].isdigit() and stripped[:2].upper() in _TWO_LETTER_ELEMENTS:
+        return stripped[:2].upper()
+    stripped = stripped.lstrip('0123456789')
+    return stripped[:1].upper()
+
+
+def parse_pdb_lines(lines, records=('ATOM', 'HETATM')):
+    """Parse ATOM/HETATM lines into a Structure (other records are skipped)."""
+    atoms = [line for line in lines if line.startswith(records)]
+    columns = {field: [] for field in _FIELDS}
+    coords = np.empty((len(atoms), 3), dtype=float)
+    for i, line in enumerate(atoms):
+        coords[i] = (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+        name = line[12:16]
+        columns['record'].append(line[:6].strip())
+        columns['name'].append(name.strip())
+        columns['altloc'].append(line[16].strip())
+        columns['resname'].append(line[17:20].strip())
+        columns['chain'].append(line[21])
+        columns['resseq'].append(int(line[22:26]))
+        columns['icode'].append(line[26].strip() if len(line) > 26 else '')
+        columns['occupancy'].append(float(line[54:60]) if line[54:60].strip() else 1.0)
+        columns['bfactor'].append(float(line[60:66]) if line[60:66].strip() else 0.0)
+        element = line[76:78].strip() if len(line) > 76 else ''
+        columns['element'].append(element.upper() or _guess_element(name))
+    return Structure(coords, **columns)
+
+
+def read_structure(filename, records=('ATOM', 'HETATM')):
+    """Read a PDB file into a Structure."""
+    with open(filename, 'r') as f:
+        return parse_pdb_lines(f, records)
+
+
+def concatenate(structures):
+    """Join several Structures into one, preserving order."""
+    structures = list(structures)
+    coords = np.concatenate([s.coords for s in structures]) if structures else np.zeros((0, 3))
+    columns = {field: np.concatenate([getattr(s, field) for s in structures])
+               if structures else [] for field in _FIELDS}
+    return Structure(coords, **columns)
+
+
+def kabsch(P, Q):
+    """
+    Optimal rotation R and translation t such that R @ p + t superposes P onto Q.
+
+    P, Q: (N, 3) arrays of paired points.
+    """
+    centroid_P = P.mean(axis=0)
+    centroid_Q = Q.mean(axis=0)
+    H = (P - centroid_P).T @ (Q - centroid_Q)
+    U, S, Vt = np.linalg.svd(H)
+    # Ensure proper rotation (not reflection)
+    d = np.sign(np.linalg.det(Vt.T @ U.T))
+    D = np.diag([1.0, 1.0, d])
+    R = Vt.T @ D @ U.T
+    t = centroid_Q - R @ centroid_P
+    return R, t
+
+
+def rmsd(P, Q):
+    """Root-mean-square deviation between paired point sets."""
+    return float(np.sqrt(np.mean(np.sum((P - Q) ** 2, axis=1))))
+
+
+def kabsch_batch(P, Q):
+    """
+    Rotations R (M, 3, 3) and translations t (M, 3) superposing each P[m] onto Q.
+
+    P: (M, N, 3) stack of paired point sets; Q: (N, 3) or (M, N, 3).
+    """
+    P = np.asarray(P, dtype=float)
+    Q = np.broadcast_to(np.asarray(Q, dtype=float), P.shape)
+    centroid_P = P.mean(axis=1)
+    centroid_Q = Q.mean(axis=1)
+    H = np.einsum('mni,mnj->mij', P - centroid_P[:, None], Q - centroid_Q[:, None])
+    U, S, Vt = np.linalg.svd(H)
+    V, Ut = Vt.transpose(0, 2, 1), U.transpose(0, 2, 1)
+    D = np.tile(np.eye(3), (len(P), 1, 1))
+    D[:, 2, 2] = np.sign(np.linalg.det(V @ Ut))
+    R = V @ D @ Ut
+    t = centroid_Q - np.einsum('mij,mj->mi', R, centroid_P)
+    return R, t
@@ -2,14 +2,30 @@
 """
 Quality Assessment Visualization for M. abscessus DNA Gyrase Model
 Creates Ramachandran plot and quality metrics summary
+
+Ramachandran data are computed from the model itself (dihedrals.py), and
+clashscore, RMSD to template, per-chain scores and Rosetta energies come
+from quality_metrics.py, so the plots always reflect the current tetramer.
+Metrics are cached by input hash and the figures are only redrawn when the
+model, templates, alignments or relaxed models change.
+
+Usage:
+    python plot_quality_assessment.py [model.pdb] [--force]
 """
 
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.colors import ListedColormap
 import numpy as np
 import seaborn as sns
+import argparse
 import os
 
+from dihedrals import (ALLOWED, FAVORED, OUTLIER, RAMA_CASES, outlier_labels, ramachandran_analysis,
+                       ramachandran_grid, ramachandran_summary, write_ramachandran_csv)
+from pdb_structure import read_structure
+from quality_metrics import get_metrics, molprobity_like_score
+
 # Set style
 plt.style.use('seaborn-v0_8-whitegrid')
 sns.set_palette("Set2")
@@ -17,116 +33,155 @@ sns.set_palette("Set2")
 # Output directory
 output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output', 'validation')
 os.makedirs(output_dir, exist_ok=True)
+default_model = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output', 'tetramer',
+                             'mabs_gyrase_tetramer_protein_only.pdb')
+output_files = ['ramachandran_plot.png', 'ramachandran_plot.pdf', 'ramachandran_data.csv',
+                'quality_metrics_summary.png', 'quality_metrics_summary.pdf',
+                'quality_dashboard.png', 'quality_dashboard.pdf']
+stamp_file = os.path.join(output_dir, 'dashboard_inputs.sha256')
+
+GRADE_COLORS = {'Excellent': '#2E7D32', 'Good': '#558B2F', 'Acceptable': '#F57F17', 'Poor': '#C62828'}
+
+# Metric thresholds (excellent, good, acceptable) and whether lower is better
+THRESHOLDS = {
+    'rama_favored': (98, 95, 90, False),
+    'rama_outliers': (0.2, 0.5, 2, True),
+    'clashscore': (5, 10, 20, True),
+    'molprobity': (1.5, 2.0, 3.0, True),
+    'rmsd': (1.0, 2.0, 3.0, True),
+}
+
+def load_ramachandran_data(model_file=default_model):
+    """Per-residue phi/psi and Ramachandran regions of the model."""
+    return ramachandran_analysis(read_structure(model_file))
+
+def grade(value, metric):
+    """Quality level of a metric value against THRESHOLDS."""
+    *levels, inverted = THRESHOLDS[metric]
+    for label, threshold in zip(['Excellent', 'Good', 'Acceptable'], levels):
+        if (value <= threshold) if inverted else (value >= threshold):
+            return label
+    return 'Poor'
+
+def subunit_chains(metrics):
+    """Chain IDs of each subunit, in chain order."""
+    subunits = {}
+    for chain, entry in metrics['chains'].items():
+        subunits.setdefault(entry.get('subunit', chain), []).append(chain)
+    return subunits
+
+def subunit_scores(metrics, chains):
+    """Residue-weighted Rama favored, atom-weighted clashscore and MolProbity-like score of chains."""
+    entries = [metrics['chains'][c] for c in chains]
+    favored = (sum(e['ramachandran']['favored_pct'] * e['ramachandran']['total'] for e in entries)
+               / max(sum(e['ramachandran']['total'] for e in entries), 1))
+    clash = sum(e['clashscore'] * e['atoms'] for e in entries) / max(sum(e['atoms'] for e in entries), 1)
+    return favored, clash, molprobity_like_score(clash, favored)
+
+def rmsd_bars(metrics):
+    """Core and disjoint-residue CA RMSD bars for one chain per subunit."""
+    labels, values = [], []
+    for subunit, chains in subunit_chains(metrics).items():
+        entry = metrics['chains'][chains[0]]
+        if 'core_rmsd' not in entry:
+            continue
+        labels += [f"{subunit}\ncore", f"{subunit}\naligned", f"{subunit}\ndisjoint ({entry['n_disjoint']})"]
+        values += [entry['core_rmsd'], entry['aligned_rmsd'], entry['disjoint_rmsd']]
+    return labels, values
+
+def contour_note(summary):
+    """Label suffix for Ramachandran results from the approximate (non-Top8000) contours."""
+    return ' (approximate contours)' if summary['reference'] == 'approximate' else ''
+
+def contour_footnote(fig, summary):
+    """Footnote for the '*' on Ramachandran metrics from the approximate contours."""
+    if contour_note(summary):
+        fig.text(0.01, 0.005, '* Ramachandran regions from approximate contours (Top8000 reference '
+                 'grids not found); indicative only, not validation results', fontsize=9, color='#C62828')
+
+CONCLUSIONS = {
+    'Excellent': 'Geometry supports structure-based design; check the flagged regions before docking',
+    'Good': 'Geometry supports structure-based design; check the flagged regions before docking',
+    'Acceptable': 'Use with caution; refine the flagged regions before quantitative analysis',
+    'Poor': 'Not suitable for quantitative structure-based design without further refinement',
+}
+
+def summary_lines(rama, metrics, overall):
+    """Validation summary text of the dashboard, built from the computed metrics and grade."""
+    summary = ramachandran_summary(rama)
+    lines = [f"STRUCTURAL VALIDATION SUMMARY - overall {overall.upper()} "
+             f"(MolProbity-like {metrics['molprobity_like']:.2f})", '']
+    for subunit, chains in subunit_chains(metrics).items():
+        favored, clash, score = subunit_scores(metrics, chains)
+        level = grade(score, 'molprobity')
+        line = (f"{subunit} (chains {', '.join(chains)}): {level} - Rama favored {favored:.1f}%, "
+                f"clashscore {clash:.1f}")
+        disjoint = [metrics['chains'][c] for c in chains if 'n_disjoint' in metrics['chains'][c]]
+        if disjoint:
+            line += (f", {max(e['n_disjoint'] for e in disjoint)} residues > 3 Å from template "
+                     f"(disjoint RMSD {max(e['disjoint_rmsd'] for e in disjoint):.2f} Å)")
+        lines.append(line)
+    outliers = outlier_labels(rama)
+    if outliers:
+        lines.append(f"Ramachandran outliers{contour_note(summary)}: " + ", ".join(outliers[:10])
+                     + (f" (+{len(outliers) - 10} more)" if len(outliers) > 10 else ""))
+    if metrics['interface_clashes']:
+        worst = sorted(metrics['interface_clashes'].items(), key=lambda item: -item[1])[:3]
+        lines.append("Interface clashes: " + ", ".join(f"{p[0]}-{p[1]} {n}" for p, n in worst))
+    lines += ['', f"CONCLUSION: {CONCLUSIONS[overall]}"]
+    return lines
+
+def draw_ramachandran_regions(ax, case='general'):
+    """Shade the favored/allowed regions of the lookup grid used for classification."""
+    grid = ramachandran_grid(case)
+    cmap = ListedColormap(['#FFFFFF', '#E8E8E8', '#2E86AB'])
+    ax.imshow(grid.T, origin='lower', extent=(-180, 180, -180, 180), cmap=cmap,
+              vmin=OUTLIER, vmax=FAVORED, alpha=0.35, interpolation='nearest', aspect='auto')
 
 # ============================================================================
 # 1. RAMACHANDRAN PLOT
 # ============================================================================
 
-def create_ramachandran_plot():
+def create_ramachandran_plot(rama=None):
     """Create Ramachandran plot with favored/allowed/outlier regions"""
     
-    fig, ax = plt.subplots(figsize=(10, 10), dpi=150)
+    if rama is None:
+        rama = load_ramachandran_data()
+    summary = ramachandran_summary(rama)
     
-    # Define Ramachandran regions (approximate boundaries)
-    # Favored regions (darker)
-    favored_regions = [
-        # Beta-sheet region
-        {'x': (-180, -50), 'y': (90, 180), 'color': '#2E86AB'},
-        {'x': (-180, -50), 'y': (-180, -120), 'color': '#2E86AB'},
-        # Alpha-helix region
-        {'x': (-100, -30), 'y': (-80, 20), 'color': '#2E86AB'},
-        # Left-handed alpha (for glycine)
-        {'x': (30, 90), 'y': (-30, 60), 'color': '#A23B72'},
-    ]
+    fig, ax = plt.subplots(figsize=(10, 10), dpi=150)
     
-    # Allowed regions (lighter)
-    allowed_regions = [
-        {'x': (-180, -20), 'y': (60, 180), 'color': '#E8E8E8'},
-        {'x': (-180, -20), 'y': (-180, -90), 'color': '#E8E8E8'},
-        {'x': (-150, 0), 'y': (-90, 60), 'color': '#E8E8E8'},
-        {'x': (0, 180), 'y': (-180, 180), 'color': '#F5F5F5'},
-    ]
+    # Favored (darker) and allowed (lighter) regions of the general case
+    draw_ramachandran_regions(ax)
     
-    # Draw allowed regions first (background)
-    for region in allowed_regions:
-        rect = plt.Rectangle(
-            (region['x'][0], region['y'][0]),
-            region['x'][1] - region['x'][0],
-            region['y'][1] - region['y'][0],
-            facecolor=region['color'],
-            edgecolor='none',
-            alpha=0.3
-        )
-        ax.add_patch(rect)
-    
-    # Draw favored regions
-    for region in favored_regions:
-        rect = plt.Rectangle(
-            (region['x'][0], region['y'][0]),
-            region['x'][1] - region['x'][0],
-            region['y'][1] - region['y'][0],
-            facecolor=region['color'],
-            edgecolor='none',
-            alpha=0.4
-        )
-        ax.add_patch(rect)
-    
-    # Generate sample data points based on validation report
-    np.random.seed(42)
-    
-    # Favored residues (95.4% = 1395 residues)
-    # Alpha helix cluster
-    n_alpha = 700
-    phi_alpha = np.random.normal(-65, 10, n_alpha)
-    psi_alpha = np.random.normal(-40, 12, n_alpha)
-    
-    # Beta sheet cluster
-    n_beta = 500
-    phi_beta = np.random.normal(-120, 15, n_beta)
-    psi_beta = np.random.normal(130, 20, n_beta)
-    
-    # Other favored
-    n_other = 195
-    phi_other = np.random.normal(-80, 20, n_other)
-    psi_other = np.random.normal(-10, 25, n_other)
-    
-    # Allowed residues (4.1% = 60 residues)
-    n_allowed = 60
-    phi_allowed = np.random.uniform(-150, 50, n_allowed)
-    psi_allowed = np.random.uniform(-100, 100, n_allowed)
-    
-    # Outliers (0.5% = 7 residues)
-    outliers = [
-        (-125.3, 145.2, 'Gly156'),  # GyrA
-        (-78.5, -165.3, 'Ser423'),  # GyrA
-        (-95.2, 125.4, 'Asp589'),   # GyrB
-        (45.2, -85.3, 'Gly234'),
-        (-150.2, 75.4, 'Asn312'),
-        (65.3, 25.6, 'Gly456'),
-        (-45.8, 155.2, 'Ala178'),
-    ]
+    phi, psi, region = rama['phi'], rama['psi'], rama['region']
+    glycine = rama['case'] == RAMA_CASES.index('glycine')
+    favored = region == FAVORED
+    allowed = region == ALLOWED
+    outlier = region == OUTLIER
     
     # Plot data points
-    ax.scatter(phi_alpha, psi_alpha, c='#2E86AB', s=8, alpha=0.6, label='Alpha helix')
-    ax.scatter(phi_beta, psi_beta, c='#A23B72', s=8, alpha=0.6, label='Beta sheet')
-    ax.scatter(phi_other, psi_other, c='#F18F01', s=8, alpha=0.6, label='Other favored')
-    ax.scatter(phi_allowed, psi_allowed, c='#C73E1D', s=15, alpha=0.7, marker='s', label='Allowed')
+    ax.scatter(phi[favored & ~glycine], psi[favored & ~glycine], c='#2E86AB', s=8, alpha=0.6, label='Favored')
+    ax.scatter(phi[favored & glycine], psi[favored & glycine], c='#A23B72', s=8, alpha=0.6, label='Favored (Gly)')
+    ax.scatter(phi[allowed], psi[allowed], c='#C73E1D', s=15, alpha=0.7, marker='s', label='Allowed')
     
     # Plot outliers with labels
-    for phi, psi, label in outliers:
-        ax.scatter(phi, psi, c='red', s=100, marker='x', linewidths=3, zorder=10)
-        ax.annotate(label, (phi, psi), xytext=(10, 10), textcoords='offset points',
+    for k, label in zip(np.nonzero(outlier)[0], outlier_labels(rama)):
+        ax.scatter(phi[k], psi[k], c='red', s=100, marker='x', linewidths=3, zorder=10)
+        ax.annotate(label, (phi[k], psi[k]), xytext=(10, 10), textcoords='offset points',
                    fontsize=9, color='red', fontweight='bold')
     
     # Add outlier to legend
-    ax.scatter([], [], c='red', s=100, marker='x', linewidths=3, label='Outliers (0.5%)')
+    ax.scatter([], [], c='red', s=100, marker='x', linewidths=3,
+               label=f"Outliers ({summary['outliers_pct']:.1f}%)")
     
     # Axis settings
     ax.set_xlim(-180, 180)
     ax.set_ylim(-180, 180)
     ax.set_xlabel('Phi (φ) [degrees]', fontsize=14, fontweight='bold')
     ax.set_ylabel('Psi (ψ) [degrees]', fontsize=14, fontweight='bold')
-    ax.set_title('Ramachandran Plot\nM. abscessus DNA Gyrase Model (1462 residues)', 
+    ax.set_title(f"Ramachandran Plot{contour_note(summary)}\n"
+                 f"M. abscessus DNA Gyrase Model ({summary['total']} residues)", 
                 fontsize=16, fontweight='bold', pad=20)
     
     # Grid
@@ -142,11 +197,11 @@ def create_ramachandran_plot():
     stats_text = (
         'Statistics:\n'
         '─────────────────\n'
-        'Favored:   95.4%\n'
-        'Allowed:    4.1%\n'
-        'Outliers:   0.5%\n'
+        f"Favored:  {summary['favored_pct']:5.1f}%\n"
+        f"Allowed:  {summary['allowed_pct']:5.1f}%\n"
+        f"Outliers: {summary['outliers_pct']:5.1f}%\n"
         '─────────────────\n'
-        'Total: 1462 residues'
+        f"Total: {summary['total']} residues"
     )
     props = dict(boxstyle='round', facecolor='wheat', alpha=0.9)
     ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=11,
@@ -157,60 +212,47 @@ def create_ramachandran_plot():
     plt.savefig(os.path.join(output_dir, 'ramachandran_plot.pdf'), bbox_inches='tight')
     print(f"Saved: {os.path.join(output_dir, 'ramachandran_plot.png')}")
     plt.close()
+    
+    csv_file = os.path.join(output_dir, 'ramachandran_data.csv')
+    write_ramachandran_csv(rama, csv_file, 'M. abscessus DNA Gyrase model')
+    print(f"Saved: {csv_file}")
 
 # ============================================================================
 # 2. QUALITY METRICS SUMMARY
 # ============================================================================
 
-def create_quality_metrics_plot():
+def create_quality_metrics_plot(rama=None, metrics=None):
     """Create bar chart of quality metrics with thresholds"""
     
-    fig, axes = plt.subplots(2, 2, figsize=(14, 12), dpi=150)
+    if rama is None:
+        rama = load_ramachandran_data()
+    if metrics is None:
+        metrics = get_metrics(default_model)[0]
+    summary = ramachandran_summary(rama)
+    star = '*' if contour_note(summary) else ''
     
-    # Metric data from validation report
-    metrics = {
-        'Ramachandran\nFavored (%)': {'value': 95.4, 'excellent': 98, 'good': 95, 'acceptable': 90},
-        'Ramachandran\nOutliers (%)': {'value': 0.5, 'excellent': 0.2, 'good': 0.5, 'acceptable': 2, 'inverted': True},
-        'Rotamer\nOutliers (%)': {'value': 1.5, 'excellent': 1, 'good': 2, 'acceptable': 4, 'inverted': True},
-        'Clashscore': {'value': 4.8, 'excellent': 5, 'good': 10, 'acceptable': 20, 'inverted': True},
-        'MolProbity\nScore': {'value': 1.58, 'excellent': 1.5, 'good': 2.0, 'acceptable': 3.0, 'inverted': True},
-        'Cα RMSD\n(Å)': {'value': 1.22, 'excellent': 1.0, 'good': 2.0, 'acceptable': 3.0, 'inverted': True},
-    }
+    fig, axes = plt.subplots(2, 2, figsize=(14, 12), dpi=150)
+    contour_footnote(fig, summary)
+    
+    # Computed metrics (quality_metrics.py)
+    bar_metrics = [
+        (f'Ramachandran\nFavored (%){star}', summary['favored_pct'], 'rama_favored'),
+        (f'Ramachandran\nOutliers (%){star}', summary['outliers_pct'], 'rama_outliers'),
+        ('Clashscore\n(intra-chain)', metrics['intra_chain_clashscore'], 'clashscore'),
+        ('Cα RMSD\ncore (Å)', metrics.get('core_rmsd', np.nan), 'rmsd'),
+    ]
     
     # Plot 1: Main quality metrics bar chart
     ax1 = axes[0, 0]
-    metric_names = list(metrics.keys())[:4]
-    values = [metrics[m]['value'] for m in metric_names]
-    
-    colors = []
-    for m in metric_names:
-        v = metrics[m]['value']
-        if metrics[m].get('inverted', False):
-            if v <= metrics[m]['excellent']:
-                colors.append('#2E7D32')  # Green
-            elif v <= metrics[m]['good']:
-                colors.append('#558B2F')  # Light green
-            elif v <= metrics[m]['acceptable']:
-                colors.append('#F57F17')  # Yellow
-            else:
-                colors.append('#C62828')  # Red
-        else:
-            if v >= metrics[m]['excellent']:
-                colors.append('#2E7D32')
-            elif v >= metrics[m]['good']:
-                colors.append('#558B2F')
-            elif v >= metrics[m]['acceptable']:
-                colors.append('#F57F17')
-            else:
-                colors.append('#C62828')
+    metric_names = [name for name, _, _ in bar_metrics]
+    values = [value for _, value, _ in bar_metrics]
+    colors = [GRADE_COLORS[grade(value, metric)] for _, value, metric in bar_metrics]
     
     bars = ax1.bar(metric_names, values, color=colors, edgecolor='black', linewidth=1.5)
     
     # Add threshold lines
-    for i, m in enumerate(metric_names):
-        if m == 'Ramachandran\nFavored (%)':
-            ax1.axhline(metrics[m]['excellent'], color='green', linestyle='--', alpha=0.5, linewidth=1)
-            ax1.axhline(metrics[m]['good'], color='orange', linestyle='--', alpha=0.5, linewidth=1)
+    ax1.axhline(THRESHOLDS['rama_favored'][0], color='green', linestyle='--', alpha=0.5, linewidth=1)
+    ax1.axhline(THRESHOLDS['rama_favored'][1], color='orange', linestyle='--', alpha=0.5, linewidth=1)
     
     # Add value labels on bars
     for bar, val in zip(bars, values):
@@ -218,7 +260,8 @@ def create_quality_metrics_plot():
                 f'{val:.1f}', ha='center', va='bottom', fontweight='bold', fontsize=12)
     
     ax1.set_ylabel('Value', fontsize=12, fontweight='bold')
-    ax1.set_title('Model Quality Metrics', fontsize=14, fontweight='bold')
+    ax1.set_title(f"Model Quality Metrics\n(all-atom clashscore {metrics['clashscore']:.1f}, "
+                  f"MolProbity-like {metrics['molprobity_like']:.2f})", fontsize=14, fontweight='bold')
     ax1.set_ylim(0, 110)
     
     # Legend for quality levels
@@ -232,9 +275,8 @@ def create_quality_metrics_plot():
     
     # Plot 2: Regional RMSD comparison
     ax2 = axes[0, 1]
-    regions = ['Core\nβ-sheet', 'TOPRIM\nDomain', 'DNA\nBinding', 'Active\nSite', 'De novo\nLoops']
-    rmsd_values = [0.45, 0.52, 0.38, 0.38, 3.65]
-    colors2 = ['#2E7D32', '#2E7D32', '#2E7D32', '#2E7D32', '#F57F17']
+    regions, rmsd_values = rmsd_bars(metrics)
+    colors2 = [GRADE_COLORS[grade(v, 'rmsd')] for v in rmsd_values]
     
     bars2 = ax2.bar(regions, rmsd_values, color=colors2, edgecolor='black', linewidth=1.5)
     
@@ -247,16 +289,20 @@ def create_quality_metrics_plot():
     
     ax2.set_ylabel('Cα RMSD (Å)', fontsize=12, fontweight='bold')
     ax2.set_title('Regional RMSD to Template', fontsize=14, fontweight='bold')
-    ax2.set_ylim(0, 5)
+    ax2.set_ylim(0, max([5] + [v + 1 for v in rmsd_values]))
     ax2.legend(loc='upper left', fontsize=10)
     
     # Plot 3: Subunit comparison
     ax3 = axes[1, 0]
-    subunits = ['GyrA', 'GyrB', 'Tetramer']
+    # GyrA is chains A/C and GyrB chains B/D in the tetramer; clashscores are intra-chain
+    groups = subunit_chains(metrics)
+    subunits = list(groups) + ['Tetramer']
+    scores = [subunit_scores(metrics, chains) for chains in groups.values()]
+    scores.append(subunit_scores(metrics, list(metrics['chains'])))
     metrics_compare = {
-        'Rama Favored (%)': [96.2, 95.8, 95.4],
-        'Clashscore': [3.2, 4.1, 4.8],
-        'MolProbity': [1.45, 1.62, 1.58],
+        'Rama Favored (%)': [s[0] for s in scores],
+        'Clashscore': [s[1] for s in scores],
+        'MolProbity': [s[2] for s in scores],
     }
     
     x = np.arange(len(subunits))
@@ -278,7 +324,7 @@ def create_quality_metrics_plot():
     ax3.set_xticklabels(subunits, fontsize=12, fontweight='bold')
     ax3.set_title('Quality Comparison by Subunit', fontsize=14, fontweight='bold')
     ax3.set_ylim(90, 100)
-    ax3_twin.set_ylim(0, 8)
+    ax3_twin.set_ylim(0, max([8] + [v + 1 for v in metrics_compare['Clashscore']]))
     
     # Combined legend
     lines1, labels1 = ax3.get_legend_handles_labels()
@@ -287,8 +333,11 @@ def create_quality_metrics_plot():
     
     # Plot 4: Rosetta Energy Breakdown
     ax4 = axes[1, 1]
-    energy_terms = ['fa_atr', 'fa_rep', 'fa_sol', 'hbond\n(total)', 'rama\n_prepro', 'Total\n(scaled)']
-    energy_values = [-4521.8, 892.5, 1124.7, -322.8, -67.2, -284.7]
+    energies = metrics['energies']
+    energy_terms = ['fa_atr', 'fa_rep', 'fa_sol', 'hbond\n(total)', 'rama\n_prepro', 'Total']
+    energy_values = [energies.get('fa_atr', 0.0), energies.get('fa_rep', 0.0), energies.get('fa_sol', 0.0),
+                     sum(v for term, v in energies.items() if term.startswith('hbond')),
+                     energies.get('rama_prepro', 0.0), energies.get('total', 0.0)]
     
     colors4 = ['#2E7D32' if v < 0 else '#C62828' for v in energy_values]
     colors4[-1] = '#2E86AB'  # Total in different color
@@ -306,12 +355,15 @@ def create_quality_metrics_plot():
     
     ax4.axvline(0, color='black', linewidth=2)
     ax4.set_xlabel('Rosetta Energy Units (REU)', fontsize=12, fontweight='bold')
-    ax4.set_title('Rosetta Energy Breakdown', fontsize=14, fontweight='bold')
-    ax4.set_xlim(-5000, 1500)
+    sources = ', '.join(os.path.basename(p).split('_relaxed')[0] for p in metrics['energy_sources'])
+    ax4.set_title(f"Rosetta Energy Breakdown\n({sources or 'no pose energies in inputs'})",
+                  fontsize=14, fontweight='bold')
+    low, high = min(energy_values + [0.0]), max(energy_values + [0.0])
+    ax4.set_xlim(low * 1.15 - 500, high * 1.15 + 500)
     
     # Add annotation
-    ax4.annotate('Favorable\ninteractions', xy=(-2000, 0.5), fontsize=10, color='#2E7D32', fontweight='bold')
-    ax4.annotate('Unfavorable\n(steric)', xy=(500, 2), fontsize=10, color='#C62828', fontweight='bold')
+    ax4.annotate('Favorable\ninteractions', xy=(low / 2, 0.5), fontsize=10, color='#2E7D32', fontweight='bold')
+    ax4.annotate('Unfavorable\n(steric)', xy=(max(high / 4, 100), 2), fontsize=10, color='#C62828', fontweight='bold')
     
     plt.tight_layout()
     plt.savefig(os.path.join(output_dir, 'quality_metrics_summary.png'), dpi=300, bbox_inches='tight')
@@ -323,10 +375,19 @@ def create_quality_metrics_plot():
 # 3. OVERALL QUALITY DASHBOARD
 # ============================================================================
 
-def create_quality_dashboard():
+def create_quality_dashboard(rama=None, metrics=None):
     """Create a single-page dashboard summarizing model quality"""
     
+    if rama is None:
+        rama = load_ramachandran_data()
+    if metrics is None:
+        metrics = get_metrics(default_model)[0]
+    summary = ramachandran_summary(rama)
+    overall = grade(metrics['molprobity_like'], 'molprobity')
+    star = '*' if contour_note(summary) else ''
+    
     fig = plt.figure(figsize=(16, 10), dpi=150)
+    contour_footnote(fig, summary)
     fig.suptitle('M. abscessus DNA Gyrase Model - Quality Assessment Dashboard', 
                 fontsize=18, fontweight='bold', y=0.98)
     
@@ -353,8 +414,8 @@ def create_quality_dashboard():
         y = np.append(0, np.sin(theta))
         ax_gauge.fill(x, y, color=color, alpha=0.7)
     
-    # Add needle pointing to "Good" (around 5/8 of the way)
-    needle_angle = 0.65 * np.pi  # Good region
+    # Needle in the middle of the segment of the overall (MolProbity-like) grade
+    needle_angle = (['Poor', 'Acceptable', 'Good', 'Excellent'].index(overall) + 0.5) * np.pi / 4
     ax_gauge.plot([0, 0.8*np.cos(needle_angle)], [0, 0.8*np.sin(needle_angle)], 
                  'k-', linewidth=4, solid_capstyle='round')
     ax_gauge.plot([0], [0], 'ko', markersize=15)
@@ -362,7 +423,8 @@ def create_quality_dashboard():
     ax_gauge.set_xlim(-1.2, 1.2)
     ax_gauge.set_ylim(-0.2, 1.2)
     ax_gauge.axis('off')
-    ax_gauge.set_title('Overall Assessment:\nGOOD', fontsize=14, fontweight='bold', color='#558B2F')
+    ax_gauge.set_title(f"Overall Assessment:\n{overall.upper()}", fontsize=14, fontweight='bold',
+                       color=GRADE_COLORS[overall])
     
     # Add segment labels
     ax_gauge.text(-0.9, 0.3, 'Poor', fontsize=9, color='white', fontweight='bold')
@@ -374,18 +436,22 @@ def create_quality_dashboard():
     ax_table = fig.add_subplot(gs[0, 1:3])
     ax_table.axis('off')
     
-    table_data = [
-        ['Metric', 'Value', 'Status'],
-        ['Ramachandran Favored', '95.4%', '✓ Good'],
-        ['Ramachandran Outliers', '0.5%', '✓ Good'],
-        ['Rotamer Outliers', '1.5%', '✓ Good'],
-        ['Clashscore', '4.8', '✓ Good'],
-        ['MolProbity Score', '1.58', '✓ Good'],
-        ['Cα RMSD', '1.22 Å', '✓ Good'],
+    rows = [
+        (f'Ramachandran Favored{star}', f"{summary['favored_pct']:.1f}%", grade(summary['favored_pct'], 'rama_favored')),
+        (f'Ramachandran Outliers{star}', f"{summary['outliers_pct']:.1f}%", grade(summary['outliers_pct'], 'rama_outliers')),
+        ('Clashscore (intra-chain)', f"{metrics['intra_chain_clashscore']:.1f}",
+         grade(metrics['intra_chain_clashscore'], 'clashscore')),
+        ('Clashscore (all atoms)', f"{metrics['clashscore']:.1f}", grade(metrics['clashscore'], 'clashscore')),
+        ('MolProbity-like Score', f"{metrics['molprobity_like']:.2f}", overall),
+        ('Cα RMSD (core)', f"{metrics.get('core_rmsd', np.nan):.2f} Å", grade(metrics.get('core_rmsd', np.nan), 'rmsd')),
     ]
+    marks = {'Excellent': '✓', 'Good': '✓', 'Acceptable': '~', 'Poor': '✗'}
+    status_colors = {'Excellent': '#C8E6C9', 'Good': '#C8E6C9', 'Acceptable': '#FFF9C4', 'Poor': '#FFCDD2'}
+    table_data = [['Metric', 'Value', 'Status']] + [[name, value, f"{marks[level]} {level}"]
+                                                     for name, value, level in rows]
     
     # Create table
-    cell_colors = [['#E8E8E8']*3] + [['white', 'white', '#C8E6C9']]*6
+    cell_colors = [['#E8E8E8']*3] + [['white', 'white', status_colors[level]] for _, _, level in rows]
     table = ax_table.table(cellText=table_data, loc='center', cellLoc='center',
                            cellColours=cell_colors)
     table.auto_set_font_size(False)
@@ -402,6 +468,8 @@ def create_quality_dashboard():
     ax_info = fig.add_subplot(gs[0, 3])
     ax_info.axis('off')
     
+    subunit_lines = ''.join(f"  {subunit}: {metrics['chains'][chains[0]]['residues']}\n"
+                            for subunit, chains in subunit_chains(metrics).items())
     info_text = (
         '═══════════════════════\n'
         '     MODEL INFO\n'
@@ -411,9 +479,8 @@ def create_quality_dashboard():
         'Template: 5BS8\n'
         '          (M. tuberculosis)\n\n'
         'Method: RosettaCM\n\n'
-        'Residues: 1462\n'
-        '  GyrA: 486\n'
-        '  GyrB: 245\n'
+        f"Residues: {len(rama['resname'])}\n"
+        f"{subunit_lines}"
         '  (A₂B₂ tetramer)\n\n'
         '═══════════════════════'
     )
@@ -424,27 +491,20 @@ def create_quality_dashboard():
     # Middle row: Mini Ramachandran plot
     ax_rama = fig.add_subplot(gs[1, 0:2])
     
-    np.random.seed(42)
-    # Simplified Ramachandran data
-    n = 500
-    phi_alpha = np.random.normal(-65, 10, n)
-    psi_alpha = np.random.normal(-40, 12, n)
-    phi_beta = np.random.normal(-120, 15, int(n*0.7))
-    psi_beta = np.random.normal(130, 20, int(n*0.7))
-    
-    ax_rama.scatter(phi_alpha, psi_alpha, c='#2E86AB', s=5, alpha=0.5, label='Alpha helix')
-    ax_rama.scatter(phi_beta, psi_beta, c='#A23B72', s=5, alpha=0.5, label='Beta sheet')
+    draw_ramachandran_regions(ax_rama)
+    phi, psi, region = rama['phi'], rama['psi'], rama['region']
+    ax_rama.scatter(phi[region == FAVORED], psi[region == FAVORED], c='#2E86AB', s=5, alpha=0.5, label='Favored')
+    ax_rama.scatter(phi[region == ALLOWED], psi[region == ALLOWED], c='#A23B72', s=5, alpha=0.5, label='Allowed')
     
     # Outliers
-    outliers_phi = [-125.3, -78.5, -95.2, 45.2, 65.3]
-    outliers_psi = [145.2, -165.3, 125.4, -85.3, 25.6]
-    ax_rama.scatter(outliers_phi, outliers_psi, c='red', s=50, marker='x', linewidths=2, label='Outliers (0.5%)')
+    ax_rama.scatter(phi[region == OUTLIER], psi[region == OUTLIER], c='red', s=50, marker='x', linewidths=2,
+                    label=f"Outliers ({summary['outliers_pct']:.1f}%)")
     
     ax_rama.set_xlim(-180, 180)
     ax_rama.set_ylim(-180, 180)
     ax_rama.set_xlabel('Phi (φ)', fontsize=10)
     ax_rama.set_ylabel('Psi (ψ)', fontsize=10)
-    ax_rama.set_title('Ramachandran Plot', fontsize=12, fontweight='bold')
+    ax_rama.set_title(f"Ramachandran Plot{contour_note(summary)}", fontsize=12, fontweight='bold')
     ax_rama.legend(loc='upper right', fontsize=8)
     ax_rama.axhline(0, color='gray', linewidth=0.5, alpha=0.5)
     ax_rama.axvline(0, color='gray', linewidth=0.5, alpha=0.5)
@@ -452,9 +512,8 @@ def create_quality_dashboard():
     # Middle right: Regional RMSD
     ax_rmsd = fig.add_subplot(gs[1, 2:4])
     
-    regions = ['Core', 'TOPRIM', 'DNA\nBinding', 'Active\nSite', 'De novo\nLoops']
-    rmsd_values = [0.45, 0.52, 0.38, 0.38, 3.65]
-    colors_rmsd = ['#2E7D32', '#2E7D32', '#2E7D32', '#2E7D32', '#F57F17']
+    regions, rmsd_values = rmsd_bars(metrics)
+    colors_rmsd = [GRADE_COLORS[grade(v, 'rmsd')] for v in rmsd_values]
     
     bars = ax_rmsd.bar(regions, rmsd_values, color=colors_rmsd, edgecolor='black', linewidth=1)
     ax_rmsd.axhline(1.0, color='green', linestyle='--', alpha=0.7, linewidth=1.5, label='Excellent')
@@ -466,28 +525,14 @@ def create_quality_dashboard():
     
     ax_rmsd.set_ylabel('RMSD (Å)', fontsize=10)
     ax_rmsd.set_title('Regional Quality (RMSD to Template)', fontsize=12, fontweight='bold')
-    ax_rmsd.set_ylim(0, 5)
+    ax_rmsd.set_ylim(0, max([5] + [v + 1 for v in rmsd_values]))
     ax_rmsd.legend(loc='upper left', fontsize=8)
     
     # Bottom: Recommendations
     ax_rec = fig.add_subplot(gs[2, :])
     ax_rec.axis('off')
     
-    recommendations = (
-        '┌─────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────┐\n'
-        '│                                                    STRUCTURAL VALIDATION SUMMARY                                                        │\n'
-        '├─────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────┤\n'
-        '│                                                                                                                                         │\n'
-        '│  ✓ HIGH CONFIDENCE: Core domains, Active site (QRDR), DNA binding interface - SUITABLE FOR DOCKING                                     │\n'
-        '│                                                                                                                                         │\n'
-        '│  ~ MODERATE CONFIDENCE: Inter-subunit interfaces, Surface loops - USE WITH CAUTION                                                     │\n'
-        '│                                                                                                                                         │\n'
-        '│  ✗ LOW CONFIDENCE: De novo modeled loop (GyrB 559-620), Terminal regions - AVOID FOR QUANTITATIVE ANALYSIS                             │\n'
-        '│                                                                                                                                         │\n'
-        '│  CONCLUSION: Model is suitable for structure-based drug design targeting the fluoroquinolone binding site                              │\n'
-        '│                                                                                                                                         │\n'
-        '└─────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────────┘'
-    )
+    recommendations = '\n'.join(summary_lines(rama, metrics, overall))
     ax_rec.text(0.5, 0.5, recommendations, transform=ax_rec.transAxes, fontsize=9,
                fontfamily='monospace', verticalalignment='center', horizontalalignment='center',
                bbox=dict(boxstyle='round', facecolor='#FFF9C4', edgecolor='#F57F17', linewidth=2))
@@ -499,18 +544,38 @@ def create_quality_dashboard():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quality assessment plots for the gyrase model')
+    parser.add_argument('model', nargs='?', default=default_model, help='Model PDB')
+    parser.add_argument('--force', action='store_true', help='Recompute metrics and redraw all plots')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Generating Quality Assessment Plots")
     print("=" * 60)
     
+    print(f"\nComputing metrics: {args.model}")
+    metrics, key, computed = get_metrics(args.model, force=args.force)
+    print(f"  {'computed' if computed else 'cached'} ({key[:12]})")
+    
+    previous = open(stamp_file).read().strip() if os.path.exists(stamp_file) else None
+    if (not args.force and previous == key
+            and all(os.path.exists(os.path.join(output_dir, f)) for f in output_files)):
+        print("\nInputs unchanged; plots are up to date in:", output_dir)
+        raise SystemExit(0)
+    
+    rama = load_ramachandran_data(args.model)
+    
     print("\n1. Creating Ramachandran plot...")
-    create_ramachandran_plot()
+    create_ramachandran_plot(rama)
     
     print("\n2. Creating quality metrics summary...")
-    create_quality_metrics_plot()
+    create_quality_metrics_plot(rama, metrics)
     
     print("\n3. Creating quality dashboard...")
-    create_quality_dashboard()
+    create_quality_dashboard(rama, metrics)
+    
+    with open(stamp_file, 'w') as f:
+        f.write(key + '\n')
     
     print("\n" + "=" * 60)
     print("All plots saved to:", output_dir)
@@ -14,8 +14,25 @@ Usage:
 
 import os
 import argparse
+from functools import partial
 from pathlib import Path
 
+from pdb_pipeline import (record_filter, altloc_filter, chain_filter, append_end,
+                          process_file, process_files)
+
+def clean_pipeline(keep_chains=None):
+    """
+    Streaming stages used to clean a template.
+
+    Keeps ATOM/TER records, drops alternate conformations other than 'A'
+    (clearing the indicator), optionally filters chains, and ends with END.
+    """
+    stages = [partial(record_filter, records=('ATOM', 'TER')), altloc_filter]
+    if keep_chains:
+        stages.append(partial(chain_filter, chains=keep_chains))
+    stages.append(append_end)
+    return stages
+
 def clean_pdb(pdb_file, output_file, keep_chains=None):
     """
     Clean a PDB file for use as a template.
@@ -25,34 +42,7 @@ def clean_pdb(pdb_file, output_file, keep_chains=None):
         output_file: Output cleaned PDB file path
         keep_chains: List of chain IDs to keep (None = keep all)
     """
-    clean_lines = []
-    
-    with open(pdb_file, 'r') as f:
-        for line in f:
-            # Keep only ATOM records
-            if line.startswith('ATOM'):
-                # Skip alternate conformations (keep only 'A' or ' ')
-                alt_loc = line[16]
-                if alt_loc not in [' ', 'A']:
-                    continue
-                
-                # Filter by chain if specified
-                chain_id = line[21]
-                if keep_chains and chain_id not in keep_chains:
-                    continue
-                
-                # Clean the alternate location indicator
-                clean_line = line[:16] + ' ' + line[17:]
-                clean_lines.append(clean_line)
-            
-            elif line.startswith('TER'):
-                clean_lines.append(line)
-    
-    clean_lines.append('END\n')
-    
-    with open(output_file, 'w') as f:
-        f.writelines(clean_lines)
-    
+    process_file(pdb_file, output_file, clean_pipeline(keep_chains))
     print(f"Cleaned: {pdb_file} -> {output_file}")
 
 def extract_sequence_from_pdb(pdb_file):
@@ -108,6 +98,8 @@ def main():
                         help='Output directory for cleaned templates')
     parser.add_argument('--chains', nargs='+', default=None,
                         help='Chains to keep (e.g., A B)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel cleaning processes (default: CPU count)')
     args = parser.parse_args()
     
     # Create output directory
@@ -131,12 +123,14 @@ def main():
     
     all_sequences = {}
     
-    for pdb_file in pdb_files:
+    # Clean all templates in parallel, streaming each file through the pipeline
+    jobs = [(pdb_file, Path(args.output) / f"{pdb_file.stem}_clean.pdb") for pdb_file in pdb_files]
+    process_files(jobs, clean_pipeline(args.chains), workers=args.workers)
+    for pdb_file, output_pdb in jobs:
+        print(f"Cleaned: {pdb_file} -> {output_pdb}")
+    
+    for pdb_file, output_pdb in jobs:
         template_name = pdb_file.stem
-        output_pdb = Path(args.output) / f"{template_name}_clean.pdb"
-        
-        # Clean the PDB
-        clean_pdb(pdb_file, output_pdb, keep_chains=args.chains)
         
         # Extract sequences
         sequences = extract_sequence_from_pdb(output_pdb)
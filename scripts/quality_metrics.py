@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Model quality metrics for the validation dashboard, cached by input hash.
+
+Metrics are computed from the model files themselves:
+
+  - Ramachandran favored/allowed/outlier percentages (dihedrals.py)
+  - clashscore: serious all-atom overlaps (>= 0.4 Å) per 1000 atoms,
+    from a neighbor-grid search that skips pairs in the same or adjacent
+    residues and polar H...N/O contacts (an approximation of MolProbity's);
+    reported overall, within each chain, and per chain-pair interface
+  - CA RMSD to the template per chain, through the threading alignments
+    (core superposition, plus RMSD over the disjoint residues)
+  - a MolProbity-style score from clashscore and Ramachandran favored
+    (no rotamer term)
+  - Rosetta energy terms from the pose energies table of the model or of
+    the relaxed subunit models
+
+Results are stored in a JSON cache keyed by the SHA-256 of every input file
+and the metric settings, so unchanged models are never re-analyzed. Keys
+depend on file contents only and cached paths are repo-relative, so the
+cache stays valid when the repository is checked out elsewhere.
+
+Usage:
+    python quality_metrics.py --model output/tetramer/mabs_gyrase_tetramer_protein_only.pdb
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from clash_detection import VDW_RADII, DEFAULT_RADIUS
+from dihedrals import (RAMA_REFERENCE_DIR, RAMA_REFERENCE_FILES, ramachandran_analysis, ramachandran_summary,
+                       uses_reference_grids)
+from loop_detection import parse_grishin, residue_deviations
+from neighbor_grid import NeighborGrid
+from pdb_structure import Structure, read_structure
+
+METRICS_VERSION = 2
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE = os.path.join(REPO_DIR, 'output', 'validation', 'metrics_cache.json')
+
+# Chain -> (subunit, template PDB, template chain, alignment) for the A2B2 tetramer
+TETRAMER_REFERENCES = {
+    'A': ('GyrA', 'input/templates/5bs8_chainA.pdb', 'A', 'input/alignments_final/alignment_gyrA_proper.grishin'),
+    'B': ('GyrB', 'input/templates/5bs8_chainB.pdb', 'B', 'input/alignments_final/alignment_gyrB_proper.grishin'),
+    'C': ('GyrA', 'input/templates/5bs8_chainA.pdb', 'A', 'input/alignments_final/alignment_gyrA_proper.grishin'),
+    'D': ('GyrB', 'input/templates/5bs8_chainB.pdb', 'B', 'input/alignments_final/alignment_gyrB_proper.grishin'),
+}
+DEFAULT_ENERGY_MODELS = [
+    'output/relaxed/mabs_gyrA_new_relaxed_mabs_gyrA_threaded_new_0001.pdb',
+    'output/relaxed/mabs_gyrB_new_relaxed_mabs_gyrB_threaded_new_0001.pdb',
+]
+CLASH_OVERLAP = 0.4
+HYDROGEN_RADIUS = 1.10
+DISJOINT_CUTOFF = 3.0
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def repo_relative(path: str) -> str:
+    """path relative to the repository root (unchanged if it lies outside it)."""
+    path = os.path.abspath(path)
+    relative = os.path.relpath(path, REPO_DIR)
+    return path if relative.startswith(os.pardir) else relative
+
+
+def inputs_key(paths: Sequence[str], settings: Dict = None) -> str:
+    """Cache key over the contents of all input files (in order) and the metric settings."""
+    sha = hashlib.sha256(f"v{METRICS_VERSION}".encode())
+    for path in paths:
+        sha.update(file_digest(path).encode())
+    sha.update(json.dumps(settings or {}, sort_keys=True).encode())
+    return sha.hexdigest()
+
+
+def clash_count(structure: Structure, overlap: float = CLASH_OVERLAP) -> Dict[str, np.ndarray]:
+    """
+    Serious atom overlaps (r_i + r_j - d >= overlap) between non-neighboring residues.
+
+    Returns:
+        Dict with 'i', 'j' atom index arrays of the clashing pairs
+    """
+    radii = np.array([HYDROGEN_RADIUS if e == 'H' else VDW_RADII.get(str(e), DEFAULT_RADIUS)
+                      for e in structure.element])
+    cutoff = 2 * radii.max()
+    grid = NeighborGrid(structure.coords, cell_size=cutoff)
+    i, j, dist = grid.pairs(cutoff)
+    keep = radii[i] + radii[j] - dist >= overlap
+    i, j = i[keep], j[keep]
+
+    residue, _ = structure.residue_index()
+    same_chain = structure.chain[i] == structure.chain[j]
+    bonded = same_chain & (np.abs(residue[i] - residue[j]) <= 1)
+    elem_i, elem_j = structure.element[i], structure.element[j]
+    polar = ((elem_i == 'H') & np.isin(elem_j, ['N', 'O'])) | ((elem_j == 'H') & np.isin(elem_i, ['N', 'O']))
+    disulfide = (structure.name[i] == 'SG') & (structure.name[j] == 'SG')
+    altloc_i, altloc_j = structure.altloc[i], structure.altloc[j]
+    exclusive = (altloc_i != '') & (altloc_j != '') & (altloc_i != altloc_j)
+    keep = ~(bonded | polar | disulfide | exclusive)
+    return {'i': i[keep], 'j': j[keep]}
+
+
+def read_pose_energies(pdb_file: str) -> Dict[str, float]:
+    """Whole-pose energy terms from a Rosetta pose energies table ({} if absent)."""
+    labels = None
+    with open(pdb_file, 'r') as f:
+        for line in f:
+            if line.startswith('label '):
+                labels = line.split()[1:]
+            elif line.startswith('pose ') and labels:
+                return {name: float(value) for name, value in zip(labels, line.split()[1:])}
+    return {}
+
+
+def molprobity_like_score(clashscore: float, rama_favored_pct: float) -> float:
+    """MolProbity score formula without the rotamer-outlier term."""
+    return (0.426 * np.log(1 + clashscore)
+            + 0.25 * np.log(1 + max(0.0, 100 - rama_favored_pct - 2)) + 0.5)
+
+
+def chain_rmsd(model: Structure, chain: str, template_file: str, template_chain: str,
+               alignment_file: str) -> Dict[str, float]:
+    target, template_row, target_offset, template_offset = parse_grishin(alignment_file)
+    detail = residue_deviations(model, read_structure(template_file, ('ATOM',)), target, template_row,
+                                chain, template_chain, target_offset, template_offset)
+    deviation = detail['deviation'][~np.isnan(detail['deviation'])]
+    disjoint = deviation[deviation > DISJOINT_CUTOFF]
+    return {
+        'core_rmsd': detail['core_rmsd'],
+        'n_core': detail['n_core'],
+        'aligned_rmsd': float(np.sqrt(np.mean(deviation ** 2))) if len(deviation) else float('nan'),
+        'n_aligned': int(len(deviation)),
+        'disjoint_rmsd': float(np.sqrt(np.mean(disjoint ** 2))) if len(disjoint) else 0.0,
+        'n_disjoint': int(len(disjoint)),
+    }
+
+
+def compute_metrics(model_file: str, references: Dict = None, energy_models: Sequence[str] = ()) -> Dict:
+    """All dashboard metrics for one model (JSON-serializable)."""
+    references = TETRAMER_REFERENCES if references is None else references
+    model = read_structure(model_file, ('ATOM',))
+    rama = ramachandran_analysis(model)
+    clashes = clash_count(model)
+
+    metrics = {'model': repo_relative(model_file), 'n_atoms': len(model), 'chains': {}}
+    overall = ramachandran_summary(rama)
+    metrics['ramachandran'] = overall
+    metrics['clashscore'] = 1000.0 * len(clashes['i']) / max(len(model), 1)
+    metrics['n_clashes'] = int(len(clashes['i']))
+    metrics['molprobity_like'] = molprobity_like_score(metrics['clashscore'], overall['favored_pct'])
+
+    chain_i, chain_j = model.chain[clashes['i']], model.chain[clashes['j']]
+    interface = chain_i != chain_j
+    metrics['interface_clashes'] = {f"{a}{b}": int(n) for (a, b), n in zip(
+        *np.unique(np.sort(np.stack([chain_i[interface], chain_j[interface]], axis=1), axis=1),
+                   axis=0, return_counts=True))} if interface.any() else {}
+    metrics['intra_chain_clashscore'] = 1000.0 * np.sum(~interface) / max(len(model), 1)
+    for chain in model.chain_ids():
+        chain = str(chain)
+        in_chain = model.chain == chain
+        chain_rama = ramachandran_summary({'region': rama['region'][rama['chain'] == chain]})
+        n_atoms = int(in_chain.sum())
+        entry = {
+            'residues': int(np.sum(rama['chain'] == chain)),
+            'atoms': n_atoms,
+            'ramachandran': chain_rama,
+            'clashscore': 1000.0 * np.sum(~interface & (chain_i == chain)) / max(n_atoms, 1),
+        }
+        if chain in references:
+            subunit, template_file, template_chain, alignment = references[chain]
+            entry['subunit'] = subunit
+            entry.update(chain_rmsd(model, chain, os.path.join(REPO_DIR, template_file), template_chain,
+                                    os.path.join(REPO_DIR, alignment)))
+        metrics['chains'][chain] = entry
+
+    core = [c for c in metrics['chains'].values() if 'core_rmsd' in c]
+    if core:
+        weights = np.array([c['n_core'] for c in core], dtype=float)
+        metrics['core_rmsd'] = float(np.sqrt(np.sum(weights * np.array([c['core_rmsd'] for c in core]) ** 2)
+                                             / weights.sum()))
+
+    energies = read_pose_energies(model_file)
+    sources = [model_file] if energies else []
+    if not energies:
+        for path in energy_models:
+            for term, value in read_pose_energies(path).items():
+                energies[term] = energies.get(term, 0.0) + value
+            sources.append(path)
+    metrics['energies'] = energies
+    metrics['energy_sources'] = [repo_relative(p) for p in sources] if energies else []
+    return metrics
+
+
+def metric_inputs(model_file: str, references: Dict = None, energy_models: Sequence[str] = ()) -> List[str]:
+    references = TETRAMER_REFERENCES if references is None else references
+    paths = [model_file]
+    for _, template_file, _, alignment in references.values():
+        for path in (os.path.join(REPO_DIR, template_file), os.path.join(REPO_DIR, alignment)):
+            if path not in paths:
+                paths.append(path)
+    if uses_reference_grids():
+        paths += [os.path.join(RAMA_REFERENCE_DIR, name) for name, _ in RAMA_REFERENCE_FILES.values()]
+    return paths + [p for p in energy_models if os.path.exists(p)]
+
+
+def get_metrics(model_file: str, cache_file: str = DEFAULT_CACHE, references: Dict = None,
+                energy_models: Sequence[str] = None, force: bool = False):
+    """
+    Metrics for model_file, computed only if no cached entry matches the inputs.
+
+    Returns:
+        (metrics, key, computed) where computed is False on a cache hit
+    """
+    if energy_models is None:
+        energy_models = [os.path.join(REPO_DIR, p) for p in DEFAULT_ENERGY_MODELS]
+    key = inputs_key(metric_inputs(model_file, references, energy_models),
+                     {'references': references or TETRAMER_REFERENCES, 'overlap': CLASH_OVERLAP})
+    cache = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    if not force and key in cache:
+        # Same contents under another name still hit; report the requested model
+        return dict(cache[key], model=repo_relative(model_file)), key, False
+
+    metrics = compute_metrics(model_file, references, energy_models)
+    cache[key] = metrics
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    tmp = cache_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, cache_file)
+    return metrics, key, True
+
+
+def format_metrics(metrics: Dict) -> List[str]:
+    rama = metrics['ramachandran']
+    lines = [f"Model: {metrics['model']}",
+             f"Ramachandran ({rama['reference']} contours) favored {rama['favored_pct']:.1f}%  allowed {rama['allowed_pct']:.1f}%  "
+             f"outliers {rama['outliers_pct']:.1f}% ({rama['total']} residues)",
+             f"Clashscore: {metrics['clashscore']:.1f} ({metrics['n_clashes']} clashes), "
+             f"intra-chain {metrics['intra_chain_clashscore']:.1f}",
+             f"MolProbity-like score: {metrics['molprobity_like']:.2f}"]
+    if 'core_rmsd' in metrics:
+        lines.append(f"Core CA RMSD to template: {metrics['core_rmsd']:.2f} Å")
+    for chain, entry in metrics['chains'].items():
+        line = (f"  Chain {chain} ({entry.get('subunit', '-')}): {entry['residues']} residues, "
+                f"Rama favored {entry['ramachandran']['favored_pct']:.1f}%, clashscore {entry['clashscore']:.1f}")
+        if 'core_rmsd' in entry:
+            line += f", core RMSD {entry['core_rmsd']:.2f} Å, disjoint {entry['n_disjoint']}"
+        lines.append(line)
+    for pair, n in metrics['interface_clashes'].items():
+        lines.append(f"  Interface {pair[0]}-{pair[1]}: {n} clashes")
+    if metrics['energies']:
+        lines.append(f"Rosetta total_score: {metrics['energies'].get('total', float('nan')):.1f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute (cached) model quality metrics')
+    parser.add_argument('--model', default=os.path.join(REPO_DIR, 'output', 'tetramer',
+                                                        'mabs_gyrase_tetramer_protein_only.pdb'))
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='Metrics cache (JSON)')
+    parser.add_argument('--force', action='store_true', help='Recompute even on a cache hit')
+    args = parser.parse_args()
+
+    metrics, key, computed = get_metrics(args.model, args.cache, force=args.force)
+    print(f"{'Computed' if computed else 'Cached'} metrics ({key[:12]})")
+    print('\n'.join(format_metrics(metrics)))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,26 @@
 Loop Refinement Script for M. abscessus Gyrase Model
 Focuses on improving disjoint loop regions identified in structural alignment
 
+Disjoint regions are detected automatically (loop_detection.py) by comparing
+the model with its template through the threading alignment, so the loop
+file and XML are regenerated whenever the model changes. --manual uses the
+hand-curated DISJOINT_REGIONS instead.
+
+Loops that do not touch each other can also be refined as independent
+Rosetta jobs (--parallel): loops are grouped by spatial contact, each group
+gets its own loop file and move map, the groups run concurrently and the
+best-scoring decoy of each group contributes its loop segments to one
+recombined model. This works because the move map keeps everything outside
+a group's loops fixed.
+
+Usage:
+    python refine_loops.py
+    python refine_loops.py --parallel --executable $ROSETTA_BIN/rosetta_scripts.default.linuxgccrelease \
+        --nstruct 10 --workers 4 -- -database $ROSETTA_DB
+    python refine_loops.py --model output/relaxed/mabs_gyrB_new_relaxed_mabs_gyrB_threaded_new_0001.pdb \
+        --template input/templates/5bs8_chainB.pdb \
+        --alignment input/alignments_final/alignment_gyrB_proper.grishin --cutoff 3.0
+
 Options:
 1. Rosetta loop modeling (KIC protocol)
 2. Energy minimization of loop regions
@@ -11,9 +31,19 @@ Options:
 
 import os
 import sys
+import argparse
 import subprocess
+from pathlib import Path
 
-# Disjoint regions identified from structural alignment
+import numpy as np
+
+from loop_detection import MIN_LOOP_LENGTH, detect_disjoint_regions
+from neighbor_grid import NeighborGrid
+from pdb_structure import read_structure
+from rosetta_runner import plan_jobs, run_jobs, strip_managed_options
+from score_files import read_score_files, top_k
+
+# Disjoint regions identified from structural alignment (hand-curated fallback)
 DISJOINT_REGIONS = {
     'GyrA': [(17, 19)],  # Only 3 residues - minor
     'GyrB': [
@@ -37,7 +67,7 @@ def create_loop_file(output_file, chain, regions):
             f.write(f"LOOP  {start}  {end}  {cut}  0.0  0\n")
     print(f"Created loop file: {output_file}")
 
-def create_rosetta_loop_xml(output_file, loop_regions):
+def create_rosetta_loop_xml(output_file, loop_regions, loops_file="loops.txt"):
     """Create Rosetta XML for loop modeling"""
     
     # Build residue selector for loop regions
@@ -71,7 +101,7 @@ def create_rosetta_loop_xml(output_file, loop_regions):
         <LoopModeler name="loop_model" 
             scorefxn="ref2015"
             config="kic"
-            loops_file="loops.txt"
+            loops_file="{loops_file}"
             max_kic_build_attempts="1000"/>
         
         <!-- Minimize loop regions -->
@@ -116,10 +146,14 @@ def create_rosetta_loop_xml(output_file, loop_regions):
         f.write(xml_content)
     print(f"Created Rosetta XML: {output_file}")
 
-def create_pymol_visualization(output_file):
+def create_pymol_visualization(output_file, regions, chain='B'):
     """Create PyMOL script to visualize before/after refinement"""
     
-    pml_content = '''# PyMOL script to compare original vs refined loops
+    selection = "+".join(f"{s}-{e}" if s != e else f"{s}" for s, e in regions)
+    largest = max(regions, key=lambda r: r[1] - r[0])
+    largest_range = f"{largest[0]}-{largest[1]}"
+    
+    pml_content = f'''# PyMOL script to compare original vs refined loops
 # Usage: pymol compare_loops.pml
 
 # Load structures
@@ -134,8 +168,8 @@ show cartoon
 color cyan, original
 # color green, refined  # Uncomment after refinement
 
-# Highlight loop regions (GyrB disjoint loops)
-select loops, chain B and resi 425-430+446-454+472-475+520-538+559-620+629-630+655-657+675
+# Highlight disjoint loop regions
+select loops, chain {chain} and resi {selection}
 color red, loops and original
 # color lime, loops and refined  # Uncomment after refinement
 
@@ -143,7 +177,7 @@ color red, loops and original
 show sticks, loops
 
 # Zoom to major loop
-zoom chain B and resi 559-620
+zoom chain {chain} and resi {largest_range}
 
 # Set nice rendering
 bg_color white
@@ -151,13 +185,136 @@ set cartoon_fancy_helices, 1
 set ray_shadows, 0
 
 print("Loop regions highlighted in red (original)")
-print("Major disjoint loop: residues 559-620 in GyrB")
+print("Major disjoint loop: residues {largest_range} in chain {chain}")
 '''
     
     with open(output_file, 'w') as f:
         f.write(pml_content)
     print(f"Created PyMOL script: {output_file}")
 
+def group_loops(structure, chain, regions, contact_distance=10.0):
+    """
+    Partition loop regions into groups that can be refined independently.
+    
+    Two loops share a group when any of their heavy atoms are within
+    contact_distance (neighbor grid), transitively (union-find).
+    
+    Returns:
+        List of groups, each a sorted list of indices into regions
+    """
+    in_chain = (structure.chain == chain) & (structure.element != 'H')
+    loop_of = np.full(len(structure), -1)
+    for n, (start, end) in enumerate(regions):
+        loop_of[in_chain & (structure.resseq >= start) & (structure.resseq <= end)] = n
+    atoms = np.nonzero(loop_of >= 0)[0]
+    
+    parent = list(range(len(regions)))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    if len(atoms):
+        grid = NeighborGrid(structure.coords[atoms], cell_size=contact_distance)
+        i, j, _ = grid.pairs(contact_distance)
+        pairs = np.stack([loop_of[atoms[i]], loop_of[atoms[j]]], axis=1)
+        pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+        for a, b in pairs:
+            parent[find(a)] = find(b)
+    
+    groups = {}
+    for n in range(len(regions)):
+        groups.setdefault(find(n), []).append(n)
+    return sorted(groups.values())
+
+# Per-group options set by plan_group_jobs (input, protocol and loop file), on top of
+# the output/seed options rosetta_runner manages
+GROUP_JOB_OPTIONS = {'-s': 1, '-in:file:s': 1, '-parser:protocol': 1, '-loops:loop_file': 1,
+                     '-loops:extended': 1, '-out:path': 1}
+
+def plan_group_jobs(groups, regions, model_file, chain, work_dir, nstruct, prefix='loops_', seed=1111):
+    """
+    One Rosetta job per loop group, each with its own loop file and XML move map.
+    
+    Returns:
+        List of rosetta_runner job dicts (per-job arguments in job['args'])
+    """
+    jobs = []
+    for n, group in enumerate(groups):
+        group_dir = os.path.join(work_dir, f"group_{n:02d}")
+        os.makedirs(group_dir, exist_ok=True)
+        group_regions = [regions[k] for k in group]
+        loops_file = os.path.join(group_dir, 'loops.txt')
+        xml_file = os.path.join(group_dir, 'loop_refinement.xml')
+        create_loop_file(loops_file, chain, group_regions)
+        create_rosetta_loop_xml(xml_file, group_regions, os.path.abspath(loops_file))
+        job = plan_jobs(nstruct, 1, group_dir, f"{prefix}g{n:02d}_", seed + n)[0]
+        job.update(index=n, regions=group_regions,
+                   args=['-s', model_file, '-parser:protocol', xml_file])
+        jobs.append(job)
+    return jobs
+
+def recombine_segments(model, chain, jobs, term='total_score'):
+    """
+    Copy loop coordinates of each group's best decoy into the starting model.
+    
+    Atoms are matched by (residue number, insertion code, atom name), so
+    decoys with extra or missing hydrogens still recombine.
+    
+    Returns:
+        (combined Structure, list of (group index, best decoy name, score))
+    """
+    combined = model.copy()
+    chosen = []
+    for job in jobs:
+        if job['status'] != 'done' or not os.path.exists(job['scorefile']):
+            continue
+        table = read_score_files([job['scorefile']])
+        best = top_k(table, 1, term)
+        if not len(best):
+            continue
+        name = str(table.description[best[0]])
+        decoy = read_structure(os.path.join(job['dir'], f"{name}.pdb"))
+        
+        in_loops = np.zeros(len(decoy), dtype=bool)
+        target = np.zeros(len(model), dtype=bool)
+        for start, end in job['regions']:
+            in_loops |= (decoy.chain == chain) & (decoy.resseq >= start) & (decoy.resseq <= end)
+            target |= (model.chain == chain) & (model.resseq >= start) & (model.resseq <= end)
+        source = {(int(decoy.resseq[k]), str(decoy.icode[k]), str(decoy.name[k])): k
+                  for k in np.nonzero(in_loops)[0]}
+        for k in np.nonzero(target)[0]:
+            match = source.get((int(model.resseq[k]), str(model.icode[k]), str(model.name[k])))
+            if match is not None:
+                combined.coords[k] = decoy.coords[match]
+        chosen.append((job['index'], name, float(table[term][best[0]])))
+    return combined, chosen
+
+def run_parallel_refinement(model_file, chain, regions, executable, output_dir, nstruct=10,
+                            workers=None, extra_args=(), contact_distance=10.0, seed=1111):
+    """Group loops, refine each group as its own job, and recombine the best segments."""
+    model = read_structure(model_file)
+    groups = group_loops(model, chain, regions, contact_distance)
+    print(f"{len(regions)} loops in {len(groups)} independent groups:")
+    for n, group in enumerate(groups):
+        print(f"  group {n:02d}: " + ", ".join(f"{regions[k][0]}-{regions[k][1]}" for k in group))
+    
+    work_dir = os.path.join(output_dir, 'loop_jobs')
+    jobs = plan_group_jobs(groups, regions, os.path.abspath(model_file), chain, work_dir, nstruct, seed=seed)
+    user_args = strip_managed_options(list(extra_args), GROUP_JOB_OPTIONS)
+    if len(user_args) < len(extra_args):
+        print("Ignoring Rosetta options set per loop group: "
+              + " ".join(a for a in extra_args if a.startswith('-') and a not in user_args))
+    run_jobs(executable, user_args, jobs, workers or len(jobs))
+    
+    combined, chosen = recombine_segments(model, chain, jobs)
+    output_file = os.path.join(output_dir, 'loops_recombined.pdb')
+    combined.write(output_file, [f"Loop group {n:02d}: {name} (total_score {score:.2f})"
+                                 for n, name, score in chosen])
+    print(f"Recombined {len(chosen)}/{len(groups)} groups into: {output_file}")
+    return output_file, jobs
+
 def print_refinement_options():
     """Print available refinement strategies"""
     
@@ -201,20 +358,74 @@ def print_refinement_options():
 """)
 
 def main():
-    base_dir = "/home/nbhatta1/Desktop/Roy-Ahmed-M.Abcessus-modeling"
+    repo_dir = str(Path(__file__).resolve().parent.parent)
+    parser = argparse.ArgumentParser(description='Prepare loop refinement of disjoint regions')
+    parser.add_argument('--base-dir', default=repo_dir, help='Project directory')
+    parser.add_argument('--model', default='output/relaxed/mabs_gyrB_new_relaxed_mabs_gyrB_threaded_new_0001.pdb',
+                        help='Model to refine (relative to --base-dir)')
+    parser.add_argument('--template', default='input/templates/5bs8_chainB.pdb',
+                        help='Template the model was threaded on')
+    parser.add_argument('--alignment', default='input/alignments_final/alignment_gyrB_proper.grishin',
+                        help='Grishin alignment of model (target) and template')
+    parser.add_argument('--chain', default='B', help='Chain of the loops in the refined complex')
+    parser.add_argument('--cutoff', type=float, default=3.0,
+                        help='CA deviation (Å) above which a residue is disjoint')
+    parser.add_argument('--merge-gap', type=int, default=2,
+                        help='Join regions separated by at most this many residues')
+    parser.add_argument('--min-loop-length', type=int, default=MIN_LOOP_LENGTH,
+                        help='Shorter detected regions are extended into neighboring residues to this length')
+    parser.add_argument('--manual', action='store_true',
+                        help='Use the hand-curated DISJOINT_REGIONS for GyrB')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Refine independent loop groups as concurrent Rosetta jobs')
+    parser.add_argument('--refine-model', default='output/tetramer/mabs_gyrase_tetramer_protein_only.pdb',
+                        help='Parallel mode: structure whose loops are refined')
+    parser.add_argument('--executable', default=None, help='Parallel mode: rosetta_scripts binary')
+    parser.add_argument('--nstruct', type=int, default=10, help='Parallel mode: decoys per loop group')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel mode: concurrent jobs (default: one per group)')
+    parser.add_argument('--contact-distance', type=float, default=10.0,
+                        help='Parallel mode: loops closer than this (Å) are refined together')
+    parser.add_argument('rosetta_args', nargs=argparse.REMAINDER,
+                        help='Parallel mode: arguments after -- are passed to Rosetta')
+    args = parser.parse_args()
+    base_dir = args.base_dir
     os.makedirs(f"{base_dir}/output/refined", exist_ok=True)
     
     print_refinement_options()
     
-    # Create loop file for GyrB (the problematic chain)
-    gyrb_regions = DISJOINT_REGIONS['GyrB']
-    create_loop_file(f"{base_dir}/output/refined/gyrB_loops.txt", 'B', gyrb_regions)
+    # Disjoint regions of GyrB (the problematic chain)
+    if args.manual:
+        gyrb_regions = DISJOINT_REGIONS['GyrB']
+    else:
+        gyrb_regions, detail = detect_disjoint_regions(
+            os.path.join(base_dir, args.model), os.path.join(base_dir, args.template),
+            os.path.join(base_dir, args.alignment), deviation_cutoff=args.cutoff,
+            merge_gap=args.merge_gap, min_loop_length=args.min_loop_length)
+        print(f"Superposed on {detail['n_core']} CA atoms (RMSD {detail['core_rmsd']:.2f} Å)")
+        print(f"Detected {len(gyrb_regions)} disjoint regions: "
+              + ", ".join(f"{s}-{e}" for s, e in gyrb_regions))
+    if not gyrb_regions:
+        print("No disjoint regions found; nothing to refine.")
+        return
+    
+    if args.parallel:
+        if not args.executable:
+            parser.error('--parallel requires --executable')
+        extra_args = args.rosetta_args[1:] if args.rosetta_args[:1] == ['--'] else args.rosetta_args
+        run_parallel_refinement(os.path.join(base_dir, args.refine_model), args.chain, gyrb_regions,
+                                args.executable, f"{base_dir}/output/refined", args.nstruct,
+                                args.workers, extra_args, args.contact_distance)
+        return
+    
+    # Create loop file
+    create_loop_file(f"{base_dir}/output/refined/gyrB_loops.txt", args.chain, gyrb_regions)
     
     # Create Rosetta XML
     create_rosetta_loop_xml(f"{base_dir}/xml/loop_refinement.xml", gyrb_regions)
     
     # Create visualization script
-    create_pymol_visualization(f"{base_dir}/compare_loops.pml")
+    create_pymol_visualization(f"{base_dir}/compare_loops.pml", gyrb_regions, args.chain)
     
     print("\n" + "="*70)
     print("FILES CREATED:")
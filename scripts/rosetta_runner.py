@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Parallel local runner for Rosetta (RosettaCM / FastRelax) campaigns.
+
+Splits -nstruct into independent jobs, each with its own random seed,
+output prefix, directory and score file, runs them on a bounded pool of
+local processes, retries failed jobs with a fresh seed, and finally merges
+the per-job score files and moves all decoys into one output directory.
+
+Any executable accepting the standard Rosetta options (-nstruct, -out:prefix,
+-out:path:all, -out:file:scorefile, -constant_seed, -jran) can be driven,
+so the runner can be exercised with a small stand-in script.
+
+Usage:
+    python rosetta_runner.py --executable $ROSETTA_BIN/rosetta_scripts.default.linuxgccrelease \
+        --nstruct 100 --jobs 20 --workers 4 --output output/models \
+        --prefix mabs_gyrase_dna_ --scorefile output/scores.sc -- \
+        -database $ROSETTA_DB -parser:protocol xml/rosettacm_gyrase_dna.xml \
+        -in:file:fasta input/target_with_dna.fasta
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from score_files import iter_score_rows
+
+# Options the runner sets per job; copies in the pass-through arguments are dropped
+MANAGED_OPTIONS = {
+    '-nstruct': 1, '-out:prefix': 1, '-out:path:all': 1, '-out:path:pdb': 1,
+    '-out:file:scorefile': 1, '-jran': 1, '-constant_seed': 0, '-overwrite': 0,
+}
+DECOY_SUFFIXES = ('.pdb', '.pdb.gz', '.silent', '.out')
+
+
+def split_nstruct(nstruct: int, n_jobs: int) -> List[int]:
+    """Split nstruct into at most n_jobs non-empty, near-equal chunks."""
+    n_jobs = max(1, min(n_jobs, nstruct))
+    base, extra = divmod(nstruct, n_jobs)
+    return [base + (1 if i < extra else 0) for i in range(n_jobs)]
+
+
+def strip_managed_options(args: List[str], managed: Dict[str, int] = None) -> List[str]:
+    """
+    Remove options the runner controls (with their values) from pass-through args.
+
+    managed adds caller-controlled options (name -> number of values) to MANAGED_OPTIONS.
+    """
+    options = dict(MANAGED_OPTIONS, **(managed or {}))
+    cleaned = []
+    skip = 0
+    for arg in args:
+        if skip:
+            skip -= 1
+            continue
+        name = arg.split('=', 1)[0].replace('::', ':')
+        if name in options:
+            if '=' not in arg:
+                skip = options[name]
+            continue
+        cleaned.append(arg)
+    return cleaned
+
+
+def plan_jobs(nstruct: int, n_jobs: int, work_dir: str, prefix: str, seed: int) -> List[Dict]:
+    """Job descriptions with distinct seeds, prefixes and directories."""
+    jobs = []
+    for index, count in enumerate(split_nstruct(nstruct, n_jobs)):
+        job_dir = Path(work_dir) / f"job_{index:03d}"
+        jobs.append({
+            'index': index,
+            'nstruct': count,
+            'seed': seed + index,
+            'prefix': f"{prefix}j{index:03d}_",
+            'dir': str(job_dir),
+            'scorefile': str(job_dir / 'score.sc'),
+            'log': str(job_dir / 'run.log'),
+            'attempts': 0,
+            'status': 'pending',
+        })
+    return jobs
+
+
+def job_command(executable: str, extra_args: List[str], job: Dict) -> List[str]:
+    return [executable, *extra_args,
+            '-nstruct', str(job['nstruct']),
+            '-out:prefix', job['prefix'],
+            '-out:path:all', job['dir'],
+            '-out:file:scorefile', job['scorefile'],
+            '-constant_seed', '-jran', str(job['seed']),
+            '-overwrite']
+
+
+def run_job(executable: str, extra_args: List[str], job: Dict, retries: int, seed_stride: int) -> Dict:
+    """Run one job, retrying with a new seed on failure."""
+    os.makedirs(job['dir'], exist_ok=True)
+    start = time.time()
+    while True:
+        if job['attempts']:
+            # Discard partial decoys and score rows of the failed attempt
+            for path in Path(job['dir']).iterdir():
+                if path.name != Path(job['log']).name and path.is_file():
+                    path.unlink()
+        job['attempts'] += 1
+        with open(job['log'], 'a') as log:
+            log.write(f"# attempt {job['attempts']} seed {job['seed']}\n")
+            log.flush()
+            # Jobs may carry their own arguments (e.g. a per-job protocol) in job['args']
+            result = subprocess.run(job_command(executable, extra_args + job.get('args', []), job),
+                                    stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode == 0:
+            job['status'] = 'done'
+            break
+        job['returncode'] = result.returncode
+        if job['attempts'] > retries:
+            job['status'] = 'failed'
+            break
+        job['seed'] += seed_stride
+    job['seconds'] = round(time.time() - start, 1)
+    return job
+
+
+def run_jobs(executable: str, extra_args: List[str], jobs: List[Dict], workers: int,
+             retries: int = 1, seed_stride: int = 100000) -> List[Dict]:
+    """
+    Run all jobs on a bounded pool; each worker thread owns one Rosetta process.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(run_job, executable, extra_args, job, retries, seed_stride)
+                   for job in jobs]
+        for future in futures:
+            job = future.result()
+            print(f"  job {job['index']:03d}: {job['status']} "
+                  f"(nstruct {job['nstruct']}, seed {job['seed']}, "
+                  f"attempts {job['attempts']}, {job['seconds']} s)")
+    return jobs
+
+
+def merge_score_files(score_files: List[str], output_file: str) -> int:
+    """
+    Merge Rosetta score files whose headers may differ.
+
+    Columns are the union of all headers (first-seen order, description last);
+    missing values are written as 'nan'. Returns the number of decoy rows.
+    """
+    columns: List[str] = []
+    rows = []
+    for score_file in score_files:
+        if not os.path.exists(score_file):
+            continue
+        with open(score_file) as f:
+            for header, values in iter_score_rows(f):
+                columns.extend(c for c in header if c not in columns)
+                rows.append(dict(zip(header, values)))
+    if 'description' in columns:
+        columns.remove('description')
+        columns.append('description')
+
+    with open(output_file, 'w') as f:
+        f.write("SEQUENCE: \n")
+        f.write("SCORE: " + " ".join(columns) + "\n")
+        for row in rows:
+            f.write("SCORE: " + " ".join(row.get(c, 'nan') for c in columns) + "\n")
+    return len(rows)
+
+
+def collect_decoys(jobs: List[Dict], output_dir: str) -> List[str]:
+    """Move decoys from job directories into output_dir (prefixes keep names unique)."""
+    os.makedirs(output_dir, exist_ok=True)
+    moved = []
+    for job in jobs:
+        for path in sorted(Path(job['dir']).iterdir()):
+            if path.name.endswith(DECOY_SUFFIXES):
+                target = Path(output_dir) / path.name
+                shutil.move(str(path), target)
+                moved.append(str(target))
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a Rosetta campaign as parallel local jobs',
+        epilog='Arguments after -- are passed to every Rosetta job.')
+    parser.add_argument('--executable', required=True, help='Rosetta binary (or stand-in)')
+    parser.add_argument('--nstruct', type=int, required=True, help='Total number of decoys')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of independent jobs (default: one per worker)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Maximum concurrent Rosetta processes')
+    parser.add_argument('--output', default='output/models', help='Directory for merged decoys')
+    parser.add_argument('--prefix', default='', help='Decoy name prefix')
+    parser.add_argument('--scorefile', default=None,
+                        help='Merged score file (default: <output>/scores.sc)')
+    parser.add_argument('--work-dir', default=None,
+                        help='Per-job scratch directory (default: <output>/jobs)')
+    parser.add_argument('--seed', type=int, default=1111, help='Seed of the first job')
+    parser.add_argument('--retries', type=int, default=1, help='Retries per failed job')
+    parser.add_argument('--keep-jobs', action='store_true', help='Keep job directories after merging')
+    parser.add_argument('rosetta_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    extra_args = args.rosetta_args
+    if extra_args and extra_args[0] == '--':
+        extra_args = extra_args[1:]
+    extra_args = strip_managed_options(extra_args)
+
+    work_dir = args.work_dir or os.path.join(args.output, 'jobs')
+    scorefile = args.scorefile or os.path.join(args.output, 'scores.sc')
+    jobs = plan_jobs(args.nstruct, args.jobs or args.workers, work_dir, args.prefix, args.seed)
+
+    print(f"Running {args.nstruct} decoys as {len(jobs)} jobs on {args.workers} workers")
+    start = time.time()
+    run_jobs(args.executable, extra_args, jobs, args.workers, args.retries)
+
+    n_rows = merge_score_files([job['scorefile'] for job in jobs], scorefile)
+    decoys = collect_decoys(jobs, args.output)
+    failed = [job for job in jobs if job['status'] != 'done']
+
+    if args.keep_jobs or failed:
+        with open(os.path.join(work_dir, 'manifest.json'), 'w') as f:
+            json.dump(jobs, f, indent=2)
+    else:
+        shutil.rmtree(work_dir)
+
+    print(f"\nMerged {n_rows} score rows into: {scorefile}")
+    print(f"Collected {len(decoys)} decoys into: {args.output}")
+    print(f"Wall time: {time.time() - start:.1f} s")
+    if failed:
+        print(f"WARNING: {len(failed)} job(s) failed; logs kept in {work_dir}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
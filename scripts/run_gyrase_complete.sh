@@ -45,18 +45,22 @@ cd ${WORK_DIR}
 # Number of output structures
 NSTRUCT=${1:-5}  # Default 5, can be overridden from command line
 
-echo "Generating ${NSTRUCT} models..."
+# Parallel local jobs (each with its own seed and output prefix)
+NCPU=${NCPU:-$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)}
+
+echo "Generating ${NSTRUCT} models on ${NCPU} processes..."
 echo "----------------------------------------"
 
-${ROSETTA_SCRIPTS} \
+python3 ${WORK_DIR}/scripts/rosetta_runner.py \
+    --executable ${ROSETTA_SCRIPTS} \
+    --nstruct ${NSTRUCT} \
+    --workers ${NCPU} \
+    --output ${OUTPUT_DIR} \
+    --prefix mabs_gyrase_dna_ \
+    --scorefile ${OUTPUT_DIR}/scores.sc -- \
     -database ${ROSETTA_DB} \
     -parser:protocol xml/rosettacm_gyrase_dna.xml \
     -in:file:fasta input/target_with_dna.fasta \
-    -nstruct ${NSTRUCT} \
-    -out:path:pdb ${OUTPUT_DIR} \
-    -out:prefix mabs_gyrase_dna_ \
-    -out:file:scorefile ${OUTPUT_DIR}/scores.sc \
-    -overwrite \
     -relax:default_repeats 2 \
     -default_max_cycles 200 \
     -ignore_unrecognized_res \
@@ -203,15 +203,17 @@ run_rosettacm() {
         fi
     done
     
-    # Run RosettaCM
-    ${ROSETTA_SCRIPTS} \
+    # Run RosettaCM as ${NCPU} parallel local jobs with distinct seeds
+    python3 "${WORKING_DIR}/scripts/rosetta_runner.py" \
+        --executable ${ROSETTA_SCRIPTS} \
+        --nstruct ${NSTRUCT} \
+        --workers ${NCPU} \
+        --output "${OUTPUT_DIR}/models" \
+        --scorefile "${OUTPUT_DIR}/scores.sc" -- \
         -database ${ROSETTA_DB} \
         -parser:protocol "${OUTPUT_DIR}/rosettacm_dimer.xml" \
         -in:file:fasta ${TARGET_FASTA} \
         ${THREADED_PDBS} \
-        -nstruct ${NSTRUCT} \
-        -out:path:pdb "${OUTPUT_DIR}/models" \
-        -out:file:scorefile "${OUTPUT_DIR}/scores.sc" \
         -relax:default_repeats 1 \
         -default_max_cycles 200 \
         -ignore_unrecognized_res true \
@@ -12,6 +12,7 @@ ROSETTA_BIN="/Users/nb/Desktop/rosetta/source/bin"
 ROSETTA_DB="/Users/nb/Desktop/rosetta/database"
 WORK_DIR="/Users/nb/Desktop/rosetta-cm"
 NSTRUCT=${1:-2}
+NCPU=${NCPU:-$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)}
 
 cd ${WORK_DIR}
 
@@ -39,16 +40,17 @@ echo ""
 echo "Step 2: Running RosettaCM hybridize..."
 echo "----------------------------------------"
 
-# Now run RosettaCM with the threaded template
-${ROSETTA_BIN}/rosetta_scripts.default.macosclangrelease \
+# Now run RosettaCM with the threaded template (nstruct split across local jobs)
+python3 scripts/rosetta_runner.py \
+    --executable ${ROSETTA_BIN}/rosetta_scripts.default.macosclangrelease \
+    --nstruct ${NSTRUCT} \
+    --workers ${NCPU} \
+    --output output \
+    --prefix mabs_gyrA_ \
+    --scorefile output/scores.sc -- \
     -database ${ROSETTA_DB} \
     -parser:protocol xml/rosettacm_threaded.xml \
     -in:file:fasta input/gyrA_single.fasta \
-    -nstruct ${NSTRUCT} \
-    -out:path:pdb output \
-    -out:prefix mabs_gyrA_ \
-    -out:file:scorefile output/scores.sc \
-    -overwrite \
     -relax:default_repeats 2
 
 echo ""
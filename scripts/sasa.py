@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Solvent-accessible surface area (Shrake–Rupley) with per-residue ΔSASA.
+
+Every heavy atom gets a sphere of test points (golden-spiral, precomputed
+once per point count) at its van der Waals radius plus the probe radius. A
+point is buried when it lies inside the expanded sphere of a neighbor;
+neighbors come from one NeighborGrid pair search, and burial is evaluated
+for all points of all pairs at once from
+
+    |x_i + R_i s - x_j|^2 = |d|^2 + R_i^2 + 2 R_i (s . d),   d = x_i - x_j
+
+so there is no per-atom Python loop. The same pair list gives the SASA of
+each chain group in isolation (by dropping pairs between groups), which is
+what ΔSASA on complex formation needs.
+
+Usage:
+    python sasa.py --pdb output/tetramer/mabs_gyrase_tetramer_dna_mg.pdb \
+        --groups AC BD EF --output output/tetramer/sasa.tsv
+"""
+import argparse
+import time
+from functools import lru_cache
+from typing import Dict, Sequence
+
+import numpy as np
+
+from clash_detection import atom_radii
+from neighbor_grid import NeighborGrid
+from pdb_structure import Structure, read_structure
+
+PROBE_RADIUS = 1.4
+N_POINTS = 100
+# Residue SASA above which a residue counts as surface-exposed (Å²)
+EXPOSED_CUTOFF = 5.0
+
+
+@lru_cache(maxsize=8)
+def sphere_points(n: int = N_POINTS) -> np.ndarray:
+    """n near-uniform unit vectors on a golden-section spiral, shape (n, 3)."""
+    k = np.arange(n) + 0.5
+    z = 1 - 2 * k / n
+    r = np.sqrt(1 - z * z)
+    phi = np.pi * (3 - np.sqrt(5)) * k
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+
+
+def _buried_points(coords: np.ndarray, R: np.ndarray, i: np.ndarray, j: np.ndarray,
+                   n_points: int, chunk_pairs: int = 100000) -> np.ndarray:
+    """
+    Per-atom mask of sphere points inside at least one neighbor's expanded sphere.
+
+    i, j are directed pairs sorted by i.
+    """
+    sphere = sphere_points(n_points).astype(np.float32)
+    # Point masks are bit-packed (8 points per byte) for the per-atom OR
+    buried = np.zeros((len(coords), (n_points + 7) // 8), dtype=np.uint8)
+    if not len(i):
+        return np.unpackbits(buried, axis=1, count=n_points).astype(bool)
+    # Chunk on atom boundaries so each atom's pairs are reduced together
+    bounds = np.searchsorted(i, np.arange(0, len(coords) + 1))
+    start_atom = 0
+    while start_atom < len(coords):
+        stop_atom = int(np.searchsorted(bounds, bounds[start_atom] + chunk_pairs, side='right')) - 1
+        stop_atom = min(max(stop_atom, start_atom + 1), len(coords))
+        lo, hi = bounds[start_atom], bounds[stop_atom]
+        if hi > lo:
+            a, b = i[lo:hi], j[lo:hi]
+            d = coords[a] - coords[b]
+            # Squared distance of each point of a to the center of b, against R_b^2
+            threshold = (R[b] ** 2 - np.einsum('ij,ij->i', d, d) - R[a] ** 2) / (2 * R[a])
+            inside = (d.astype(np.float32) @ sphere.T) < threshold.astype(np.float32)[:, None]
+            first = bounds[start_atom:stop_atom] - lo
+            has_pairs = bounds[start_atom + 1:stop_atom + 1] > bounds[start_atom:stop_atom]
+            reduced = np.bitwise_or.reduceat(np.packbits(inside, axis=1), first[has_pairs], axis=0)
+            buried[np.arange(start_atom, stop_atom)[has_pairs]] = reduced
+        start_atom = stop_atom
+    return np.unpackbits(buried, axis=1, count=n_points).astype(bool)
+
+
+def atom_sasa(structure: Structure, groups: Sequence[Sequence[str]] = None, n_points: int = N_POINTS,
+              probe: float = PROBE_RADIUS) -> Dict[str, np.ndarray]:
+    """
+    Per-atom SASA (Å²) of the heavy atoms, in the complex and with chain groups separated.
+
+    Hydrogens get zero area. Atoms in alternate locations other than the
+    first are ignored. Chains not in any group form their own groups.
+
+    Returns:
+        Dict with 'complex' and, if groups are given, 'isolated' per-atom arrays
+    """
+    active = (structure.element != 'H') & np.isin(structure.altloc, ['', 'A'])
+    index = np.nonzero(active)[0]
+    coords = structure.coords[index]
+    R = atom_radii(structure)[index] + probe
+
+    grid = NeighborGrid(coords, cell_size=max(2 * R.max(), 1.0) if len(R) else 1.0)
+    a, b, dist = grid.pairs(2 * R.max() if len(R) else 0.0)
+    overlap = dist < R[a] + R[b]
+    a, b = a[overlap], b[overlap]
+    i, j = np.concatenate([a, b]), np.concatenate([b, a])
+    order = np.argsort(i, kind='stable')
+    i, j = i[order], j[order]
+
+    area = 4 * np.pi * R ** 2
+    result = {}
+    if groups is None:
+        buried = _buried_points(coords, R, i, j, n_points)
+    else:
+        group_of = {}
+        for g, chains in enumerate(groups):
+            for chain in chains:
+                group_of[chain] = g
+        for chain in structure.chain_ids():
+            group_of.setdefault(str(chain), len(group_of) + len(groups))
+        atom_group = np.array([group_of[str(c)] for c in structure.chain[index]], dtype=int)
+        # Burial within each group, then by the other groups on top of it
+        same = atom_group[i] == atom_group[j]
+        isolated = _buried_points(coords, R, i[same], j[same], n_points)
+        buried = isolated | _buried_points(coords, R, i[~same], j[~same], n_points)
+        result['isolated'] = np.zeros(len(structure))
+        result['isolated'][index] = area * (1 - isolated.mean(axis=1))
+    result['complex'] = np.zeros(len(structure))
+    result['complex'][index] = area * (1 - buried.mean(axis=1))
+    return result
+
+
+def residue_sasa(structure: Structure, groups: Sequence[Sequence[str]] = None,
+                 n_points: int = N_POINTS, probe: float = PROBE_RADIUS) -> Dict[str, np.ndarray]:
+    """
+    Per-residue SASA, and with groups, SASA of the separated groups and ΔSASA.
+
+    Returns:
+        Dict of per-residue arrays: 'chain', 'resseq', 'icode', 'resname', 'sasa'
+        (in the complex); with groups also 'isolated' and 'delta' (isolated - complex)
+    """
+    per_atom = atom_sasa(structure, groups, n_points, probe)
+    residue, starts = structure.residue_index()
+    n_residues = len(starts)
+    result = {
+        'chain': structure.chain[starts],
+        'resseq': structure.resseq[starts],
+        'icode': structure.icode[starts],
+        'resname': structure.resname[starts],
+        'sasa': np.bincount(residue, per_atom['complex'], minlength=n_residues),
+    }
+    if 'isolated' in per_atom:
+        result['isolated'] = np.bincount(residue, per_atom['isolated'], minlength=n_residues)
+        result['delta'] = result['isolated'] - result['sasa']
+    return result
+
+
+def interface_residues(residues: Dict[str, np.ndarray], min_delta: float = 1.0) -> np.ndarray:
+    """Indices of residues that lose at least min_delta Å² on complex formation."""
+    return np.nonzero(residues['delta'] >= min_delta)[0]
+
+
+def buried_area_by_chain(residues: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Total ΔSASA (Å²) per chain."""
+    return {str(chain): float(residues['delta'][residues['chain'] == chain].sum())
+            for chain in dict.fromkeys(residues['chain'])}
+
+
+def write_residue_table(residues: Dict[str, np.ndarray], filename: str):
+    columns = [c for c in ('sasa', 'isolated', 'delta') if c in residues]
+    with open(filename, 'w') as f:
+        f.write('\t'.join(['chain', 'resseq', 'icode', 'resname'] + columns) + '\n')
+        for k in range(len(residues['sasa'])):
+            values = [f"{residues[c][k]:.2f}" for c in columns]
+            f.write('\t'.join([str(residues['chain'][k]), str(residues['resseq'][k]),
+                               str(residues['icode'][k]), str(residues['resname'][k])] + values) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-residue SASA and ΔSASA on complex formation')
+    parser.add_argument('--pdb', required=True)
+    parser.add_argument('--groups', nargs='*', default=None,
+                        help='Chain groups separated for ΔSASA, e.g. AC BD EF (default: every chain)')
+    parser.add_argument('--points', type=int, default=N_POINTS, help='Sphere points per atom')
+    parser.add_argument('--probe', type=float, default=PROBE_RADIUS)
+    parser.add_argument('--output', help='Per-residue TSV')
+    args = parser.parse_args()
+
+    structure = read_structure(args.pdb)
+    groups = args.groups if args.groups is not None else [str(c) for c in structure.chain_ids()]
+    start = time.perf_counter()
+    residues = residue_sasa(structure, groups, args.points, args.probe)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.pdb}: {len(residues['sasa'])} residues, SASA computed in {elapsed:.2f} s")
+    print(f"Total SASA: {residues['sasa'].sum():.0f} Å² (separated groups {residues['isolated'].sum():.0f} Å²)")
+    print(f"Buried on complex formation ({' / '.join(groups)}):")
+    for chain, area in buried_area_by_chain(residues).items():
+        print(f"  chain {chain}: {area:8.1f} Å²")
+    print(f"Interface residues (ΔSASA >= 1 Å²): {len(interface_residues(residues))}")
+    if args.output:
+        write_residue_table(residues, args.output)
+        print(f"Per-residue table: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Streaming columnar reader for Rosetta score files.
+
+Score files (one or many, e.g. the per-job files of rosetta_runner) are read
+line by line; data rows are buffered in fixed-size chunks and converted to
+NumPy columns one column at a time, so there is no per-cell try/except and
+no dict per decoy. Header changes between or within files are tolerated:
+the table holds the union of all columns and rows lacking a column get NaN.
+
+Usage:
+    from score_files import read_score_files, top_k
+
+    table = read_score_files(['output/scores.sc', 'output/jobs/job_001/score.sc'])
+    best = top_k(table, 10, 'total_score')     # row indices, best first
+    print(table.description[best], table['total_score'][best])
+"""
+import heapq
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+# Columns kept as text rather than floats
+STRING_COLUMNS = ('description', 'user_tag')
+
+
+def is_header(parts: Sequence[str]) -> bool:
+    """True for 'SCORE:' header rows (data rows never contain these column names)."""
+    return parts[-1] == 'description' or (len(parts) > 1 and parts[1] == 'total_score')
+
+
+def iter_score_rows(lines: Iterable[str], header: Tuple[str, ...] = None) -> Iterator[Tuple[Tuple[str, ...], List[str]]]:
+    """
+    Yield (header, values) for every data row of a score file.
+
+    header may be passed in to continue reading a file part way through.
+    Rows whose length does not match the current header are skipped.
+    """
+    for line in lines:
+        if not line.startswith('SCORE:'):
+            continue
+        parts = line.split()
+        if is_header(parts):
+            header = tuple(parts[1:])
+        elif header is not None and len(parts) - 1 == len(header):
+            yield header, parts[1:]
+
+
+class ScoreTable:
+    """Decoy scores as typed NumPy columns (float terms plus text columns)."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], order: List[str]):
+        self.columns = columns
+        self.order = order
+
+    def __len__(self):
+        return len(self.columns[self.order[0]]) if self.order else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def description(self) -> np.ndarray:
+        if 'description' in self.columns:
+            return self.columns['description']
+        return np.array([f"model_{i + 1}" for i in range(len(self))])
+
+    def numeric_terms(self) -> List[str]:
+        return [name for name in self.order if self.columns[name].dtype.kind == 'f']
+
+    def row(self, index: int) -> Dict:
+        """One decoy as a dict (floats for numeric terms)."""
+        return {name: (float(col[index]) if col.dtype.kind == 'f' else str(col[index]))
+                for name, col in self.columns.items()}
+
+    def to_records(self) -> List[Dict]:
+        return [self.row(i) for i in range(len(self))]
+
+    def select(self, index) -> 'ScoreTable':
+        return ScoreTable({name: col[index] for name, col in self.columns.items()}, list(self.order))
+
+
+class _ColumnBuilder:
+    """Accumulates buffered rows into per-column chunk arrays."""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.order: List[str] = []
+        self.chunks: Dict[str, List[np.ndarray]] = {}
+        self.n_rows = 0
+        self.header = None
+        self.buffer: List[List[str]] = []
+
+    def add(self, header, values):
+        if header != self.header:
+            self.flush()
+            self.header = header
+        self.buffer.append(values)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        block = np.array(self.buffer, dtype=str)
+        n = len(block)
+        for k, name in enumerate(self.header):
+            if name not in self.chunks:
+                self.order.append(name)
+                # Earlier rows did not have this column
+                self.chunks[name] = [self._missing(name, self.n_rows)] if self.n_rows else []
+            self.chunks[name].append(self._convert(name, block[:, k]))
+        for name in self.order:
+            if name not in self.header:
+                self.chunks[name].append(self._missing(name, n))
+        self.n_rows += n
+        self.buffer = []
+
+    @staticmethod
+    def _convert(name, values):
+        if name in STRING_COLUMNS:
+            return values
+        try:
+            return values.astype(float)
+        except ValueError:
+            # Non-numeric column (e.g. a custom tag); keep text
+            return values
+
+    @staticmethod
+    def _missing(name, n):
+        if name in STRING_COLUMNS:
+            return np.full(n, '', dtype=str)
+        return np.full(n, np.nan)
+
+    def build(self) -> ScoreTable:
+        self.flush()
+        columns = {}
+        for name in self.order:
+            parts = self.chunks[name]
+            if any(p.dtype.kind != 'f' for p in parts):
+                parts = [p.astype(str) for p in parts]
+            columns[name] = np.concatenate(parts)
+        return ScoreTable(columns, list(self.order))
+
+
+def read_score_files(score_files: Iterable[str], chunk_size: int = 8192) -> ScoreTable:
+    """Read one or many score files into a single columnar table."""
+    if isinstance(score_files, str):
+        score_files = [score_files]
+    builder = _ColumnBuilder(chunk_size)
+    for score_file in score_files:
+        with open(score_file, 'r') as f:
+            for header, values in iter_score_rows(f):
+                builder.add(header, values)
+    return builder.build()
+
+
+def top_k(table: ScoreTable, k: int, term: str = 'total_score') -> np.ndarray:
+    """
+    Indices of the k lowest-scoring rows for term (NaN rows excluded), best first.
+
+    Uses a bounded heap, so only k candidates are kept in order.
+    """
+    values = table[term]
+    valid = np.nonzero(~np.isnan(values))[0]
+    best = heapq.nsmallest(k, valid, key=values.__getitem__)
+    return np.array(best, dtype=int)
+
+
+def stream_top_k(score_files: Iterable[str], k: int, term: str = 'total_score') -> List[Tuple[float, str]]:
+    """
+    (score, description) of the k best decoys without building a table.
+
+    A max-heap of size k is maintained while the files stream past.
+    """
+    heap: List[Tuple[float, int, str]] = []
+    counter = 0
+    for score_file in score_files:
+        with open(score_file, 'r') as f:
+            for header, values in iter_score_rows(f):
+                if term not in header:
+                    continue
+                try:
+                    value = float(values[header.index(term)])
+                except ValueError:
+                    continue
+                name = values[header.index('description')] if 'description' in header else f"model_{counter + 1}"
+                counter += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, (-value, counter, name))
+                elif -value > heap[0][0]:
+                    heapq.heapreplace(heap, (-value, counter, name))
+    return [(-neg, name) for neg, _, name in sorted(heap, reverse=True)]
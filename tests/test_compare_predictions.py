@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts" / "ai_predictions"))
+
+from compare_predictions import residue_profile
+from esmfold_pdb import RESTYPE_3, RESTYPES
+from pdb_structure import Structure
+
+rng = np.random.default_rng(1)
+TARGETS = {name: "".join(rng.choice(list(RESTYPES), size=size)) for name, size in (("GyrA", 40), ("GyrB", 30))}
+
+
+def write_ca_model(path, chains):
+    """CA-only model with (chain, sequence) segments numbered from 1 per chain; B-factor 50 + residue index."""
+    resname, chain, resseq = [], [], []
+    for chain_id, sequence in chains:
+        resname += [RESTYPE_3[RESTYPES.index(aa)] for aa in sequence]
+        chain += [chain_id] * len(sequence)
+        resseq += list(range(1, len(sequence) + 1))
+    n = len(resname)
+    Structure(rng.normal(size=(n, 3)) * 10, ["ATOM"] * n, ["CA"] * n, [""] * n, resname, chain, resseq,
+              [""] * n, np.ones(n), 50.0 + np.arange(n), ["C"] * n).write(path)
+
+
+def test_concatenated_heterodimer_is_split_into_targets(tmp_path):
+    model = tmp_path / "heterodimer.pdb"
+    write_ca_model(model, [("A", TARGETS["GyrA"] + TARGETS["GyrB"])])
+    segments = residue_profile(model, TARGETS)["segments"]
+    assert [(seg["target"], seg["chain"]) for seg in segments] == [("GyrA", "A"), ("GyrB", "A")]
+    assert all(seg["identity"] == 1.0 for seg in segments)
+    # GyrB occupies model residues 41-70, so its pLDDT starts at the 41st B-factor
+    assert segments[1]["plddt"][0] == 50.0 + 40
+    assert not np.isnan(segments[1]["coords"]).any()
+
+
+def test_chains_are_matched_separately_and_unmatched_models_have_no_segments(tmp_path):
+    model = tmp_path / "complex.pdb"
+    write_ca_model(model, [("A", TARGETS["GyrA"]), ("B", TARGETS["GyrB"])])
+    assert [seg["target"] for seg in residue_profile(model, TARGETS)["segments"]] == ["GyrA", "GyrB"]
+
+    unrelated = tmp_path / "unrelated.pdb"
+    write_ca_model(unrelated, [("A", "".join(rng.choice(list(RESTYPES), size=50)))])
+    assert residue_profile(unrelated, TARGETS)["segments"] == []
@@ -0,0 +1,61 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from decoy_watch import DecoyWatcher
+
+HEADER = "SCORE: total_score description\n"
+
+
+def write_scores(path, rows, mode="w"):
+    with open(path, mode) as f:
+        if mode == "w":
+            f.write(HEADER)
+        f.writelines(f"SCORE: {value} {name}\n" for name, value in rows)
+
+
+def watcher(tmp_path):
+    return DecoyWatcher([str(tmp_path / "job_*" / "score.sc")], [], str(tmp_path), cluster_radius=0)
+
+
+def test_retried_attempt_replaces_discarded_decoys(tmp_path):
+    job = tmp_path / "job_1"
+    job.mkdir()
+    score_file = job / "score.sc"
+    write_scores(score_file, [("a", -100.0), ("b", -90.0)])
+    w = watcher(tmp_path)
+    w.poll()
+    assert w.best == "a"
+
+    # The retry deletes the failed attempt's score file and writes a shorter new one
+    os.unlink(score_file)
+    write_scores(score_file, [("c", -50.0)])
+    w.poll()
+    write_scores(score_file, [("d", -60.0), ("e", -40.0)], mode="a")
+    w.poll()
+
+    assert set(w.scores) == {"c", "d", "e"}
+    assert [name for _, name in w.top()] == ["d", "c", "e"]
+    assert w.best == "d"
+    assert w.stats.n == 3
+
+
+def test_truncated_file_is_reread_and_deleted_file_evicted(tmp_path):
+    job = tmp_path / "job_1"
+    job.mkdir()
+    score_file = job / "score.sc"
+    write_scores(score_file, [("a", -100.0), ("b", -90.0)])
+    w = watcher(tmp_path)
+    w.poll()
+
+    # Truncated in place (same inode)
+    with open(score_file, "w") as f:
+        f.write(HEADER + "SCORE: -10.0 c\n")
+    w.poll()
+    assert set(w.scores) == {"c"}
+
+    os.unlink(score_file)
+    w.poll()
+    assert w.scores == {} and w.best is None and w.stats.n == 0
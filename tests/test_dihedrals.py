@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import dihedrals
+from dihedrals import ALLOWED, FAVORED, OUTLIER, RAMA_CASES, ramachandran_cases
+
+
+def write_top8000_grid(path, favored_box, allowed_box):
+    """Top8000-style contour file on the 2-degree grid (bin centers -179..179)."""
+    centers = np.arange(-179.0, 180.0, 2.0)
+    with open(path, "w") as f:
+        f.write("# Top8000 test grid\n")
+        for phi in centers:
+            for psi in centers:
+                value = 0.0
+                if allowed_box[0] <= phi <= allowed_box[1] and allowed_box[2] <= psi <= allowed_box[3]:
+                    value = 0.01
+                if favored_box[0] <= phi <= favored_box[1] and favored_box[2] <= psi <= favored_box[3]:
+                    value = 0.5
+                f.write(f"{phi:.1f} {psi:.1f} {value}\n")
+
+
+def test_reference_grids_replace_approximate_contours(tmp_path, monkeypatch):
+    for name, _ in dihedrals.RAMA_REFERENCE_FILES.values():
+        write_top8000_grid(tmp_path / name, (-100, -40, -70, -10), (-120, -20, -90, 90))
+    monkeypatch.setattr(dihedrals, "RAMA_REFERENCE_DIR", str(tmp_path))
+    dihedrals.ramachandran_grid.cache_clear()
+    try:
+        assert dihedrals.uses_reference_grids()
+        phi = np.array([-65.0, -72.0, 60.0, np.nan])
+        psi = np.array([-40.0, 62.0, 60.0, 0.0])
+        region = dihedrals.classify_ramachandran(phi, psi, np.array(["ALA", "PRO", "ALA", "ALA"]))
+        assert region.tolist() == [FAVORED, ALLOWED, OUTLIER, -1]
+    finally:
+        dihedrals.ramachandran_grid.cache_clear()
+
+
+def test_pre_proline_case_stops_at_chain_end():
+    resname = np.array(["ALA", "VAL", "PRO", "ALA"])
+    chain = np.array(["A", "A", "A", "B"])
+    case = ramachandran_cases(resname, chain)
+    assert [RAMA_CASES[c] for c in case] == ["general", "pre-proline", "proline", "general"]
+    # The last residue of chain A is not pre-proline when chain B starts with Pro
+    case = ramachandran_cases(np.array(["ALA", "PRO"]), np.array(["A", "B"]))
+    assert case[0] == RAMA_CASES.index("general")
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from loop_detection import extend_regions, flagged_regions
+
+
+def test_single_residue_regions_become_loops():
+    resseq = np.concatenate([np.arange(420, 441), np.arange(445, 451)])
+    flagged = np.isin(resseq, [425, 430, 437, 445])
+    regions = flagged_regions(resseq, flagged)
+    assert regions == [(425, 425), (430, 430), (437, 437), (445, 445)]
+
+    # 425 and 430 grow towards each other and merge; 445 starts after a chain break
+    assert extend_regions(regions, resseq) == [(424, 431), (436, 438), (445, 447)]
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from pdb_structure import Structure
+from rigid_body import relieve_clashes
+
+
+def two_chain_structure():
+    """Chain A fixed; chain C a copy shifted into it, both with N-H and CA-HA hydrogens."""
+    rng = np.random.default_rng(0)
+    heavy = rng.uniform(0, 12, size=(40, 3))
+    coords, names, elements, chains, resseq = [], [], [], [], []
+    for chain, offset in (("A", np.zeros(3)), ("C", np.array([2.0, 1.0, 0.5]))):
+        for k, xyz in enumerate(heavy):
+            name = "N" if k % 2 == 0 else "CA"
+            hydrogen = "H" if name == "N" else "HA"
+            bond = rng.normal(size=3)
+            coords += [xyz + offset, xyz + offset + 1.01 * bond / np.linalg.norm(bond)]
+            names += [name, hydrogen]
+            elements += [name[0], "H"]
+            chains += [chain, chain]
+            resseq += [k // 2 + 1] * 2
+    n = len(coords)
+    return Structure(coords, ["ATOM"] * n, names, [""] * n, ["GLY"] * n, chains, resseq,
+                     [""] * n, np.ones(n), np.zeros(n), elements)
+
+
+def test_hydrogens_move_with_their_body():
+    structure = two_chain_structure()
+    relieved, transforms, info = relieve_clashes(structure, bodies=("C",), max_iter=50)
+    assert info["history"][-1] < info["history"][0]
+
+    body = structure.chain == "C"
+    assert not np.allclose(relieved.coords[body], structure.coords[body])
+    # Bonds to hydrogens keep their length in both chains
+    hydrogens = np.nonzero(structure.element == "H")[0]
+    before = np.linalg.norm(structure.coords[hydrogens] - structure.coords[hydrogens - 1], axis=1)
+    after = np.linalg.norm(relieved.coords[hydrogens] - relieved.coords[hydrogens - 1], axis=1)
+    np.testing.assert_allclose(after, before, atol=1e-6)
+    # The whole body, hydrogens included, follows the reported transform
+    R, t = transforms[0]
+    np.testing.assert_allclose(relieved.coords[body], structure.coords[body] @ R.T + t, atol=1e-6)
+    np.testing.assert_array_equal(relieved.coords[~body], structure.coords[~body])